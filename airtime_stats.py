@@ -0,0 +1,390 @@
+#  Copyright (c) 2024 by Silviu Stroe (brainic.io)
+#  #
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#  #
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU General Public License for more details.
+#  #
+#  You should have received a copy of the GNU General Public License
+#  along with this program. If not, see <http://www.gnu.org/licenses/>.
+#  #
+#  Created on 10/18/26, 6:20 PM
+#  #
+#  Author: Silviu Stroe
+
+import heapq
+import logging
+import time
+from datetime import datetime
+from threading import Lock
+
+import numpy as np
+
+# Set up logging to file
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(module)s - %(levelname)s: %(message)s',
+    filename='/tmp/saycharlie.log',
+    filemode='a'  # Use 'a' to append to the file
+)
+
+# Bucket width in seconds and number of buckets kept, per resolution. Buckets are aligned on the Unix epoch (UTC).
+RESOLUTIONS = {
+    'minute': (60, 360),  # 6 hours
+    'hour': (3600, 192),  # 8 days
+    'day': (86400, 400),  # 13 months
+}
+
+# Resolutions kept and maximum number of keys, per dimension. A full dimension forgets its least recently used key.
+DIMENSIONS = {
+    'all': (('minute', 'hour', 'day'), 1),
+    'source': (('minute', 'hour', 'day'), 64),  # The other dimensions add up all the sources
+    'tg': (('minute', 'hour', 'day'), 512),
+    'callsign': (('minute', 'hour', 'day'), 2048),
+    'tg_callsign': (('hour', 'day'), 4096),  # Keyed 'tg:callsign', for rankings within a TG
+}
+
+ALL_KEY = 'all'
+INITIAL_ROWS = 16
+
+
+def session_keys(session):
+    tg_number, callsign = str(session['tg_number']), session['callsign']
+    return (('all', ALL_KEY), ('source', str(session.get('source'))), ('tg', tg_number), ('callsign', callsign),
+            ('tg_callsign', f"{tg_number}:{callsign}"))
+
+
+def session_times(session):
+    start_ts = datetime.fromisoformat(session['start_date_time']).timestamp()
+    stop_date_time = session.get('stop_date_time')
+    stop_ts = datetime.fromisoformat(stop_date_time).timestamp() if stop_date_time else start_ts
+    return start_ts, stop_ts
+
+
+class BucketRing:
+    """
+    The last `size` buckets of one resolution for every key of a dimension, one row per key.
+
+    Slots are shared by all the rows: epochs holds the bucket number each slot currently holds, and a slot is
+    cleared for every key when the ring moves past it. Single cells are updated through memoryviews of the arrays,
+    which is much cheaper than indexing numpy arrays one element at a time.
+    """
+
+    def __init__(self, width, size, rows):
+        self.width = width
+        self.size = size
+        self.span = width * size  # Seconds covered by the ring
+        self.clock = None  # Newest bucket number
+        self.epochs = np.full(size, -1, dtype=np.int64)
+        self.sessions = np.zeros((rows, size), dtype=np.uint32)
+        self.airtime = np.zeros((rows, size), dtype=np.float32)  # Seconds
+        self.peak = np.zeros((rows, size), dtype=np.uint8)  # Highest concurrency seen
+        self.update_cells()
+
+    def update_cells(self):
+        self.session_cells = memoryview(self.sessions)
+        self.airtime_cells = memoryview(self.airtime)
+        self.peak_cells = memoryview(self.peak)
+
+    def grow(self, rows):
+        extra = rows - self.sessions.shape[0]
+        self.sessions = np.vstack([self.sessions, np.zeros((extra, self.size), dtype=np.uint32)])
+        self.airtime = np.vstack([self.airtime, np.zeros((extra, self.size), dtype=np.float32)])
+        self.peak = np.vstack([self.peak, np.zeros((extra, self.size), dtype=np.uint8)])
+        self.update_cells()
+
+    def clear_row(self, row):
+        self.sessions[row] = 0
+        self.airtime[row] = 0
+        self.peak[row] = 0
+
+    def slot(self, bucket):
+        """
+        Return the slot of a bucket, moving the ring forward to it if needed, or None if it is too old to keep.
+        """
+        clock = self.clock
+        if clock is None or bucket > clock:
+            first = bucket - self.size + 1 if clock is None else max(clock + 1, bucket - self.size + 1)
+            if bucket - first < 8:
+                for skipped in range(first, bucket + 1):
+                    slot = skipped % self.size
+                    self.epochs[slot] = skipped
+                    self.sessions[:, slot] = 0
+                    self.airtime[:, slot] = 0
+                    self.peak[:, slot] = 0
+            else:
+                buckets = np.arange(first, bucket + 1)
+                slots = buckets % self.size
+                self.epochs[slots] = buckets
+                self.sessions[:, slots] = 0
+                self.airtime[:, slots] = 0
+                self.peak[:, slots] = 0
+            self.clock = bucket
+        elif bucket <= clock - self.size:
+            return None
+        return bucket % self.size
+
+    def add(self, row, start_ts, stop_ts, concurrency):
+        """
+        Count a session in its first bucket and spread its airtime over the buckets it spans.
+        """
+        width = self.width
+        first, last = int(start_ts // width), int(stop_ts // width)
+        for bucket in range(max(first, last - self.size + 1), last + 1):
+            slot = self.slot(bucket)
+            if slot is None:
+                continue
+            cell = (row, slot)
+            if bucket == first:
+                self.session_cells[cell] += 1
+            bucket_start = bucket * width
+            self.airtime_cells[cell] += min(stop_ts, bucket_start + width) - max(start_ts, bucket_start)
+            if concurrency > self.peak_cells[cell]:
+                self.peak_cells[cell] = min(concurrency, 255)
+
+    def mark_peak(self, row, ts, concurrency):
+        slot = self.slot(int(ts // self.width))
+        if slot is not None and concurrency > self.peak_cells[row, slot]:
+            self.peak_cells[row, slot] = min(concurrency, 255)
+
+    def window(self, start_ts, end_ts):
+        """
+        Return the bucket numbers and slots of the buckets in [start_ts, end_ts) that the ring still holds.
+        """
+        if self.clock is None:
+            buckets = np.arange(0)
+        else:
+            # Clamped to the ring before building the range, whatever the range asked for
+            first = max(int(start_ts // self.width), self.clock - self.size + 1)
+            last = min(int(-(-end_ts // self.width)), self.clock + 1)
+            buckets = np.arange(first, max(first, last))
+        slots = buckets % self.size
+        held = self.epochs[slots] == buckets
+        return buckets[held], slots[held]
+
+
+class Dimension:
+    """
+    The buckets of one dimension (TG, callsign...), with a bounded number of keys.
+    """
+
+    def __init__(self, resolutions, max_keys):
+        self.max_keys = max_keys
+        self.rows = {}  # Key -> row
+        self.keys = []  # Row -> key
+        self.last_used = {}  # Key -> monotonic counter of its last update, for eviction
+        self.rings = {name: BucketRing(*RESOLUTIONS[name], min(INITIAL_ROWS, max_keys)) for name in resolutions}
+
+    def row(self, key, tick):
+        row = self.rows.get(key)
+        if row is None:
+            if len(self.keys) < self.max_keys:
+                row = len(self.keys)
+                self.keys.append(key)
+                capacity = next(iter(self.rings.values())).sessions.shape[0]
+                if row >= capacity:
+                    for ring in self.rings.values():
+                        ring.grow(min(capacity * 2, self.max_keys))
+            else:
+                evicted = min(self.last_used, key=self.last_used.get)
+                row = self.rows.pop(evicted)
+                del self.last_used[evicted]
+                self.keys[row] = key
+                for ring in self.rings.values():
+                    ring.clear_row(row)
+            self.rows[key] = row
+        self.last_used[key] = tick
+        return row
+
+
+class AirtimeStats:
+    """
+    Sessions, airtime and peak concurrency per minute, hour and day, overall, per source, per TG, per callsign and per
+    callsign within a TG, updated as sessions start and stop. The TG and callsign statistics add up all the sources.
+
+    Memory is bounded by RESOLUTIONS and DIMENSIONS. Sessions already counted by rebuild() are ignored when a
+    monitor replays them from the log again.
+    """
+
+    def __init__(self):
+        self.lock = Lock()
+        self.dimensions = {name: Dimension(resolutions, max_keys)
+                           for name, (resolutions, max_keys) in DIMENSIONS.items()}
+        self.active = {}  # (dimension, key) -> sessions in progress
+        self.open_sessions = {}  # Source -> (id, keys) of its session started but not stopped yet
+        self.watermarks = {}  # Source -> start time of the newest session counted by rebuild()
+        self.tick = 0
+
+    def rebuild(self, session_store):
+        """
+        Count the stored sessions recent enough to fall in the longest resolution, replaying starts and stops in
+        time order so that concurrency is counted too.
+        """
+        started = time.perf_counter()
+        since = time.time() - max(width * size for width, size in RESOLUTIONS.values())
+        stops = []  # Heap of (stop time, sequence, session, start time, stop time)
+        watermarks = {}
+        count = 0
+        for count, session in enumerate(session_store.iter_sessions(since), start=1):
+            start_ts, stop_ts = session_times(session)
+            while stops and stops[0][0] <= start_ts:
+                self.count_stop(*heapq.heappop(stops)[2:])
+            self.count_start(session, start_ts)
+            heapq.heappush(stops, (stop_ts, count, session, start_ts, stop_ts))
+            source = session.get('source')
+            watermarks[source] = max(watermarks.get(source, start_ts), start_ts)
+        while stops:
+            self.count_stop(*heapq.heappop(stops)[2:])
+        self.watermarks = watermarks
+        logging.info(f"Rebuilt airtime statistics from {count} sessions in {time.perf_counter() - started:.3f}s")
+
+    def session_started(self, session):
+        start_ts, _ = session_times(session)
+        if start_ts > self.watermarks.get(session.get('source'), float('-inf')):
+            self.count_start(session, start_ts)
+
+    def session_stopped(self, session):
+        start_ts, stop_ts = session_times(session)
+        if start_ts > self.watermarks.get(session.get('source'), float('-inf')):
+            self.count_stop(session, start_ts, stop_ts)
+
+    def session_discarded(self, session):
+        """
+        Forget a session whose stop was missed, so it no longer counts as in progress.
+        """
+        with self.lock:
+            opened = self.open_sessions.get(session.get('source'))
+            if opened is not None and opened[0] == self.session_id(session):
+                self.release_locked(session.get('source'))
+
+    def count_start(self, session, start_ts):
+        horizon = time.time()
+        with self.lock:
+            source = session.get('source')
+            if source in self.open_sessions:  # A source has one talker at a time, so the stop of this one was missed
+                self.release_locked(source)
+            self.open_sessions[source] = (self.session_id(session), session_keys(session))
+            self.tick += 1
+            for dimension_name, key in session_keys(session):
+                active = self.active.get((dimension_name, key), 0) + 1
+                self.active[(dimension_name, key)] = active
+                dimension = self.dimensions[dimension_name]
+                row = dimension.row(key, self.tick)
+                for ring in dimension.rings.values():
+                    if start_ts > horizon - ring.span:
+                        ring.mark_peak(row, start_ts, active)
+
+    def count_stop(self, session, start_ts, stop_ts):
+        horizon = time.time()
+        with self.lock:
+            source = session.get('source')
+            opened = self.open_sessions.get(source)
+            was_open = opened is not None and opened[0] == self.session_id(session)
+            if was_open:
+                del self.open_sessions[source]
+            self.tick += 1
+            for dimension_name, key in session_keys(session):
+                # A session resumed from a checkpoint was started before this process
+                active = self.active.get((dimension_name, key), 0) if was_open else 1
+                dimension = self.dimensions[dimension_name]
+                row = dimension.row(key, self.tick)
+                for ring in dimension.rings.values():
+                    if stop_ts > horizon - ring.span:
+                        ring.add(row, start_ts, stop_ts, active)
+                if was_open:
+                    self.decrement_active(dimension_name, key)
+
+    def release_locked(self, source):
+        _, keys = self.open_sessions.pop(source)
+        for dimension_name, key in keys:
+            self.decrement_active(dimension_name, key)
+
+    def decrement_active(self, dimension_name, key):
+        active = self.active.get((dimension_name, key), 0)
+        if active > 1:
+            self.active[(dimension_name, key)] = active - 1
+        else:
+            self.active.pop((dimension_name, key), None)
+
+    @staticmethod
+    def session_id(session):
+        return session.get('source'), session['callsign'], str(session['tg_number']), session['start_date_time']
+
+    def pick_resolution(self, dimension, start_ts, resolution=None):
+        """
+        Return the requested resolution, or the finest one still holding start_ts.
+        """
+        rings = self.dimensions[dimension].rings
+        if resolution is not None:
+            if resolution not in rings:
+                raise ValueError(f"Resolution must be one of {', '.join(rings)} for {dimension}")
+            return resolution
+        now = time.time()
+        for name, ring in rings.items():
+            if now - start_ts <= ring.width * ring.size:
+                return name
+        return list(rings)[-1]
+
+    def series(self, dimension, key, start_ts, end_ts, resolution=None):
+        """
+        Return the buckets of one key between start_ts and end_ts, and their totals.
+        """
+        if dimension not in self.dimensions:
+            raise ValueError(f"Unknown statistics dimension: {dimension}")
+        resolution = self.pick_resolution(dimension, start_ts, resolution)
+        with self.lock:
+            ring = self.dimensions[dimension].rings[resolution]
+            row = self.dimensions[dimension].rows.get(key)
+            buckets, slots = ring.window(start_ts, end_ts)
+            if row is None:
+                sessions = airtime = peak = np.zeros(len(slots))
+            else:
+                sessions, airtime, peak = ring.sessions[row, slots], ring.airtime[row, slots], ring.peak[row, slots]
+        return {
+            'dimension': dimension,
+            'key': key,
+            'resolution': resolution,
+            'buckets': [{
+                'start_date_time': datetime.fromtimestamp(int(bucket) * ring.width).isoformat(),
+                'sessions': int(bucket_sessions),
+                'airtime': round(float(bucket_airtime), 1),
+                'peak_concurrency': int(bucket_peak)
+            } for bucket, bucket_sessions, bucket_airtime, bucket_peak in zip(buckets, sessions, airtime, peak)],
+            'totals': {
+                'sessions': int(sessions.sum()),
+                'airtime': round(float(airtime.sum()), 1),
+                'peak_concurrency': int(peak.max()) if len(peak) else 0
+            }
+        }
+
+    def top(self, dimension, start_ts, end_ts, limit=10, prefix=None, resolution=None):
+        """
+        Return the keys of a dimension with the most airtime between start_ts and end_ts, optionally only the keys
+        starting with prefix.
+        """
+        if dimension not in self.dimensions:
+            raise ValueError(f"Unknown statistics dimension: {dimension}")
+        if limit < 1:
+            raise ValueError("The limit must be at least 1")
+        resolution = self.pick_resolution(dimension, start_ts, resolution)
+        with self.lock:
+            keys = self.dimensions[dimension].keys
+            ring = self.dimensions[dimension].rings[resolution]
+            _, slots = ring.window(start_ts, end_ts)
+            rows = np.array([row for row, key in enumerate(keys) if prefix is None or key.startswith(prefix)],
+                            dtype=np.int64)
+            airtime = ring.airtime[rows][:, slots].sum(axis=1) if len(rows) else np.zeros(0)
+            sessions = ring.sessions[rows][:, slots].sum(axis=1) if len(rows) else np.zeros(0)
+            ranked = [(keys[rows[index]], airtime[index], sessions[index])
+                      for index in np.argsort(-airtime, kind='stable')[:limit] if airtime[index] > 0]
+        return {
+            'dimension': dimension,
+            'resolution': resolution,
+            'top': [{'key': key[len(prefix):] if prefix else key, 'airtime': round(float(key_airtime), 1),
+                     'sessions': int(key_sessions)} for key, key_airtime, key_sessions in ranked]
+        }
@@ -17,24 +17,43 @@
 #  #
 #  Author: Silviu Stroe
 import logging
-from flask import Flask, request, jsonify, render_template
-from flask_socketio import SocketIO, emit
+from flask import Flask, Response, request, jsonify, render_template, abort, send_from_directory
+from flask_socketio import SocketIO, emit, join_room, leave_room
 from routes import dashboard, add_button, set_columns, app_background, settings, category, file_manager, edit_file, \
     delete_file, add_talk_group, update_talk_group, delete_talk_group, get_talk_groups_data, get_group_name, \
-    get_buttons, system_reboot, system_shutdown, update_app, delete_button, update_button
+    search_talk_groups, import_talk_groups, export_talk_groups, \
+    get_buttons, system_reboot, system_shutdown, update_app, delete_button, update_button, batch_buttons, \
+    batch_talk_groups
 from threading import Thread, Event
-from log_monitor import LogMonitor
+from airtime_stats import AirtimeStats, ALL_KEY
+from monitor_manager import MonitorManager
+from session_store import SessionStore
 from svx_api import process_dtmf_request, stop_svxlink_service, restart_svxlink_service, get_svx_profiles, \
-    switch_svxlink_profile, restore_original_svxlink_config, get_log_file_path, process_ptt_request
+    switch_svxlink_profile, restore_original_svxlink_config, get_log_sources, process_ptt_request
 from zeroconf import ServiceInfo, Zeroconf
 import socket
 import atexit
 from ham_radio_api import HamRadioAPI
-from audio import start_audio_monitor
+from audio import supervise_audio_monitor, parse_audio_sources, AUDIO_SOURCES, METER_RATE, BINARY, SAMPLE_FORMATS
+from audio_health import AudioHealth
+from audio_recorder import AudioRecorder, AudioRing, CLIP_RATE, MAX_CLIPS_MB, MAX_CLIP_DAYS
+from spectrum import SpectrumAnalyzer, SPECTRUM_BINS, SPECTRUM_RATE, SPECTRUM_ROOM
+from live_audio import LiveAudioStreamer, LIVE_RATE
+from session_audio import SessionAudioStats
+from config import get_settings, settings_store
 from dateutil import parser
+from datetime import datetime
+import math
+import os
+import time
 
 from system_info import get_system_info
 
+HISTORY_PAGE_SIZE = 50
+HISTORY_API_MAX_LIMIT = 500
+STATS_DEFAULT_RANGE = 86400  # Seconds covered by /api/stats when no start is given
+LOG_DEFAULT_RANGE = 3600  # Seconds of log returned by /api/log when no start is given
+
 # Set up logging to file
 logging.basicConfig(
     level=logging.INFO,
@@ -57,22 +76,71 @@ def get_local_ip():
     return IP
 
 
+def parse_time_arg(value, default):
+    """
+    Parse a query argument given either as a Unix timestamp or an ISO date. Raises ValueError when it is neither, or
+    not a finite time.
+    """
+    if not value:
+        return default
+    try:
+        ts = float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+    if not math.isfinite(ts):
+        raise ValueError(f"Invalid time {value!r}")
+    return ts
+
+
 def create_app():
     app = Flask(__name__)
     api = HamRadioAPI()
     socketio = SocketIO(app)
-    # Get the log file path and the status message
-    log_path, message = get_log_file_path()
+    # Get the log files to monitor and the status message
+    log_sources, message = get_log_sources()
 
     try:
-        if log_path is None:
-            # The log file wasn't found, raise an exception with the message
+        if not log_sources:
+            # No log file was found, raise an exception with the message
             raise Exception(message)
     except Exception as e:
         logging.error(f"Error: {str(e)}")
         exit(1)
 
-    log_monitor = LogMonitor(log_path, socketio)
+    session_store = SessionStore()
+    atexit.register(session_store.close)
+    airtime_stats = AirtimeStats()
+    airtime_stats.rebuild(session_store)
+    app_settings = get_settings()
+    atexit.register(settings_store.close)  # Writes the journaled changes to config.json
+    try:
+        audio_sources = parse_audio_sources(app_settings.get('audio_sources', AUDIO_SOURCES))
+    except ValueError as e:
+        logging.error(f"Error: {str(e)}")
+        exit(1)
+    # The clips and the spectrum are those of the first RX source
+    main_rx = next((source for source in audio_sources if source['role'] == 'rx'), None)
+    audio_recorder = None  # Records a clip of every live talker session from the RX audio stream
+    if app_settings.get('record_clips', True) and main_rx is not None:
+        if main_rx['dtype'] == 'int16':
+            try:
+                audio_recorder = AudioRecorder(clip_rate=app_settings.get('clip_rate', CLIP_RATE),
+                                               ring=AudioRing(rate=main_rx['rate'], channels=main_rx['channels']),
+                                               max_mb=app_settings.get('clips_max_mb', MAX_CLIPS_MB),
+                                               max_days=app_settings.get('clips_max_days', MAX_CLIP_DAYS))
+            except (TypeError, ValueError) as e:  # A clips_max_mb or clips_max_days not positive, or not a number
+                logging.error(f"Error: {str(e)}")
+                exit(1)
+            audio_recorder.start()
+            atexit.register(audio_recorder.stop)
+        else:
+            logging.warning(f"Audio clips are not recorded: RX source {main_rx['name']} is not int16")
+    # Levels of the RX audio during each live talker session, stored with the session
+    session_audio = None
+    if main_rx is not None:
+        session_audio = SessionAudioStats(main_rx['channels'], SAMPLE_FORMATS[main_rx['dtype']][1])
+    monitors = MonitorManager(log_sources, socketio, session_store, airtime_stats, audio_recorder, session_audio)
+    atexit.register(monitors.stop_monitoring)
 
     # Get local IP address to advertise
     local_ip = get_local_ip()
@@ -88,7 +156,33 @@ def create_app():
 
     # Setup for audio monitoring
     stop_audio_monitor = Event()  # This will allow us to stop the thread gracefully
-    audio_thread = Thread(target=start_audio_monitor, args=(stop_audio_monitor, socketio))
+    meter_rate = app_settings.get('meter_rate', METER_RATE)  # VU meter updates per second
+    # Waterfall of the RX audio, computed only while a client shows it
+    rx_format = {} if main_rx is None else {
+        'rate': main_rx['rate'], 'channels': main_rx['channels'], 'reference': SAMPLE_FORMATS[main_rx['dtype']][1]}
+    try:
+        spectrum = SpectrumAnalyzer(socketio, bins=app_settings.get('spectrum_bins', SPECTRUM_BINS),
+                                    row_rate=app_settings.get('spectrum_rate', SPECTRUM_RATE), **rx_format)
+    except (TypeError, ValueError) as e:  # A spectrum_bins out of range, or not a number
+        logging.error(f"Error: {str(e)}")
+        exit(1)
+    # The RX audio for the clients listening to it, encoded only while a client listens
+    try:
+        live_audio = LiveAudioStreamer(socketio, live_rate=app_settings.get('live_audio_rate', LIVE_RATE), **rx_format)
+    except (TypeError, ValueError) as e:  # A live_audio_rate out of range, or not a number
+        logging.error(f"Error: {str(e)}")
+        exit(1)
+    audio_sinks = {}  # Source name -> objects its audio is written to
+    audio_observers = {}  # Source name -> objects the levels of its audio blocks are passed to
+    if main_rx is not None:
+        audio_sinks[main_rx['name']] = (spectrum, live_audio) if audio_recorder is None else (
+            audio_recorder.ring, spectrum, live_audio)
+        audio_observers[main_rx['name']] = (session_audio,)
+    meter_format = app_settings.get('meter_format', BINARY)  # 'json' for clients that cannot decode binary frames
+    audio_health = AudioHealth()  # Packet rates, gaps and jitter of the audio streams, and monitor restarts
+    audio_thread = Thread(target=supervise_audio_monitor,
+                          args=(stop_audio_monitor, socketio, audio_sources, meter_rate, audio_sinks, meter_format,
+                                audio_health, audio_observers))
     audio_thread.daemon = True
     audio_thread.start()
 
@@ -147,6 +241,22 @@ def create_app():
     def add_talk_group_route():
         return add_talk_group()
 
+    @app.route('/api/groups/search', methods=['GET'])
+    def search_talk_groups_route():
+        return search_talk_groups()
+
+    @app.route('/api/groups:import', methods=['POST'])
+    def import_talk_groups_route():
+        return import_talk_groups()
+
+    @app.route('/api/groups:export', methods=['GET'])
+    def export_talk_groups_route():
+        return export_talk_groups()
+
+    @app.route('/api/groups:batch', methods=['POST'])
+    def batch_talk_groups_route():
+        return batch_talk_groups()
+
     @app.route('/api/groups/<uuid:uuid_id>', methods=['PUT'])
     def update_talk_group_route(uuid_id):
         return update_talk_group(uuid_id)
@@ -157,7 +267,12 @@ def create_app():
 
     @app.route('/history')
     def last_talkers():
-        talkers = log_monitor.get_last_talkers()
+        source = request.args.get('source')
+        try:
+            talkers, next_cursor = session_store.query(cursor=request.args.get('cursor'), limit=HISTORY_PAGE_SIZE,
+                                                       source=source)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
 
         for talker in talkers:
             if 'stop_date_time' in talker and isinstance(talker['stop_date_time'], str):
@@ -176,17 +291,149 @@ def create_app():
             # Fill tg_name based on talkgroup number found in the settings
             talker['tg_name'] = get_group_name(talker['tg_number'])
 
-        return render_template('history.html', talkers=talkers)
+        return render_template('history.html', talkers=talkers, next_cursor=next_cursor,
+                               is_first_page=not request.args.get('cursor'), source=source,
+                               show_source=len(monitors.monitors) > 1)
+
+    @app.route('/clips/<path:filename>')
+    def clip_route(filename):
+        if audio_recorder is None:
+            abort(404)
+        return send_from_directory(os.path.abspath(audio_recorder.clips_dir), filename, mimetype='audio/wav')
+
+    @app.route('/api/history', methods=['GET'])
+    def get_history_route():
+        try:
+            limit = min(int(request.args.get('limit', HISTORY_PAGE_SIZE)), HISTORY_API_MAX_LIMIT)
+            talkers, next_cursor = session_store.query(callsign=request.args.get('callsign'),
+                                                       tg_number=request.args.get('tg'),
+                                                       cursor=request.args.get('cursor'),
+                                                       limit=max(limit, 1),
+                                                       source=request.args.get('source'))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        return jsonify({"talkers": talkers, "next_cursor": next_cursor}), 200
+
+    @app.route('/api/events', methods=['GET'])
+    def get_events_route():
+        try:
+            limit = min(int(request.args.get('limit', HISTORY_PAGE_SIZE)), HISTORY_API_MAX_LIMIT)
+            events, next_cursor = session_store.query_events(event_type=request.args.get('type'),
+                                                             cursor=request.args.get('cursor'),
+                                                             limit=max(limit, 1),
+                                                             source=request.args.get('source'))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        return jsonify({"events": events, "next_cursor": next_cursor}), 200
+
+    @app.route('/api/stats', methods=['GET'])
+    def get_stats_route():
+        # A series for the TG and/or callsign given, or the source given (everything when none is), or a ranking
+        # with top=tg|callsign|source
+        tg_number, callsign, top = request.args.get('tg'), request.args.get('callsign'), request.args.get('top')
+        source = request.args.get('source')
+        try:
+            end_ts = parse_time_arg(request.args.get('end'), time.time())
+            start_ts = parse_time_arg(request.args.get('start'), end_ts - STATS_DEFAULT_RANGE)
+            resolution = request.args.get('resolution')
+            if top == 'callsign' and tg_number:
+                result = airtime_stats.top('tg_callsign', start_ts, end_ts, int(request.args.get('limit', 10)),
+                                           prefix=f"{tg_number}:", resolution=resolution)
+            elif top:
+                result = airtime_stats.top(top, start_ts, end_ts, int(request.args.get('limit', 10)),
+                                           resolution=resolution)
+            elif tg_number and callsign:
+                result = airtime_stats.series('tg_callsign', f"{tg_number}:{callsign}", start_ts, end_ts, resolution)
+            elif tg_number:
+                result = airtime_stats.series('tg', tg_number, start_ts, end_ts, resolution)
+            elif callsign:
+                result = airtime_stats.series('callsign', callsign, start_ts, end_ts, resolution)
+            elif source:
+                result = airtime_stats.series('source', source, start_ts, end_ts, resolution)
+            else:
+                result = airtime_stats.series('all', ALL_KEY, start_ts, end_ts, resolution)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        return jsonify(result), 200
+
+    @app.route('/api/log', methods=['GET'])
+    def get_log_route():
+        # Stream the raw log lines written between start and end, found through the log index
+        monitor = monitors.get(request.args.get('source'))
+        if monitor is None:
+            return jsonify({"error": "Unknown source"}), 404
+        try:
+            end_ts = parse_time_arg(request.args.get('end'), time.time())
+            start_ts = parse_time_arg(request.args.get('start'), end_ts - LOG_DEFAULT_RANGE)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        lines = (f"{line}\n" for line in monitor.read_range(start_ts, end_ts))
+        return Response(lines, mimetype='text/plain')
+
+    @app.route('/api/sources', methods=['GET'])
+    def get_sources_route():
+        return jsonify(monitors.get_sources()), 200
+
+    @app.route('/api/monitor/stats', methods=['GET'])
+    def get_monitor_stats_route():
+        return jsonify(monitors.get_stats()), 200
 
     @socketio.on('connect')
     def handle_connect():
+        # Follow the source asked for ('all' for every source), the default source otherwise
+        source = request.args.get('source')
+        followed = list(monitors.monitors.values()) if source == 'all' else [monitors.get(source)]
+        followed = [monitor for monitor in followed if monitor is not None]
+        for monitor in followed:
+            join_room(monitor.room)
+        # The order of the streams in the VU meter updates, and which meter shows each
+        emit('audio_sources', [{'name': source['name'], 'role': source['role'], 'channels': source['channels']}
+                               for source in audio_sources])
+        if len(followed) != 1:
+            return
         # Send the last active talker to the client on connect
-        current_talker = log_monitor.get_active_talker()
-        past_talkers = log_monitor.get_last_talkers()
+        current_talker = followed[0].get_active_talker()
+        last_talker = followed[0].get_last_talker()
         if current_talker:
             emit('update_last_talker', current_talker)  # Send the active talker
-        elif past_talkers:
-            emit('update_last_talker', past_talkers[0])  # Send the most recent talker
+        elif last_talker:
+            emit('update_last_talker', last_talker)  # Send the most recent talker
+
+    @socketio.on('subscribe_spectrum')
+    def handle_subscribe_spectrum():
+        join_room(SPECTRUM_ROOM)
+        spectrum.subscribe(request.sid)
+        emit('spectrum_config', spectrum.get_config())
+
+    @socketio.on('unsubscribe_spectrum')
+    def handle_unsubscribe_spectrum():
+        leave_room(SPECTRUM_ROOM)
+        spectrum.unsubscribe(request.sid)
+
+    @socketio.on('subscribe_live_audio')
+    def handle_subscribe_live_audio():
+        live_audio.subscribe(request.sid)
+        emit('live_audio_config', live_audio.get_config())
+
+    @socketio.on('unsubscribe_live_audio')
+    def handle_unsubscribe_live_audio():
+        live_audio.unsubscribe(request.sid)
+
+    @socketio.on('live_audio_clock')
+    def handle_live_audio_clock():
+        # Lets the clients relate the times of the chunks to their own clock
+        return {'server_time': time.time() * 1000}
+
+    @socketio.on('live_audio_latency')
+    def handle_live_audio_latency(data):
+        latency = data.get('latency_ms') if isinstance(data, dict) else None
+        if isinstance(latency, (int, float)) and 0 <= latency < 60000:
+            live_audio.report_latency(request.sid, latency)
+
+    @socketio.on('disconnect')
+    def handle_disconnect(*args):
+        spectrum.unsubscribe(request.sid)
+        live_audio.unsubscribe(request.sid)
 
     @app.route('/api/send_dtmf', methods=['POST'])
     def send_dtmf_route():
@@ -248,7 +495,17 @@ def create_app():
 
     @app.route('/api/system-info', methods=['GET'])
     def get_system_info_route():
-        return jsonify(get_system_info()), 200
+        system_info = get_system_info()
+        system_info['Audio Streams'] = audio_health.summary()
+        return jsonify(system_info), 200
+
+    @app.route('/api/audio/health', methods=['GET'])
+    def get_audio_health_route():
+        return jsonify(audio_health.snapshot()), 200
+
+    @app.route('/api/audio/live', methods=['GET'])
+    def get_live_audio_route():
+        return jsonify(live_audio.get_stats()), 200
 
     # Define routes
     @app.route('/')
@@ -263,6 +520,10 @@ def create_app():
     def get_buttons_route():
         return get_buttons()
 
+    @app.route('/api/buttons:batch', methods=['POST'])
+    def batch_buttons_route():
+        return batch_buttons()
+
     @app.route('/api/buttons/<uuid:uuid_id>', methods=['PUT'])
     def update_button_route(uuid_id):
         return update_button(uuid_id)
@@ -288,13 +549,8 @@ def create_app():
         category_uuid = request.args.get('id')
         return category(category_uuid)
 
-    # Background thread to monitor logs
-    def start_log_monitor():
-        log_monitor.start_monitoring()
-
-    thread = Thread(target=start_log_monitor)
-    thread.daemon = True
-    thread.start()
+    # Tail every log from one shared background thread
+    monitors.start_monitoring()
 
     atexit.register(unregister_service)
     register_service()  # Register the service with Zeroconf
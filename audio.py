@@ -19,9 +19,12 @@
 
 import socket
 import numpy as np
-import math
-import select
+import selectors
 import logging
+import struct
+import time
+
+from audio_health import AudioHealth, StreamHealth
 
 # Configure logging
 logging.basicConfig(
@@ -38,49 +41,397 @@ CHANNELS = 2  # Stereo audio
 RATE = 44100  # Sample rate (may need to be adjusted)
 FORMAT = 'h'  # Format of each sample (16-bit integer)
 REFERENCE_PEAK = 32768  # Maximum peak value for 16-bit signed audio
+FLOOR_DB = -30  # Lowest level shown by the VU meters
+CEILING_DB = 3  # Highest level shown by the VU meters
+METER_RATE = 25  # VU meter updates sent to the clients per second
+IDLE_TIMEOUT = 5  # Seconds to wait for audio when no meter update is pending
+CLIP_LEVEL = 32767 / 32768  # Samples at or beyond this fraction of full scale count as clipped
+PEAK_HOLD_SECONDS = 0.5  # How long the peak-hold stays at a peak
+PEAK_DECAY_DB = 5  # How fast the peak-hold falls back afterwards, in dB per second
+BLOCK_PACKETS = 16  # Datagrams received into one block before it is analysed
+BINARY = 'binary'  # Meter updates as packed 'audio_levels_bin' frames, see pack_levels()
+JSON = 'json'  # Meter updates as 'audio_levels' objects, for clients that cannot decode the frames
+METER_FORMATS = (BINARY, JSON)
+SEQUENCE = struct.Struct('<H')
+RESTART_DELAY = 1  # Seconds before the audio monitor is restarted after its first failure
+MAX_RESTART_DELAY = 60  # The delay doubles with every failure in a row, up to this
+STABLE_SECONDS = 300  # A monitor that ran this long before failing starts over from RESTART_DELAY
+STREAM_LAYOUTS = {}  # Channels -> struct of the levels of a stream with that many channels in pack_levels()
+SAMPLE_FORMATS = {'int16': (np.int16, REFERENCE_PEAK), 'float32': (np.float32, 1.0)}  # dtype -> (type, full scale)
+ROLES = ('rx', 'tx')  # Which VU meter of the dashboard shows a source
+DEFAULT_HOST = '127.0.0.1'
+# The raw audio streams of SVXLink, see the README; 'audio_sources' in config.json replaces them
+AUDIO_SOURCES = [
+    {'name': 'rx', 'role': 'rx', 'port': 10001, 'dtype': 'int16', 'channels': CHANNELS},
+    {'name': 'tx', 'role': 'tx', 'port': 10000, 'dtype': 'float32', 'channels': 1}
+]
+
+
+class StreamLevels:
+    """
+    Levels of the channels of one audio stream since the last meter update: peak, RMS, clipped samples and DC offset.
+
+    Blocks of samples, one row per channel, are reduced along the rows, so every channel and every packet of a block
+    are analysed together; the results are scaled to full scale = 1 afterwards. Clipped samples are only counted in
+    the blocks whose peak reaches the clip level. The peak-hold is kept here too: it
+    follows the peaks up, stays for PEAK_HOLD_SECONDS and then falls back by PEAK_DECAY_DB per second.
+
+    The observers get the sums of squares, peak and frames of every block too, through add_block(); the sums of squares
+    are in a buffer reused for the next block.
+
+    Each channel is analysed on its own row, with the magnitudes of the samples written to a preallocated scratch row:
+    NumPy buffers the ufuncs and reductions over a whole block, which would allocate arrays of its size.
+    """
+
+    def __init__(self, channels, reference, observers=()):
+        self.channels = channels
+        self.observers = observers
+        self.reference = reference  # Sample value of a full scale signal
+        self.clip_level = reference * CLIP_LEVEL
+        self.peak = np.zeros(channels)
+        self.sum = np.zeros(channels)
+        self.squares = np.zeros(channels)
+        self.clipped = np.zeros(channels, dtype=np.int64)
+        self.frames = 0
+        self.hold = np.full(channels, float(FLOOR_DB))
+        self.held_until = np.zeros(channels)  # When each hold starts to fall back
+        self.reported = None  # When the last update was taken
+        self.magnitudes = np.empty((channels, 0), dtype=np.float32)  # Scratch rows, grown to the largest block
+        self.clip_flags = np.empty((channels, 0), dtype=bool)
+        self.scratch_rows = {}  # Frames -> [(magnitudes, clip flags)] views of the scratch rows, per channel
+        self.block_squares = np.zeros(channels)  # Sums of squares of the current block, passed to the observers
+
+    def add(self, block):
+        frames = block.shape[1]
+        rows = self.scratch_rows.get(frames)
+        if rows is None:
+            if frames > self.magnitudes.shape[1]:
+                self.magnitudes = np.empty((self.channels, frames), dtype=np.float32)
+                self.clip_flags = np.empty((self.channels, frames), dtype=bool)
+                self.scratch_rows.clear()
+            rows = self.scratch_rows[frames] = list(zip(self.magnitudes[:, :frames], self.clip_flags[:, :frames]))
+        squares = self.block_squares
+        block_peak = 0.0
+        for channel, (samples, (magnitudes, clip_flags)) in enumerate(zip(block, rows)):
+            np.abs(samples, out=magnitudes)
+            peak = magnitudes.max()
+            if peak > self.peak[channel]:
+                self.peak[channel] = peak
+            if peak > block_peak:
+                block_peak = peak
+            self.sum[channel] += samples.sum()
+            squares[channel] = np.dot(samples, samples)
+            if peak >= self.clip_level:
+                self.clipped[channel] += np.count_nonzero(np.greater_equal(magnitudes, self.clip_level, out=clip_flags))
+        self.squares += squares
+        self.frames += frames
+        for observer in self.observers:
+            observer.add_block(squares, block_peak, block.shape[1])
+
+    def report(self, now):
+        """
+        Return arrays of the levels since the last update, in dB except for the clip counts and the DC offsets, and
+        start over.
+        """
+        peak = levels_db(self.peak / self.reference)
+        if self.frames:
+            rms = levels_db(np.sqrt(self.squares / self.frames) / self.reference)
+            dc = self.sum / self.frames / self.reference
+        else:
+            rms = np.full(self.channels, float(FLOOR_DB))
+            dc = np.zeros(self.channels)
+        if self.reported is not None:
+            falling = np.clip(now - np.maximum(self.held_until, self.reported), 0, None)
+            self.hold = np.maximum(self.hold - PEAK_DECAY_DB * falling, FLOOR_DB)
+        rising = peak >= self.hold
+        self.hold = np.where(rising, peak, self.hold)
+        self.held_until = np.where(rising, now + PEAK_HOLD_SECONDS, self.held_until)
+        self.reported = now
+        levels = {'peak': peak, 'rms': rms, 'hold': self.hold, 'clip': self.clipped.copy(), 'dc': dc}
+        self.peak.fill(0)
+        self.sum.fill(0)
+        self.squares.fill(0)
+        self.clipped.fill(0)
+        self.frames = 0
+        return levels
+
+
+class MeterEmitter:
+    """
+    Send the levels of all the audio sources to the clients in one message, at most rate times per second: a binary
+    'audio_levels_bin' frame, or an 'audio_levels' object in the JSON format. Both carry a sequence number. Updates go
+    on while a peak-hold falls back, even without audio; once everything is at the floor, one message says so and
+    nothing more is sent until there is audio again.
+    """
+
+    def __init__(self, socketio, rate=METER_RATE, streams=None, meter_format=BINARY):
+        if meter_format not in METER_FORMATS:
+            raise ValueError(f"Unknown meter format {meter_format}, expected one of {', '.join(METER_FORMATS)}")
+        self.socketio = socketio
+        self.format = meter_format
+        self.interval = 1.0 / rate
+        self.streams = streams or {'rx': StreamLevels(CHANNELS, REFERENCE_PEAK), 'tx': StreamLevels(1, 1.0)}
+        self.window_start = None  # When the first audio of the pending update arrived
+        self.silent = True  # The last update sent had every level at the floor
+        self.sent = 0
+        self.sequence = 0  # Of the next update, wrapping at 16 bits
+
+    def mark(self, now):
+        """
+        Note that audio was added to the streams.
+        """
+        if self.window_start is None:
+            self.window_start = now
+
+    def timeout(self, now):
+        """
+        Return the seconds left before the pending update is due, or None when no update is pending.
+        """
+        if self.window_start is None:
+            return None
+        return max(0.0, self.window_start + self.interval - now)
+
+    def flush(self, now):
+        if self.window_start is None or now - self.window_start < self.interval:
+            return
+        levels = {name: stream.report(now) for name, stream in self.streams.items()}
+        # The holds are never below the peaks
+        silent = all(stream['hold'].max() <= FLOOR_DB for stream in levels.values())
+        if not (silent and self.silent):
+            if self.format == BINARY:
+                self.socketio.emit('audio_levels_bin', pack_levels(self.sequence, levels), namespace='/')
+            else:
+                self.socketio.emit('audio_levels', levels_to_json(self.sequence, levels), namespace='/')
+            self.sequence = (self.sequence + 1) & 0xFFFF
+            self.sent += 1
+        self.silent = silent
+        self.window_start = None if silent else now
 
 
-def start_audio_monitor(stop_event, socketio):
-    # Setting up the first UDP socket on port 10000
-    udp_ip = '127.0.0.1'
-    udp_port = 10000
-    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-    sock.bind((udp_ip, udp_port))
-    sock.setblocking(False)
+def pack_levels(sequence, levels):
+    """
+    Pack meter levels into a binary frame, little-endian: the uint16 sequence number, then for each stream, in the
+    order of the audio sources, its number of channels n as uint8, n int8 peaks, n int8 RMS levels and n int8
+    peak-holds in quarter dB, n uint16 clip counts and n int16 DC offsets in 1/32768 of full scale.
+    """
+    parts = [SEQUENCE.pack(sequence)]
+    for stream in levels.values():
+        channels = len(stream['peak'])
+        layout = STREAM_LAYOUTS.get(channels)
+        if layout is None:
+            layout = STREAM_LAYOUTS[channels] = struct.Struct(f"<B{3 * channels}b{channels}H{channels}h")
+        parts.append(layout.pack(channels,
+                                 *[round(value * 4) for value in stream['peak'].tolist()],
+                                 *[round(value * 4) for value in stream['rms'].tolist()],
+                                 *[round(value * 4) for value in stream['hold'].tolist()],
+                                 *[min(count, 0xFFFF) for count in stream['clip'].tolist()],
+                                 *[max(-32768, min(32767, round(value * 32768))) for value in stream['dc'].tolist()]))
+    return b''.join(parts)
 
-    # Setting up the second UDP socket on port 10001 for 16-bit stereo audio
-    udp_port2 = 10001
-    sock2 = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-    sock2.bind((udp_ip, udp_port2))
-    sock2.setblocking(False)
 
-    logging.info("UDP sockets bound to %s:%d and %s:%d", udp_ip, udp_port, udp_ip, udp_port2)
+def levels_to_json(sequence, levels):
+    message = {'seq': sequence}
+    for name, stream in levels.items():
+        message[name] = {
+            'peak': [round(value, 1) for value in stream['peak'].tolist()],
+            'rms': [round(value, 1) for value in stream['rms'].tolist()],
+            'hold': [round(value, 1) for value in stream['hold'].tolist()],
+            'clip': stream['clip'].tolist(),
+            'dc': [round(value, 4) for value in stream['dc'].tolist()]
+        }
+    return message
 
+
+def levels_db(values):
+    """
+    Convert an array of levels relative to full scale to dB, within the range of the VU meters.
+    """
+    return np.clip(20 * np.log10(np.maximum(values, 1e-9)), FLOOR_DB, CEILING_DB)
+
+
+class UdpLevelReader:
+    """
+    Receive the datagrams of one raw audio stream into a preallocated block and pass them to its StreamLevels.
+
+    Datagrams are read with recv_into at consecutive offsets of the block until the socket is drained or the block is
+    full, and the block is then analysed as a whole and written to the sinks (an AudioRing of the recent audio, a
+    SpectrumAnalyzer...), through views of it created once per size. The channels are first copied apart into a
+    preallocated float32 block with one row per channel, because NumPy reduces contiguous rows much faster than
+    interleaved channels; mono float32 samples are used as they are. Every datagram is counted in health.
+    """
+
+    def __init__(self, sock, dtype, channels, packet_size, levels, block_packets=BLOCK_PACKETS, sinks=(),
+                 health=None):
+        self.sock = sock
+        self.packet_size = packet_size
+        self.buffer = bytearray(packet_size * block_packets)
+        self.memory = memoryview(self.buffer)
+        self.samples = np.frombuffer(self.buffer, dtype=dtype).reshape(-1, channels)
+        self.frame_size = self.samples.itemsize * channels
+        self.scaled = None
+        if self.samples.dtype != np.float32 or channels > 1:
+            self.scaled = np.empty((channels, len(self.samples)), dtype=np.float32)
+        self.levels = levels
+        self.sinks = sinks  # Objects whose write() takes the received frames, one row per frame
+        self.views = {}  # Frames in the block -> (received frames, received samples by channel, samples by channel)
+        self.packets = 0
+        self.health = health or StreamHealth(sock.getsockname()[1], packet_size,
+                                             packet_size // self.frame_size / RATE)
+
+    def drain(self):
+        """
+        Read every datagram waiting on the socket and analyse them. Returns the number of datagrams read.
+        """
+        recv_into = self.sock.recv_into
+        arrived = self.health.arrived
+        limit = len(self.buffer) - self.packet_size
+        offset = 0
+        read = 0
+        block_packets = 0
+        while True:
+            try:
+                size = recv_into(self.memory[offset:], self.packet_size)
+            except BlockingIOError:
+                break
+            arrived(size, time.monotonic())
+            read += 1
+            block_packets += 1
+            offset += size - size % self.frame_size  # A trailing partial frame is dropped
+            if offset > limit:
+                self.analyse(offset, block_packets)
+                offset = 0
+                block_packets = 0
+        if offset:
+            self.analyse(offset, block_packets)
+        self.packets += read
+        return read
+
+    def analyse(self, size, packets):
+        started = time.perf_counter()
+        frames = size // self.frame_size
+        views = self.views.get(frames)
+        if views is None:
+            received = self.samples[:frames]
+            views = self.views[frames] = (received, received.T,
+                                          received.T if self.scaled is None else self.scaled[:, :frames])
+        received, samples, block = views
+        if self.scaled is not None:
+            np.copyto(block, samples, casting='unsafe')
+        self.levels.add(block)
+        for sink in self.sinks:
+            sink.write(received)
+        self.health.processed(packets, size, time.perf_counter() - started, time.monotonic())
+
+
+def parse_audio_sources(sources):
+    """
+    Check the audio sources of the configuration and fill in their defaults. Each source is a dict with a port and a
+    role, and optionally a name (the role and port by default), a host, a dtype, a number of channels, a sample rate
+    and the number of frames in a datagram. Raises ValueError on an invalid source.
+    """
+    parsed = []
+    for source in sources:
+        if not isinstance(source, dict):
+            raise ValueError("Each audio source must be an object")
+        role = source.get('role')
+        if role not in ROLES:
+            raise ValueError(f"Unknown audio source role {role}, expected one of {', '.join(ROLES)}")
+        port = source.get('port')
+        if not isinstance(port, int) or not 0 < port < 65536:
+            raise ValueError(f"Invalid UDP port {port} of an audio source")
+        dtype = source.get('dtype', 'int16')
+        if dtype not in SAMPLE_FORMATS:
+            raise ValueError(f"Unknown sample format {dtype}, expected one of {', '.join(SAMPLE_FORMATS)}")
+        parsed_source = {
+            'name': str(source.get('name', f"{role}:{port}")),
+            'role': role,
+            'host': source.get('host', DEFAULT_HOST),
+            'port': port,
+            'dtype': dtype,
+            'channels': source.get('channels', 1),
+            'rate': source.get('rate', RATE),
+            'frames': source.get('frames', CHUNK)
+        }
+        for key in ('channels', 'rate', 'frames'):
+            if not isinstance(parsed_source[key], int) or parsed_source[key] < 1:
+                raise ValueError(f"The {key} of audio source {parsed_source['name']} must be a positive integer")
+        if parsed_source['channels'] > 255:
+            raise ValueError(f"Audio source {parsed_source['name']} has more than 255 channels")
+        if parsed_source['name'] == 'seq' or parsed_source['name'] in (other['name'] for other in parsed):
+            raise ValueError(f"Duplicate or reserved audio source name {parsed_source['name']}")
+        if (parsed_source['host'], port) in ((other['host'], other['port']) for other in parsed):
+            raise ValueError(f"More than one audio source on {parsed_source['host']}:{port}")
+        parsed.append(parsed_source)
+    return parsed
+
+
+def supervise_audio_monitor(stop_event, socketio, sources=AUDIO_SOURCES, meter_rate=METER_RATE, sinks=None,
+                            meter_format=BINARY, health=None, observers=None):
+    """
+    Run the audio monitor until stop_event is set, restarting it when it fails, after a delay that grows while the
+    failures go on.
+    """
+    health = health or AudioHealth()
+    delay = RESTART_DELAY
+    while not stop_event.is_set():
+        started = time.monotonic()
+        try:
+            start_audio_monitor(stop_event, socketio, sources, meter_rate, sinks, meter_format, health, observers)
+        except Exception as e:
+            health.failed(e)
+            if time.monotonic() - started > STABLE_SECONDS:
+                delay = RESTART_DELAY
+            logging.critical("Error processing audio data: %s; restarting the audio monitor in %d s", e, delay)
+            if stop_event.wait(delay):
+                break
+            delay = min(delay * 2, MAX_RESTART_DELAY)
+            health.restarts += 1
+
+
+def start_audio_monitor(stop_event, socketio, sources=AUDIO_SOURCES, meter_rate=METER_RATE, sinks=None,
+                        meter_format=BINARY, health=None, observers=None):
+    """
+    Meter the audio sources until stop_event is set. Errors are raised to the caller, see supervise_audio_monitor().
+
+    Every source has its own UDP socket, all of them registered with one selector (epoll on Linux) and served by this
+    thread, however many there are. sinks maps source names to the sinks their audio is also written to, observers
+    to the observers of their StreamLevels.
+    """
+    health = health or AudioHealth()
+    sinks = sinks or {}
+    observers = observers or {}
+    sources = parse_audio_sources(sources)
+    meter = MeterEmitter(socketio, meter_rate, meter_format=meter_format, streams={
+        source['name']: StreamLevels(source['channels'], SAMPLE_FORMATS[source['dtype']][1],
+                                     observers=observers.get(source['name'], ())) for source in sources})
+    selector = selectors.DefaultSelector()
+    sockets = []
     try:
+        for source in sources:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            sockets.append(sock)
+            sock.bind((source['host'], source['port']))
+            sock.setblocking(False)
+            dtype = SAMPLE_FORMATS[source['dtype']][0]
+            packet_size = source['frames'] * source['channels'] * np.dtype(dtype).itemsize
+            reader = UdpLevelReader(sock, dtype, source['channels'], packet_size, meter.streams[source['name']],
+                                    sinks=sinks.get(source['name'], ()),
+                                    health=health.stream(source['name'], source['port'], packet_size,
+                                                         source['frames'] / source['rate']))
+            selector.register(sock, selectors.EVENT_READ, reader)
+            logging.info("Audio source %s (%s) bound to %s:%d", source['name'], source['role'], source['host'],
+                         source['port'])
+
+        health.running = True
         while not stop_event.is_set():
-            readable, _, _ = select.select([sock, sock2], [], [], 5)  # Check both sockets
-            for s in readable:
-                if s is sock:
-                    data, addr = s.recvfrom(CHUNK * 4)  # Float32 data handling from first socket
-                    if data:
-                        ndarray = np.frombuffer(data, dtype=np.float32)
-                        peak = np.max(np.abs(ndarray))
-                        db = 20 * math.log10(peak + 1e-40) if peak > 0 else -30
-                        db = max(-30, min(3, db))
-                        socketio.emit('audio_level_tx', {'level': db}, namespace='/')
-                        logging.debug("Audio level emitted from %s: %f dB", addr, db)
-                elif s is sock2:
-                    data, addr = s.recvfrom(CHUNK * BYTES_PER_SAMPLE * CHANNELS)  # Int16 stereo data handling
-                    if data:
-                        ndarray = np.frombuffer(data, dtype=np.int16).reshape(-1, 2)
-                        peak = np.max(np.abs(ndarray))
-                        db = 20 * math.log10(peak / REFERENCE_PEAK + 1e-40)
-                        db = max(-30, min(3, db))
-                        socketio.emit('audio_level_rx', {'level': db}, namespace='/')
-                        logging.debug("Audio level emitted from %s: %f dB", addr, db)
-    except Exception as e:
-        logging.critical("Error processing audio data: %s", e)
+            timeout = meter.timeout(time.monotonic())
+            for key, _ in selector.select(IDLE_TIMEOUT if timeout is None else timeout):
+                if key.data.drain():
+                    meter.mark(time.monotonic())
+            meter.flush(time.monotonic())
     finally:
-        sock.close()
-        sock2.close()
+        health.running = False
+        selector.close()
+        for sock in sockets:
+            sock.close()
         logging.info("Stopping audio monitor...")
@@ -0,0 +1,149 @@
+#  Copyright (c) 2024 by Silviu Stroe (brainic.io)
+#  #
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#  #
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU General Public License for more details.
+#  #
+#  You should have received a copy of the GNU General Public License
+#  along with this program. If not, see <http://www.gnu.org/licenses/>.
+#  #
+#  Created on 10/18/26, 11:50 PM
+#  #
+#  Author: Silviu Stroe
+
+import time
+from datetime import datetime
+
+from metrics import Histogram, RateMeter
+
+GAP_PERIODS = 4  # A datagram arriving this many packet periods after the previous one ends a gap
+PROCESSING_BUCKETS_US = [5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000]
+
+
+class StreamHealth:
+    """
+    Counters of one UDP audio stream, kept up to date by its reader for every datagram.
+
+    Times are those at which the receive loop reads the datagrams, so the inter-arrival times and the jitter include
+    the scheduling delays of the loop itself. The jitter is a running mean of the deviation of the inter-arrival times
+    from the packet period, as in RFC 3550.
+    """
+
+    def __init__(self, port, packet_size, period):
+        self.port = port
+        self.packet_size = packet_size  # Expected size of a datagram
+        self.period = period  # Seconds of audio in a datagram of the expected size
+        self.packets = 0
+        self.bytes = 0
+        self.truncated = 0  # Datagrams of another size than expected
+        self.gaps = 0
+        self.longest_gap = 0.0
+        self.jitter = 0.0
+        self.last_arrival = None
+        self.interarrival = Histogram()  # Milliseconds between two datagrams
+        self.processing = Histogram(PROCESSING_BUCKETS_US)  # Microseconds of analysis per datagram
+        self.packet_rate = RateMeter()
+        self.byte_rate = RateMeter()
+
+    def arrived(self, size, now):
+        """
+        Count a datagram of size bytes read at monotonic time now.
+        """
+        self.packets += 1
+        self.bytes += size
+        if size != self.packet_size:
+            self.truncated += 1
+        if self.last_arrival is not None:
+            interval = now - self.last_arrival
+            self.interarrival.observe(interval * 1000)
+            self.jitter += (abs(interval - self.period) - self.jitter) / 16
+            if interval > GAP_PERIODS * self.period:
+                self.gaps += 1
+                if interval > self.longest_gap:
+                    self.longest_gap = interval
+        self.last_arrival = now
+
+    def processed(self, packets, size, seconds, now):
+        """
+        Count the analysis of packets datagrams holding size bytes, which took seconds.
+        """
+        self.processing.observe(seconds * 1e6 / packets)
+        self.packet_rate.mark(packets, now)
+        self.byte_rate.mark(size, now)
+
+    def snapshot(self, now=None):
+        now = now if now is not None else time.monotonic()
+        return {
+            'port': self.port,
+            'packets': self.packets,
+            'bytes': self.bytes,
+            'packet_rate': self.packet_rate.rate(now),
+            'byte_rate': self.byte_rate.rate(now),
+            'expected_packet_rate': 1 / self.period,
+            'truncated': self.truncated,
+            'gaps': self.gaps,
+            'longest_gap_ms': self.longest_gap * 1000,
+            'jitter_ms': self.jitter * 1000,
+            'last_packet_age': None if self.last_arrival is None else now - self.last_arrival,
+            'interarrival_ms': self.interarrival.snapshot(),
+            'processing_us': self.processing.snapshot()
+        }
+
+
+class AudioHealth:
+    """
+    Health of the audio monitor: whether its loop runs, its failures and restarts, and the StreamHealth of each
+    stream, which outlive the restarts.
+    """
+
+    def __init__(self):
+        self.streams = {}  # Stream name -> StreamHealth
+        self.running = False
+        self.restarts = 0
+        self.last_error = None
+        self.last_error_time = None
+
+    def stream(self, name, port, packet_size, period):
+        if name not in self.streams:
+            self.streams[name] = StreamHealth(port, packet_size, period)
+        return self.streams[name]
+
+    def failed(self, error):
+        self.running = False
+        self.last_error = f"{type(error).__name__}: {error}"
+        self.last_error_time = datetime.now().isoformat(timespec='seconds')
+
+    def snapshot(self):
+        now = time.monotonic()
+        return {
+            'running': self.running,
+            'restarts': self.restarts,
+            'last_error': self.last_error,
+            'last_error_time': self.last_error_time,
+            'streams': {name: stream.snapshot(now) for name, stream in self.streams.items()}
+        }
+
+    def summary(self):
+        """
+        Return the health in the human-readable form of the system info panel.
+        """
+        now = time.monotonic()
+        summary = {
+            'monitor': 'running' if self.running else 'stopped',
+            'restarts': self.restarts,
+        }
+        if self.last_error:
+            summary['last error'] = f"{self.last_error} at {self.last_error_time}"
+        for name, stream in self.streams.items():
+            age = 'never' if stream.last_arrival is None else f"{now - stream.last_arrival:.1f} s ago"
+            summary[f"{name.upper()} (UDP {stream.port})"] = (
+                f"{stream.packet_rate.rate(now):.1f} packets/s of {1 / stream.period:.1f}, "
+                f"{stream.byte_rate.rate(now) / 1024:.1f} KiB/s, jitter {stream.jitter * 1000:.1f} ms, "
+                f"{stream.gaps} gaps, {stream.truncated} truncated, last packet {age}")
+        return summary
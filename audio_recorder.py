@@ -0,0 +1,254 @@
+#  Copyright (c) 2024 by Silviu Stroe (brainic.io)
+#  #
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#  #
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU General Public License for more details.
+#  #
+#  You should have received a copy of the GNU General Public License
+#  along with this program. If not, see <http://www.gnu.org/licenses/>.
+#  #
+#  Created on 10/18/26, 9:45 PM
+#  #
+#  Author: Silviu Stroe
+
+import logging
+import os
+import re
+import time
+import wave
+from datetime import datetime
+from threading import Event, Lock, Thread
+
+import numpy as np
+
+from audio import CHANNELS, RATE
+
+# Set up logging to file
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(module)s - %(levelname)s: %(message)s',
+    filename='/tmp/saycharlie.log',
+    filemode='a'  # Use 'a' to append to the file
+)
+
+CLIPS_DIR = 'clips'
+RING_SECONDS = 60  # Recent RX audio kept in memory; the writer only needs to stay this close behind
+PRE_ROLL_SECONDS = 1.0  # Audio kept from before the talker start was logged
+POST_ROLL_SECONDS = 0.5  # Audio kept after the talker stop was logged
+MAX_CLIP_SECONDS = 600
+CLIP_RATE = 11025  # Sample rate the clips are downsampled to, at most
+WRITE_INTERVAL = 1.0  # Seconds between two passes of the writer thread
+MAX_CLIPS_MB = 1024  # Total size of the clips kept; the oldest ones are removed first
+MAX_CLIP_DAYS = 30  # Age of the oldest clip kept
+PRUNE_INTERVAL = 60  # Seconds between two prunings of the clips directory
+UNSAFE_CHARACTERS = re.compile(r'[^A-Za-z0-9-]')
+
+
+class AudioRing:
+    """
+    The last seconds of an audio stream, in a preallocated array of int16 frames.
+
+    Frames are numbered from the start of the stream; written is the number of the next one. Only the receive loop
+    writes, and read() tells when the frames it copied were overwritten meanwhile, so no lock is needed.
+    """
+
+    def __init__(self, seconds=RING_SECONDS, rate=RATE, channels=CHANNELS):
+        self.rate = rate
+        self.channels = channels
+        self.frames = np.zeros((int(seconds * rate), channels), dtype=np.int16)
+        self.capacity = len(self.frames)
+        self.written = 0
+
+    def write(self, samples):
+        """
+        Append a block of int16 samples with one row per frame.
+        """
+        count = len(samples)
+        if count > self.capacity:
+            samples = samples[-self.capacity:]
+            self.written += count - self.capacity
+            count = self.capacity
+        position = self.written % self.capacity
+        first = min(count, self.capacity - position)
+        self.frames[position:position + first] = samples[:first]
+        self.frames[:count - first] = samples[first:]
+        self.written += count
+
+    def read(self, start, end):
+        """
+        Return a copy of frames start to end, or None if they are no longer in the ring.
+        """
+        if start < self.written - self.capacity:
+            return None
+        first, last = start % self.capacity, end % self.capacity
+        if end - start == 0:
+            block = self.frames[:0].copy()
+        elif first < last:
+            block = self.frames[first:last].copy()
+        else:
+            block = np.concatenate((self.frames[first:], self.frames[:last]))
+        if start < self.written - self.capacity:
+            return None  # Overwritten while copying
+        return block
+
+
+class AudioRecorder:
+    """
+    Record one WAV clip of the RX audio per talker session.
+
+    The receive loop writes the audio to an AudioRing. LogMonitor calls start_clip() and stop_clip() when a talker
+    starts and stops; these only note frame numbers, and a writer thread appends the audio of the open clips to their
+    files every WRITE_INTERVAL seconds, downmixed to mono and downsampled by an integer factor to about clip_rate.
+
+    The writer also removes the clips older than max_days and then the oldest ones beyond max_mb in total, every
+    PRUNE_INTERVAL seconds; the clips being written are kept.
+    """
+
+    def __init__(self, clips_dir=CLIPS_DIR, clip_rate=CLIP_RATE, ring=None, max_mb=MAX_CLIPS_MB,
+                 max_days=MAX_CLIP_DAYS):
+        if not max_mb > 0 or not max_days > 0:
+            raise ValueError("The maximum size and age of the audio clips must be positive")
+        self.clips_dir = clips_dir
+        self.max_bytes = max_mb * 2 ** 20
+        self.max_age = max_days * 86400
+        self.pruned_at = None  # Monotonic time of the last pruning of the clips directory
+        self.ring = ring or AudioRing()
+        self.factor = max(1, self.ring.rate // clip_rate)  # Frames averaged into one clip sample
+        self.clip_rate = self.ring.rate // self.factor
+        self.clips = {}  # Clip file name -> clip state, while being written
+        self.lock = Lock()
+        self.stop_event = Event()
+        self.writer = Thread(target=self._run_writer, daemon=True)
+
+    def start(self):
+        os.makedirs(self.clips_dir, exist_ok=True)
+        self.writer.start()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.writer.is_alive():
+            self.writer.join()
+        with self.lock:
+            for clip in self.clips.values():
+                clip['end'] = min(clip['end'] or self.ring.written, self.ring.written)
+        self.write_clips()
+
+    def start_clip(self, session):
+        """
+        Start the clip of a talker session. Returns its file name, relative to clips_dir.
+        """
+        start = datetime.fromisoformat(session['start_date_time'])
+        name = (f"{start:%Y%m%d-%H%M%S}_{UNSAFE_CHARACTERS.sub('-', session['callsign'])}"
+                f"_TG{session['tg_number']}.wav")
+        first = max(0, self.ring.written - int(PRE_ROLL_SECONDS * self.ring.rate),
+                    self.ring.written - self.ring.capacity)
+        with self.lock:
+            self.clips[name] = {
+                'start': first,
+                'position': first,  # Next frame to write
+                'end': None,  # Frame after the last one, once the talker stopped
+                'received': self.ring.written,  # Frames written to the ring when the talker started
+                'file': None
+            }
+        return name
+
+    def stop_clip(self, name):
+        """
+        End a clip. Returns its file name, or None when no audio was received during the session.
+        """
+        with self.lock:
+            clip = self.clips.get(name)
+            if clip is None:
+                return None
+            if self.ring.written == clip['received']:
+                self.clips.pop(name)
+                return None
+            clip['end'] = self.ring.written + int(POST_ROLL_SECONDS * self.ring.rate)
+        return name
+
+    def _run_writer(self):
+        while not self.stop_event.wait(WRITE_INTERVAL):
+            self.write_clips()
+            if self.pruned_at is None or time.monotonic() - self.pruned_at >= PRUNE_INTERVAL:
+                self.pruned_at = time.monotonic()
+                self.prune_clips()
+
+    def prune_clips(self):
+        """
+        Remove the clips older than max_age seconds, then the oldest ones until they fit in max_bytes. Returns the
+        number of clips removed.
+        """
+        with self.lock:
+            writing = set(self.clips)
+        try:
+            clips = sorted((entry.stat().st_mtime, entry.stat().st_size, entry.name)
+                           for entry in os.scandir(self.clips_dir)
+                           if entry.name.endswith('.wav') and entry.name not in writing and entry.is_file())
+        except OSError as e:
+            logging.error(f"Failed to list the audio clips: {e}")
+            return 0
+        total = sum(size for _, size, _ in clips)
+        cutoff = time.time() - self.max_age
+        removed = 0
+        for modified, size, name in clips:
+            if modified >= cutoff and total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.clips_dir, name))
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logging.error(f"Failed to remove audio clip {name}: {e}")
+                continue
+            total -= size
+            removed += 1
+        if removed:
+            logging.info(f"Removed {removed} old audio clips")
+        return removed
+
+    def write_clips(self):
+        with self.lock:
+            clips = list(self.clips.items())
+        for name, clip in clips:
+            try:
+                done = self.write_clip(name, clip)
+            except OSError as e:
+                logging.error(f"Failed to write audio clip {name}: {e}")
+                done = True
+            if done:
+                if clip['file'] is not None:
+                    clip['file'].close()
+                with self.lock:
+                    self.clips.pop(name, None)
+
+    def write_clip(self, name, clip):
+        """
+        Append the audio received since the last pass to a clip. Returns True once the clip is complete.
+        """
+        limit = clip['start'] + int(MAX_CLIP_SECONDS * self.ring.rate)
+        if clip['end'] is not None:
+            limit = min(limit, clip['end'])
+        end = min(self.ring.written, limit)
+        end -= (end - clip['position']) % self.factor  # Whole clip samples only; the rest waits for the next pass
+        frames = self.ring.read(clip['position'], end)
+        if frames is None:
+            logging.warning(f"Audio clip {name} fell behind the audio ring and was cut short")
+            return True
+        if len(frames):
+            if clip['file'] is None:
+                clip['file'] = wave.open(os.path.join(self.clips_dir, name), 'wb')
+                clip['file'].setnchannels(1)
+                clip['file'].setsampwidth(2)
+                clip['file'].setframerate(self.clip_rate)
+            # Mean of the channels and of every factor frames: the downmix and a simple anti-aliasing filter
+            samples = frames.reshape(-1, self.factor * self.ring.channels).mean(axis=1)
+            clip['file'].writeframes(samples.astype('<i2').tobytes())
+            clip['position'] = end
+        # A clip at its maximum length waits for the talker stop, which stop_clip() reports for it
+        return clip['end'] is not None and clip['position'] + self.factor > limit
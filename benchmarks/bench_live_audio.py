@@ -0,0 +1,115 @@
+#  Copyright (c) 2024 by Silviu Stroe (brainic.io)
+#  #
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#  #
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU General Public License for more details.
+#  #
+#  You should have received a copy of the GNU General Public License
+#  along with this program. If not, see <http://www.gnu.org/licenses/>.
+#  #
+#  Created on 10/19/26, 12:40 AM
+#  #
+#  Author: Silviu Stroe
+
+
+"""
+Measure the CPU cost of the live RX audio stream for a number of listening clients, connected through the
+Flask-SocketIO test client, and show how the per-client queues bound the latency of a slow client.
+
+The RX audio is simulated, without waiting in real time: int16 stereo packets of 1024 frames at 44.1 kHz carrying a
+tone and noise, written to the LiveAudioStreamer as the receive loop does. The test client does not acknowledge
+messages, so every client acknowledges its chunks right away here, except one slow client added to each run, which only
+acknowledges a chunk every --slow-period seconds. CPU is the process time spent in the streamer and in sending the
+chunks, as a percentage of the audio duration.
+
+Usage: python benchmarks/bench_live_audio.py [--seconds 60] [--clients 0 1 5 20] [--rate 11025] [--slow-period 0.1]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask, request  # noqa: E402
+from flask_socketio import SocketIO  # noqa: E402
+
+from audio import CHANNELS, CHUNK, RATE  # noqa: E402
+from live_audio import LiveAudioStreamer, MAX_IN_FLIGHT, QUEUE_CHUNKS  # noqa: E402
+
+
+def simulated_packets(seconds):
+    rng = np.random.default_rng(3)
+    packets = []
+    for packet in range(int(seconds * RATE / CHUNK)):
+        t = (packet * CHUNK + np.arange(CHUNK)) / RATE
+        signal = 8000 * np.sin(2 * np.pi * 1000 * t) + rng.normal(0, 300, CHUNK)
+        packets.append(np.repeat(signal.astype(np.int16)[:, None], CHANNELS, axis=1))
+    return packets
+
+
+def run(clients, seconds, live_rate, slow_period, packets):
+    app = Flask(__name__)
+    socketio = SocketIO(app)
+    live_audio = LiveAudioStreamer(socketio, live_rate=live_rate)
+    sids = []
+
+    @socketio.on('subscribe_live_audio')
+    def handle_subscribe_live_audio():
+        live_audio.subscribe(request.sid)
+        sids.append(request.sid)
+
+    test_clients = [socketio.test_client(app) for _ in range(clients + 1)]
+    for client in test_clients:
+        client.emit('subscribe_live_audio')
+    fast, slow = list(zip(test_clients, sids))[:-1], sids[-1]
+    received = 0
+    cpu = 0.0
+    next_slow_ack = slow_period
+    for number, packet in enumerate(packets):
+        begin = time.process_time()
+        live_audio.write(packet)
+        for client, sid in fast:
+            for _ in client.get_received():
+                received += 1
+                live_audio.acknowledged(sid)
+        if number * CHUNK / RATE >= next_slow_ack:
+            live_audio.acknowledged(slow)
+            next_slow_ack += slow_period
+        cpu += time.process_time() - begin
+    slow_client = live_audio.clients[slow]
+    for client in test_clients:
+        client.disconnect()
+    chunk_seconds = live_audio.chunk_samples / live_audio.rate
+    print(f"{clients:3d}+1 clients {live_audio.chunks / seconds:5.1f} chunks/s "
+          f"{live_audio.get_stats()['bytes_per_second'] / 1024:5.2f} KiB/s per client "
+          f"{received / seconds:7.1f} deliveries/s {cpu / seconds * 100:6.2f}% CPU; slow client got "
+          f"{slow_client['sent']} chunks, {slow_client['dropped']} dropped, at most "
+          f"{(MAX_IN_FLIGHT + QUEUE_CHUNKS) * chunk_seconds * 1000:.0f} ms behind")
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument('--seconds', type=int, default=60, help="seconds of audio simulated")
+    arg_parser.add_argument('--clients', type=int, nargs='+', default=[0, 1, 5, 20])
+    arg_parser.add_argument('--rate', type=int, default=11025, help="sample rate of the live audio")
+    arg_parser.add_argument('--slow-period', type=float, default=0.1,
+                            help="seconds between two acknowledgements of the slow client")
+    args = arg_parser.parse_args()
+
+    packets = simulated_packets(args.seconds)
+    for clients in args.clients:
+        run(clients, args.seconds, args.rate, args.slow_period, packets)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+#  Copyright (c) 2024 by Silviu Stroe (brainic.io)
+#  #
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#  #
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU General Public License for more details.
+#  #
+#  You should have received a copy of the GNU General Public License
+#  along with this program. If not, see <http://www.gnu.org/licenses/>.
+#  #
+#  Created on 10/18/26, 5:40 PM
+#  #
+#  Author: Silviu Stroe
+
+"""
+Compare EventMatcher's single combined regex against trying one regex per event rule, on the lines of a synthetic
+svxlink log that pass the marker prefilter.
+
+Usage: python benchmarks/bench_log_events.py [--lines 1000000]
+"""
+
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from log_events import EVENT_RULES, EventMatcher  # noqa: E402
+
+STAMP = 'Wed May  8 18:53:29 2024'
+
+# Marked lines in roughly the proportions svxlink writes them around reflector traffic
+LINES = [
+    (8, "ReflectorLogic: Talker start on TG #226: YO6SAY"),
+    (8, "ReflectorLogic: Talker stop on TG #226: YO6SAY"),
+    (16, "Rx1: The squelch is OPEN (27.3)"),
+    (16, "Rx1: The squelch is CLOSED (4.8)"),
+    (4, "ReflectorLogic: Selecting TG #226"),
+    (1, "ReflectorLogic: Connection established to 44.1.2.3:5300"),
+    (1, "ReflectorLogic: Disconnected from 44.1.2.3:5300: Connection refused"),
+    (2, "YO6SAY-L: EchoLink QSO state changed to CONNECTED"),
+]
+
+
+class SequentialMatcher:
+    """One regex per rule, tried in table order until one matches."""
+
+    def __init__(self, rules):
+        self.rules = [(rule['name'], re.compile(rule['pattern'])) for rule in rules]
+
+    def match(self, line):
+        separator = line.find(': ')
+        for name, regex in self.rules:
+            match = regex.match(line, separator + 2)
+            if match is not None:
+                return name, line[:separator], match.groupdict()
+        return None
+
+
+def run(label, match, lines):
+    begin = time.perf_counter()
+    for line in lines:
+        match(line)
+    elapsed = time.perf_counter() - begin
+    rate = len(lines) / elapsed
+    print(f"{label:<12} {elapsed:8.2f} s {rate:14,.0f} lines/sec")
+    return rate
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument('--lines', type=int, default=1_000_000)
+    args = arg_parser.parse_args()
+
+    random.seed(42)
+    weights, texts = zip(*LINES)
+    lines = [f"{STAMP}: {text}" for text in random.choices(texts, weights, k=args.lines)]
+    print(f"{len(lines):,} marked lines, {len(EVENT_RULES)} rules")
+
+    combined, sequential = EventMatcher(), SequentialMatcher(EVENT_RULES)
+    for line in lines[:1000]:
+        assert combined.match(line) == sequential.match(line), line
+
+    baseline = run('sequential', sequential.match, lines)
+    rate = run('combined', EventMatcher().match, lines)
+    print(f"speedup: {rate / baseline:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
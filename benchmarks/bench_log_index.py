@@ -0,0 +1,115 @@
+#  Copyright (c) 2024 by Silviu Stroe (brainic.io)
+#  #
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#  #
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU General Public License for more details.
+#  #
+#  You should have received a copy of the GNU General Public License
+#  along with this program. If not, see <http://www.gnu.org/licenses/>.
+#  #
+#  Created on 10/18/26, 8:05 PM
+#  #
+#  Author: Silviu Stroe
+
+"""
+Time a query for a past window of a large synthetic svxlink log, scanning the log from byte 0 against seeking to the
+region found in the sparse log index.
+
+Usage: python benchmarks/bench_log_index.py [--mib 500] [--window 600]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from log_index import LogIndex  # noqa: E402
+from log_monitor import LogMonitor  # noqa: E402
+from session_store import SessionStore  # noqa: E402
+
+LINES = [
+    "ReflectorLogic: Talker start on TG #226: YO6SAY",
+    "Rx1: The squelch is OPEN (27.3)",
+    "Tx1: Turning the transmitter ON",
+    "Tx1: Turning the transmitter OFF",
+    "Rx1: The squelch is CLOSED (4.8)",
+    "ReflectorLogic: Talker stop on TG #226: YO6SAY",
+]
+
+
+class SilentSocketIO:
+    def emit(self, *args, **kwargs):
+        pass
+
+
+def write_synthetic_log(path, size):
+    """Write about size bytes of log, one line per second. Returns the time of the first line."""
+    first = moment = datetime(2024, 5, 8, 0, 0, 0)
+    block = []
+    written = 0
+    with open(path, 'w') as file:
+        while written < size:
+            stamp = moment.strftime('%a %b ') + f"{moment.day:2d}" + moment.strftime(' %H:%M:%S %Y')
+            line = f"{stamp}: {LINES[int(moment.timestamp()) % len(LINES)]}\n"
+            block.append(line)
+            written += len(line)
+            moment += timedelta(seconds=1)
+            if len(block) == 10000:
+                file.write(''.join(block))
+                block = []
+        file.write(''.join(block))
+    return first.timestamp(), moment.timestamp()
+
+
+def timed(label, function):
+    begin = time.perf_counter()
+    result = function()
+    elapsed = time.perf_counter() - begin
+    print(f"{label:<20} {elapsed * 1000:10.1f} ms")
+    return result, elapsed
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument('--mib', type=int, default=500)
+    arg_parser.add_argument('--window', type=int, default=600, help="seconds of log queried")
+    args = arg_parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        log_file = os.path.join(work_dir, 'svxlink.log')
+        first, last = write_synthetic_log(log_file, args.mib * 2 ** 20)
+        size = os.path.getsize(log_file)
+        store = SessionStore(os.path.join(work_dir, 'sessions.db'))
+        # A missing log makes the monitor start empty; the index is built below
+        monitor = LogMonitor(os.path.join(work_dir, 'missing.log'), SilentSocketIO(), store,
+                             checkpoint_file=os.path.join(work_dir, 'checkpoint.json'))
+        monitor.log_file = log_file
+        print(f"{size / 2 ** 20:.0f} MiB log, {args.window} s window in its middle")
+
+        with open(log_file, 'rb') as file:
+            timed('index build', lambda: monitor.log_index.extend(file, size, monitor.line_timestamp))
+        index = monitor.log_index
+        print(f"{len(index.offsets):,} index entries, {len(index.offsets) * 16 / 1024:.0f} KiB")
+
+        start = first + (last - first) / 2
+        end = start + args.window
+        indexed, indexed_time = timed('indexed query', lambda: list(monitor.read_range(start, end)))
+        monitor.log_index = LogIndex(os.path.join(work_dir, 'empty.idx'))  # No index: read from byte 0
+        scanned, scan_time = timed('full scan', lambda: list(monitor.read_range(start, end)))
+        assert indexed == scanned and len(indexed) == args.window + 1, (len(indexed), len(scanned))
+        print(f"{len(indexed)} lines, speedup: {scan_time / indexed_time:,.0f}x")
+        store.close()
+
+
+if __name__ == '__main__':
+    main()
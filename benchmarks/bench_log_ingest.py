@@ -0,0 +1,142 @@
+#  Copyright (c) 2024 by Silviu Stroe (brainic.io)
+#  #
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#  #
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU General Public License for more details.
+#  #
+#  You should have received a copy of the GNU General Public License
+#  along with this program. If not, see <http://www.gnu.org/licenses/>.
+#  #
+#  Created on 10/18/26, 1:40 PM
+#  #
+#  Author: Silviu Stroe
+
+"""
+Compare the line-by-line log reader against LogMonitor's chunked, prefiltered ingestion on a synthetic svxlink log.
+
+"original" is the reader as it was before the timestamp parser and replay mode: readline(), robust_parse_date() and
+a log record per session. "line-by-line" is the same reader with the current parse_line().
+
+Usage: python benchmarks/bench_log_ingest.py [--qsos 100000] [--noise 20]
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from log_monitor import LogMonitor, LIVE, decode_line, robust_parse_date  # noqa: E402
+from session_store import SessionStore  # noqa: E402
+
+# Lines svxlink writes around reflector traffic, besides the talker lines themselves
+NOISE = [
+    "Tx1: Turning the transmitter ON",
+    "Tx1: Turning the transmitter OFF",
+    "Rx1: The squelch is OPEN (27.3)",
+    "Rx1: The squelch is CLOSED (4.8)",
+    "ReflectorLogic: Selecting TG #226",
+    "ReflectorLogic: Heartbeat timeout",
+    "SimplexLogic: Activating module EchoLink...",
+    "EchoLink directory status changed to ON",
+    "YO6SAY-L: EchoLink QSO state changed to CONNECTED",
+    "SimplexLogic: Sending long identification...",
+    "RepeaterLogic: Rx1: Distortion detected! Please lower the input volume!",
+]
+
+
+class SilentSocketIO:
+    def emit(self, *args, **kwargs):
+        pass
+
+
+class OriginalTimestampParser:
+    parse = staticmethod(robust_parse_date)
+
+
+def write_synthetic_log(path, qsos, noise_per_qso):
+    moment = datetime(2024, 5, 8, 0, 0, 0)
+    random.seed(42)
+    with open(path, 'w') as file:
+        for i in range(qsos):
+            callsign = f"YO{i % 10}SAY"
+            stamp = moment.strftime('%a %b ') + f"{moment.day:2d}" + moment.strftime(' %H:%M:%S %Y')
+            file.write(f"{stamp}: ReflectorLogic: Talker start on TG #226: {callsign}\n")
+            for _ in range(noise_per_qso):
+                file.write(f"{stamp}: {random.choice(NOISE)}\n")
+            moment += timedelta(seconds=random.randint(1, 30))
+            stamp = moment.strftime('%a %b ') + f"{moment.day:2d}" + moment.strftime(' %H:%M:%S %Y')
+            file.write(f"{stamp}: ReflectorLogic: Talker stop on TG #226: {callsign}\n")
+            moment += timedelta(seconds=random.randint(1, 30))
+
+
+def new_monitor(log_file, work_dir, name):
+    store = SessionStore(os.path.join(work_dir, f"{name}.db"), flush_interval=3600)
+    # A missing log makes the monitor start empty, so each reader is timed from byte 0
+    monitor = LogMonitor(os.path.join(work_dir, 'missing.log'), SilentSocketIO(), store,
+                         checkpoint_file=os.path.join(work_dir, f"{name}.json"))
+    monitor.log_file = log_file
+    return monitor, store
+
+
+def read_original(monitor):
+    monitor.timestamp_parser = OriginalTimestampParser()
+    monitor.mode = LIVE
+    read_line_by_line(monitor)
+
+
+def read_line_by_line(monitor):
+    """The previous LogMonitor.read_log(): readline(), decode and match every line."""
+    with open(monitor.log_file, 'rb') as file:
+        while True:
+            raw_line = file.readline()
+            if not raw_line:
+                break
+            monitor.parse_line(decode_line(raw_line))
+    monitor.save_events()
+
+
+def run(label, read, monitor, size, lines):
+    begin = time.perf_counter()
+    read(monitor)
+    elapsed = time.perf_counter() - begin
+    print(f"{label:<14} {elapsed:8.2f} s {lines / elapsed:14,.0f} lines/sec {size / elapsed / 2 ** 20:8.1f} MiB/s")
+    return elapsed
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument('--qsos', type=int, default=100_000)
+    arg_parser.add_argument('--noise', type=int, default=20, help="non-talker lines per QSO")
+    args = arg_parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        log_file = os.path.join(work_dir, 'svxlink.log')
+        write_synthetic_log(log_file, args.qsos, args.noise)
+        size = os.path.getsize(log_file)
+        lines = args.qsos * (args.noise + 2)
+        print(f"{lines:,} lines, {size / 2 ** 20:.1f} MiB, {2 / (args.noise + 2):.1%} talker lines")
+
+        elapsed = {}
+        for label, read in (('original', read_original), ('line-by-line', read_line_by_line),
+                            ('chunked', LogMonitor.read_log)):
+            monitor, store = new_monitor(log_file, work_dir, label)
+            elapsed[label] = run(label, read, monitor, size, lines)
+            store.close()
+
+        print(f"chunked speedup: {elapsed['original'] / elapsed['chunked']:.1f}x over original, "
+              f"{elapsed['line-by-line'] / elapsed['chunked']:.1f}x over line-by-line")
+
+
+if __name__ == '__main__':
+    main()
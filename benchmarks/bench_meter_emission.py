@@ -0,0 +1,128 @@
+#  Copyright (c) 2024 by Silviu Stroe (brainic.io)
+#  #
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#  #
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU General Public License for more details.
+#  #
+#  You should have received a copy of the GNU General Public License
+#  along with this program. If not, see <http://www.gnu.org/licenses/>.
+#  #
+#  Created on 10/18/26, 8:40 PM
+#  #
+#  Author: Silviu Stroe
+
+"""
+Compare the VU meter traffic of one Socket.IO message per UDP packet and channel against MeterEmitter, with
+simulated dashboards connected through the Flask-SocketIO test client.
+
+The audio is simulated, without waiting in real time: one packet per channel every 1024 frames at 44.1 kHz, with
+speech half of the time and silence otherwise. CPU is the process time spent emitting; bytes are the Socket.IO
+text frames the clients would receive.
+
+Usage: python benchmarks/bench_meter_emission.py [--seconds 60] [--clients 10 50]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask  # noqa: E402
+from flask_socketio import SocketIO  # noqa: E402
+from socketio import packet  # noqa: E402
+
+from audio import MeterEmitter, FLOOR_DB, CEILING_DB, CHUNK, RATE  # noqa: E402
+
+FRAME_OVERHEAD = 2  # WebSocket header of a short text frame
+
+
+class CountingSocketIO:
+    """Forward emits to the real server and count the bytes of each Socket.IO frame sent to every client."""
+
+    def __init__(self, socketio, clients):
+        self.socketio = socketio
+        self.clients = clients
+        self.messages = 0
+        self.bytes = 0
+
+    def emit(self, event, data, **kwargs):
+        self.socketio.emit(event, data, **kwargs)
+        self.messages += 1
+        self.bytes += wire_size(event, data) * self.clients
+
+
+def wire_size(event, data):
+    """Return the bytes of the WebSocket frames carrying one Socket.IO event, binary attachments included."""
+    encoded = packet.Packet(packet.EVENT, data=[event, data]).encode()
+    frames = encoded if isinstance(encoded, list) else [encoded]
+    # Text frames get the Engine.IO message type prefix, binary frames are sent as they are
+    return sum(len(frame) + (1 if isinstance(frame, str) else 0) + FRAME_OVERHEAD for frame in frames)
+
+
+def simulated_levels(seconds):
+    """Yield (time, channel, dB) for every packet of both channels."""
+    random.seed(7)
+    period = CHUNK / RATE
+    for packet in range(int(seconds / period)):
+        now = packet * period
+        talking = (now // 5) % 2 == 0  # Five seconds of speech, five of silence
+        for channel in ('rx', 'tx'):
+            level = random.uniform(-24.0, CEILING_DB) if talking and channel == 'rx' else FLOOR_DB
+            yield now, channel, level
+
+
+def per_packet(socketio, levels):
+    for now, channel, level in levels:
+        socketio.emit(f"audio_level_{channel}", {'level': level}, namespace='/')
+
+
+def decimated(socketio, levels):
+    meter = MeterEmitter(socketio)
+    for now, channel, level in levels:
+        stream = meter.streams[channel]
+        stream.add(np.full((stream.channels, 1), 10 ** (level / 20) * stream.reference, dtype=np.float32))
+        meter.mark(now)
+        meter.flush(now)
+
+
+def run(label, emit_levels, clients, seconds):
+    app = Flask(__name__)
+    socketio = SocketIO(app)
+    test_clients = [socketio.test_client(app) for _ in range(clients)]
+    counting = CountingSocketIO(socketio, clients)
+    levels = list(simulated_levels(seconds))
+    begin = time.process_time()
+    emit_levels(counting, levels)
+    cpu = time.process_time() - begin
+    received = sum(len(client.get_received()) for client in test_clients)
+    for client in test_clients:
+        client.disconnect()
+    print(f"{label:<11} {clients:3d} clients {counting.messages / seconds:7.1f} msg/s "
+          f"{received / seconds:9.0f} deliveries/s {counting.bytes / seconds / 1024:8.1f} KiB/s "
+          f"{cpu / seconds * 100:6.2f}% CPU")
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument('--seconds', type=int, default=60, help="seconds of audio simulated")
+    arg_parser.add_argument('--clients', type=int, nargs='+', default=[10, 50])
+    args = arg_parser.parse_args()
+
+    for clients in args.clients:
+        run('per packet', per_packet, clients, args.seconds)
+        run('decimated', decimated, clients, args.seconds)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+#  Copyright (c) 2024 by Silviu Stroe (brainic.io)
+#  #
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#  #
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU General Public License for more details.
+#  #
+#  You should have received a copy of the GNU General Public License
+#  along with this program. If not, see <http://www.gnu.org/licenses/>.
+#  #
+#  Created on 10/18/26, 11:30 PM
+#  #
+#  Author: Silviu Stroe
+
+"""
+Compare the JSON and binary framings of the VU meter updates: payload size, bytes on the wire and the server time
+spent serializing one update.
+
+The levels are random reports of the RX (stereo) and TX (mono) streams. Serializing covers building the payload from
+the StreamLevels arrays and encoding the Socket.IO packet with the encoder Flask-SocketIO uses; the wire size adds the
+Engine.IO prefix and the WebSocket frame header of every frame, a binary payload being sent as an attachment frame.
+
+Usage: python benchmarks/bench_meter_framing.py [--updates 20000]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from socketio import packet  # noqa: E402
+
+from audio import CEILING_DB, FLOOR_DB, levels_to_json, pack_levels  # noqa: E402
+from bench_meter_emission import wire_size  # noqa: E402
+
+
+def random_levels(count):
+    rng = np.random.default_rng(5)
+    reports = []
+    for _ in range(count):
+        reports.append({name: {
+            'peak': rng.uniform(FLOOR_DB, CEILING_DB, channels),
+            'rms': rng.uniform(FLOOR_DB, CEILING_DB, channels),
+            'hold': rng.uniform(FLOOR_DB, CEILING_DB, channels),
+            'clip': rng.integers(0, 3, channels),
+            'dc': rng.normal(0, 0.01, channels)
+        } for name, channels in (('rx', 2), ('tx', 1))})
+    return reports
+
+
+def measure(label, event, build, reports):
+    begin = time.perf_counter()
+    for sequence, levels in enumerate(reports):
+        packet.Packet(packet.EVENT, data=[event, build(sequence & 0xFFFF, levels)]).encode()
+    seconds = time.perf_counter() - begin
+    payload = build(0, reports[0])
+    size = len(payload) if isinstance(payload, bytes) else len(json.dumps(payload, separators=(',', ':')))
+    print(f"{label:<7} payload {size:4d} B  on the wire {wire_size(event, payload):4d} B  "
+          f"{seconds / len(reports) * 1e6:6.1f} us per update")
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument('--updates', type=int, default=20000)
+    args = arg_parser.parse_args()
+
+    reports = random_levels(args.updates)
+    measure('json', 'audio_levels', levels_to_json, reports)
+    measure('binary', 'audio_levels_bin', pack_levels, reports)
+
+
+if __name__ == '__main__':
+    main()
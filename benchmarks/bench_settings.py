@@ -0,0 +1,137 @@
+#  Copyright (c) 2024 by Silviu Stroe (brainic.io)
+#  #
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#  #
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU General Public License for more details.
+#  #
+#  You should have received a copy of the GNU General Public License
+#  along with this program. If not, see <http://www.gnu.org/licenses/>.
+#  #
+#  Created on 10/19/26, 1:40 AM
+#  #
+#  Author: Silviu Stroe
+
+
+"""
+Measure the request latency of /, /settings and /history with a large config, with the settings cache and without.
+
+A temporary directory gets a config.json with --buttons buttons and --groups talk groups, and a session store with
+--sessions talker sessions. The views are served by the Flask test client: / and /settings are the ones of routes.py,
+/history mirrors the view of app.py (which cannot be imported without starting the whole application), with fixed
+operator names instead of the HAM API. "uncached" parses config.json again on every read, as before the cache.
+
+Usage: python benchmarks/bench_settings.py [--buttons 3000] [--groups 3000] [--sessions 5000] [--requests 50]
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO)
+
+from flask import Flask, render_template  # noqa: E402
+
+import config  # noqa: E402
+import routes  # noqa: E402
+import talk_groups  # noqa: E402
+from session_store import SessionStore  # noqa: E402
+
+
+class UncachedSettingsStore(config.SettingsStore):
+    def get(self):
+        self._reload()
+        return self.data
+
+
+def write_config(buttons, groups):
+    settings_data = {
+        'buttons': [{'id': str(uuid.uuid4()), 'label': f"Button {i}", 'color': '#1d4ed8', 'fontColor': '#ffffff',
+                     'category': None, 'isCategory': False, 'action': f"*{i}#"} for i in range(buttons)],
+        'talk_groups': [{'id': str(uuid.uuid4()), 'name': f"Talk group {i}", 'number': 1000 + i}
+                        for i in range(groups)],
+        'columns': 4,
+        'app_background': '#f0f0f0'
+    }
+    config.settings_store.change(lambda current: [{'op': 'replace', 'value': settings_data}])
+    config.settings_store.compact()  # The uncached store reads config.json
+
+
+def fill_sessions(session_store, sessions, groups):
+    start = datetime(2026, 10, 1)
+    for i in range(sessions):
+        begin = start + timedelta(seconds=30 * i)
+        session_store.add({'callsign': f"YO{i % 10}ABC", 'tg_number': str(1000 + i % groups),
+                           'start_date_time': begin.isoformat(),
+                           'stop_date_time': (begin + timedelta(seconds=10)).isoformat(), 'duration': 10})
+    session_store.flush()
+
+
+def create_app(session_store):
+    app = Flask(__name__, template_folder=os.path.join(REPO, 'templates'),
+                static_folder=os.path.join(REPO, 'static'))
+    app.add_url_rule('/', 'dashboard', routes.dashboard)
+    app.add_url_rule('/settings', 'settings', routes.settings)
+
+    @app.route('/history')
+    def last_talkers():
+        talkers, next_cursor = session_store.query(limit=50)
+        for talker in talkers:
+            talker['name'] = 'Not available'
+            talker['tg_name'] = routes.get_group_name(talker['tg_number'])
+        return render_template('history.html', talkers=talkers, next_cursor=next_cursor, is_first_page=True,
+                               source=None, show_source=False)
+
+    return app
+
+
+def measure(client, path, requests):
+    client.get(path)  # Warm up the caches and templates
+    latencies = []
+    for _ in range(requests):
+        begin = time.perf_counter()
+        response = client.get(path)
+        latencies.append((time.perf_counter() - begin) * 1000)
+        assert response.status_code == 200, response.status_code
+    return statistics.median(latencies), max(latencies)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument('--buttons', type=int, default=3000)
+    arg_parser.add_argument('--groups', type=int, default=3000)
+    arg_parser.add_argument('--sessions', type=int, default=5000)
+    arg_parser.add_argument('--requests', type=int, default=50, help="requests per path and mode")
+    args = arg_parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        # The dashboard shows the active svxlink profile, which needs an svxlink installation
+        routes.get_active_profile = lambda: ('/etc/svxlink/svxlink.conf', False)
+        write_config(args.buttons, args.groups)
+        session_store = SessionStore(os.path.join(directory, 'sessions.db'))
+        fill_sessions(session_store, args.sessions, args.groups)
+        client = create_app(session_store).test_client()
+        print(f"{args.buttons} buttons, {args.groups} talk groups, config.json {os.path.getsize('config.json')} B")
+        cached_store = config.settings_store
+        for mode, store in (('uncached', UncachedSettingsStore()), ('cached', cached_store)):
+            config.settings_store = routes.settings_store = talk_groups.settings_store = store
+            for path in ('/', '/settings', '/history'):
+                median, worst = measure(client, path, args.requests)
+                print(f"{mode:<9} {path:<10} median {median:7.2f} ms  max {worst:7.2f} ms")
+        session_store.close()
+
+
+if __name__ == '__main__':
+    main()
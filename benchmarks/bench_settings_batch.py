@@ -0,0 +1,162 @@
+#  Copyright (c) 2024 by Silviu Stroe (brainic.io)
+#  #
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#  #
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU General Public License for more details.
+#  #
+#  You should have received a copy of the GNU General Public License
+#  along with this program. If not, see <http://www.gnu.org/licenses/>.
+#  #
+#  Created on 10/19/26, 4:05 AM
+#  #
+#  Author: Silviu Stroe
+
+"""
+Measure a reorganisation of the dashboard buttons sent as one /api/buttons:batch request, against the same operations
+sent one request at a time.
+
+A temporary directory gets a config.json with --buttons buttons in --categories categories. The reorganisation updates
+--updates buttons, creates a category with --creates buttons, deletes one of the categories (and so its buttons) and
+reverses the order of the first --reorder buttons, which one request at a time takes one PUT per moved button: a
+reorder has no single-button equivalent, so the buttons are moved by deleting and creating them again. The requests
+go through the Flask test client to the views of routes.py. fsyncs count the journal writes, until the writer is idle.
+
+Usage: python benchmarks/bench_settings_batch.py [--buttons 3000] [--categories 30] [--updates 100] [--creates 20]
+       [--reorder 50]
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask  # noqa: E402
+
+import config  # noqa: E402
+import routes  # noqa: E402
+import settings_batch  # noqa: E402
+
+fsyncs = 0
+real_fsync = os.fsync
+
+
+def counting_fsync(descriptor):
+    global fsyncs
+    fsyncs += 1
+    real_fsync(descriptor)
+
+
+def create_app():
+    app = Flask(__name__)
+    app.add_url_rule('/api/buttons', 'add_button', routes.add_button, methods=['POST'])
+    app.add_url_rule('/api/buttons:batch', 'batch_buttons', routes.batch_buttons, methods=['POST'])
+    app.add_url_rule('/api/buttons/<uuid_id>', 'update_button', routes.update_button, methods=['PUT'])
+    app.add_url_rule('/api/buttons/<uuid_id>', 'delete_button', routes.delete_button, methods=['DELETE'])
+    return app
+
+
+def write_config(path, buttons, categories):
+    category_ids = [str(uuid.uuid4()) for _ in range(categories)]
+    settings_data = config.initial_settings()
+    settings_data['buttons'] = [
+        {'id': category_id, 'label': f"Category {i}", 'color': '#1d4ed8', 'fontColor': '#ffffff', 'category': None,
+         'isCategory': True, 'action': ''} for i, category_id in enumerate(category_ids)]
+    settings_data['buttons'] += [
+        {'id': str(uuid.uuid4()), 'label': f"Button {i}", 'color': '#1d4ed8', 'fontColor': '#ffffff',
+         'category': category_ids[i % categories], 'isCategory': False, 'action': f"*{i}#"}
+        for i in range(buttons - categories)]
+    with open(path, 'w') as file:
+        json.dump(settings_data, file)
+    return settings_data['buttons']
+
+
+def operations(buttons, args):
+    """
+    Return the batch of the reorganisation.
+    """
+    plain = [button for button in buttons if not button['isCategory']]
+    batch = [{'op': 'update', 'id': button['id'], 'color': '#b91c1c'} for button in plain[:args.updates]]
+    category_id = str(uuid.uuid4())
+    batch.append({'op': 'create', 'id': category_id, 'label': 'New category', 'color': '#047857',
+                  'fontColor': '#ffffff', 'isCategory': True})
+    batch += [{'op': 'create', 'label': f"New {i}", 'color': '#047857', 'fontColor': '#ffffff',
+               'category': category_id, 'action': f"#{i}"} for i in range(args.creates)]
+    batch.append({'op': 'delete', 'id': buttons[0]['id']})  # The first category
+    moved = [button for button in plain[args.updates:] if button['category'] != buttons[0]['id']][:args.reorder]
+    batch.append({'op': 'reorder', 'ids': [button['id'] for button in reversed(moved)]})
+    return batch, moved
+
+
+def one_at_a_time(client, batch, moved):
+    created_ids = {}  # Id in the batch -> id the server generated
+    for operation in batch:
+        if operation['op'] == 'update':
+            response = client.put(f"/api/buttons/{operation['id']}", json=operation)
+        elif operation['op'] == 'create':
+            category = operation.get('category')
+            response = client.post('/api/buttons', json={**operation, 'category': created_ids.get(category, category)})
+            created_ids[operation.get('id')] = response.json.get('id')
+        elif operation['op'] == 'delete':
+            response = client.delete(f"/api/buttons/{operation['id']}")
+        else:
+            # Move the buttons to the end in the new order: delete then create each again
+            for button in reversed(moved):
+                client.delete(f"/api/buttons/{button['id']}")
+                response = client.post('/api/buttons', json=button)
+        assert response.status_code in (200, 201), response.json
+
+
+def run(mode, args):
+    global fsyncs
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        buttons = write_config('config.json', args.buttons, args.categories)
+        config.settings_store = routes.settings_store = settings_batch.settings_store = config.SettingsStore()
+        config.get_settings()
+        client = create_app().test_client()
+        batch, moved = operations(buttons, args)
+        start_version = config.settings_store.version
+        fsyncs = 0
+        begin = time.perf_counter()
+        if mode == 'batch':
+            response = client.post('/api/buttons:batch', json={'operations': batch})
+            assert response.status_code == 200, response.json
+        else:
+            one_at_a_time(client, batch, moved)
+        seconds = time.perf_counter() - begin
+        time.sleep(config.COMMIT_DELAY * 4)  # Let the writer journal everything
+        requests = 1 if mode == 'batch' else len(batch) - 1 + 2 * len(moved)
+        print(f"{mode:<14} {requests:4d} requests  {seconds * 1000:8.1f} ms  "
+              f"{config.settings_store.version - start_version:4d} versions  {fsyncs:3d} fsyncs  "
+              f"{len(config.get_settings()['buttons'])} buttons left")
+        config.settings_store.close()
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument('--buttons', type=int, default=3000)
+    arg_parser.add_argument('--categories', type=int, default=30)
+    arg_parser.add_argument('--updates', type=int, default=100)
+    arg_parser.add_argument('--creates', type=int, default=20)
+    arg_parser.add_argument('--reorder', type=int, default=50)
+    args = arg_parser.parse_args()
+
+    os.fsync = counting_fsync
+    print(f"{args.buttons} buttons in {args.categories} categories")
+    for mode in ('one at a time', 'batch'):
+        run(mode, args)
+
+
+if __name__ == '__main__':
+    main()
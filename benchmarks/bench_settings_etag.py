@@ -0,0 +1,130 @@
+#  Copyright (c) 2024 by Silviu Stroe (brainic.io)
+#  #
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#  #
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU General Public License for more details.
+#  #
+#  You should have received a copy of the GNU General Public License
+#  along with this program. If not, see <http://www.gnu.org/licenses/>.
+#  #
+#  Created on 10/19/26, 4:30 AM
+#  #
+#  Author: Silviu Stroe
+
+"""
+Measure polling the settings-backed views with a large config: serialized on every request as before, served from the
+per-version cache, and revalidated with If-None-Match.
+
+A temporary directory gets a config.json with --buttons buttons, the first --category of them in one category, and
+--groups talk groups. The views of routes.py are served by the Flask test client; "before" are the views as they were
+before the cache, which serialized or rendered the settings on every request.
+
+Usage: python benchmarks/bench_settings_etag.py [--buttons 3000] [--groups 3000] [--category 100] [--requests 50]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask, jsonify, render_template, request  # noqa: E402
+
+import routes  # noqa: E402
+from config import get_settings  # noqa: E402
+
+
+def write_config(buttons, groups, category):
+    category_id = str(uuid.uuid4())
+    settings_data = {
+        'buttons': [{'id': category_id, 'label': 'Category', 'color': '#1d4ed8', 'fontColor': '#ffffff',
+                     'category': None, 'isCategory': True, 'action': ''}],
+        'talk_groups': [{'id': str(uuid.uuid4()), 'name': f"Talk group {i}", 'number': 1000 + i}
+                        for i in range(groups)],
+        'columns': 4,
+        'app_background': '#f0f0f0'
+    }
+    settings_data['buttons'] += [
+        {'id': str(uuid.uuid4()), 'label': f"Button {i}", 'color': '#1d4ed8', 'fontColor': '#ffffff',
+         'category': category_id if i < category else None, 'isCategory': False, 'action': f"*{i}#"}
+        for i in range(buttons - 1)]
+    with open('config.json', 'w') as file:
+        json.dump(settings_data, file)
+    return category_id
+
+
+def render_page(template, **context):
+    return render_template(template, columns=get_settings()['columns'],
+                           app_background=get_settings()['app_background'], svx_active_profile='svxlink.conf',
+                           **context)
+
+
+def create_app():
+    app = Flask(__name__, template_folder=os.path.join(os.path.dirname(os.path.abspath(routes.__file__)), 'templates'))
+    app.add_url_rule('/', 'index', routes.dashboard)
+    app.add_url_rule('/category', 'category_route', lambda: routes.category(request.args.get('id')))
+    app.add_url_rule('/api/buttons', 'get_buttons', routes.get_buttons)
+    app.add_url_rule('/api/groups', 'get_talk_groups', routes.get_talk_groups_data)
+    for endpoint in ('settings', 'file_manager', 'last_talkers'):  # Linked from the pages
+        app.add_url_rule(f"/{endpoint}", endpoint, lambda: '')
+    # The views before the cache
+    app.add_url_rule('/before/', 'before_index', lambda: render_page('dashboard.html',
+                                                                     buttons=get_settings()['buttons']))
+    app.add_url_rule('/before/category', 'before_category', lambda: render_page(
+        'category.html', buttons_in_category=[button for button in get_settings()['buttons']
+                                              if button.get('category') == request.args.get('id')]))
+    app.add_url_rule('/before/api/buttons', 'before_buttons', lambda: jsonify(get_settings()['buttons']))
+    app.add_url_rule('/before/api/groups', 'before_groups', lambda: jsonify(get_settings().get('talk_groups', [])))
+    return app
+
+
+def measure(client, path, requests, headers=None):
+    client.get(path, headers=headers)  # Warm up the caches and templates
+    latencies = []
+    for _ in range(requests):
+        begin = time.perf_counter()
+        response = client.get(path, headers=headers)
+        latencies.append((time.perf_counter() - begin) * 1000)
+    assert response.status_code == (304 if headers else 200), response.status_code
+    return statistics.median(latencies), len(response.data), response
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument('--buttons', type=int, default=3000)
+    arg_parser.add_argument('--groups', type=int, default=3000)
+    arg_parser.add_argument('--category', type=int, default=100, help="buttons in the category page")
+    arg_parser.add_argument('--requests', type=int, default=50, help="requests per path and mode")
+    args = arg_parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        # The pages show the active svxlink profile, which needs an svxlink installation
+        routes.get_active_profile = lambda: ('/etc/svxlink/svxlink.conf', False)
+        category_id = write_config(args.buttons, args.groups, args.category)
+        client = create_app().test_client()
+        print(f"{args.buttons} buttons, {args.groups} talk groups")
+        for path in ('/api/buttons', '/api/groups', '/', f"/category?id={category_id}"):
+            label = path.split('?')[0]
+            median, size, _ = measure(client, f"/before{path}", args.requests)
+            print(f"{label:<13} before     median {median:7.3f} ms  {size:8d} B")
+            median, size, response = measure(client, path, args.requests)
+            print(f"{label:<13} cached     median {median:7.3f} ms  {size:8d} B")
+            median, size, response = measure(client, path, args.requests,
+                                             {'If-None-Match': response.headers['ETag']})
+            print(f"{label:<13} 304        median {median:7.3f} ms  {size:8d} B")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+#  Copyright (c) 2024 by Silviu Stroe (brainic.io)
+#  #
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#  #
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU General Public License for more details.
+#  #
+#  You should have received a copy of the GNU General Public License
+#  along with this program. If not, see <http://www.gnu.org/licenses/>.
+#  #
+#  Created on 10/19/26, 3:10 AM
+#  #
+#  Author: Silviu Stroe
+
+"""
+Measure bursts of settings changes with the journal, against rewriting config.json for every change as before.
+
+A temporary directory gets a config.json with --buttons buttons, then --edits buttons are added one change at a time,
+first by one writer, then by --threads concurrent writers. "rewrite" loads a copy of the settings, appends the button
+and saves the whole file with an fsync, as the views did; "journal" calls SettingsStore.change(). Bytes are those
+written by the process, from /proc/self/io, including the compaction that writes config.json once at the end.
+
+Usage: python benchmarks/bench_settings_writes.py [--buttons 3000] [--edits 200] [--threads 8]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from threading import Thread
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config  # noqa: E402
+
+fsyncs = 0
+real_fsync = os.fsync
+
+
+def counting_fsync(descriptor):
+    global fsyncs
+    fsyncs += 1
+    real_fsync(descriptor)
+
+
+def written_bytes():
+    with open('/proc/self/io') as file:
+        return next(int(line.split()[1]) for line in file if line.startswith('wchar'))
+
+
+class RewritingStore(config.SettingsStore):
+    # Saving before the journal: the whole file, written and fsynced before returning
+    def save(self, settings_data):
+        with self.lock:
+            file, temporary_path = config.write_temporary(self.path, json.dumps(settings_data, indent=4))
+            file.close()
+            os.replace(temporary_path, self.path)
+            self.signature = self._stat()
+            self._set(settings_data, self.version + 1)
+
+    def close(self):
+        pass  # Everything is written already
+
+
+def new_button(i):
+    return {'id': str(uuid.uuid4()), 'label': f"Button {i}", 'color': '#1d4ed8', 'fontColor': '#ffffff',
+            'category': None, 'isCategory': False, 'action': f"*{i}#"}
+
+
+def rewrite_add(store, button):
+    settings_data = json.loads(json.dumps(store.get()))  # A copy, as the views read it from config.json
+    settings_data['buttons'].append(button)
+    store.save(settings_data)
+
+
+def journal_add(store, button):
+    store.change(lambda settings_data: [{'op': 'put', 'list': 'buttons', 'item': button}])
+
+
+def run(mode, add, buttons, edits, threads):
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'config.json')
+        with open(path, 'w') as file:
+            json.dump({**config.initial_settings(), 'buttons': [new_button(i) for i in range(buttons)]}, file)
+        store = RewritingStore(path) if mode == 'rewrite' else config.SettingsStore(path)
+        store.get()
+
+        global fsyncs
+        fsyncs, start_bytes = 0, written_bytes()
+        latencies = []
+        begin = time.perf_counter()
+        for i in range(edits):
+            started = time.perf_counter()
+            add(store, new_button(i))
+            latencies.append((time.perf_counter() - started) * 1000)
+        store.close()
+        seconds = time.perf_counter() - begin
+        print(f"{mode:<8} 1 writer   {seconds * 1000:8.1f} ms  median {statistics.median(latencies):7.3f} ms "
+              f"per change  {fsyncs:4d} fsyncs  {(written_bytes() - start_bytes) / 1024 ** 2:7.1f} MiB written")
+
+        store = RewritingStore(path) if mode == 'rewrite' else config.SettingsStore(path)
+        before = len(store.get()['buttons'])
+        fsyncs, start_bytes = 0, written_bytes()
+        workers = [Thread(target=lambda: [add(store, new_button(i)) for i in range(edits // threads)])
+                   for _ in range(threads)]
+        begin = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        store.close()
+        seconds = time.perf_counter() - begin
+        with open(path) as file:
+            lost = before + edits // threads * threads - len(json.load(file)['buttons'])
+        print(f"{mode:<8} {threads} writers  {seconds * 1000:8.1f} ms  {lost:4d} changes lost  {fsyncs:4d} fsyncs  "
+              f"{(written_bytes() - start_bytes) / 1024 ** 2:7.1f} MiB written")
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument('--buttons', type=int, default=3000)
+    arg_parser.add_argument('--edits', type=int, default=200)
+    arg_parser.add_argument('--threads', type=int, default=8)
+    args = arg_parser.parse_args()
+
+    os.fsync = counting_fsync
+    print(f"{args.buttons} buttons, {args.edits} changes")
+    run('rewrite', rewrite_add, args.buttons, args.edits, args.threads)
+    run('journal', journal_add, args.buttons, args.edits, args.threads)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+#  Copyright (c) 2024 by Silviu Stroe (brainic.io)
+#  #
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#  #
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU General Public License for more details.
+#  #
+#  You should have received a copy of the GNU General Public License
+#  along with this program. If not, see <http://www.gnu.org/licenses/>.
+#  #
+#  Created on 10/18/26, 11:05 PM
+#  #
+#  Author: Silviu Stroe
+
+"""
+Measure the CPU cost of the spectrum stream for a number of subscribed clients, connected through the Flask-SocketIO
+test client.
+
+The RX audio is simulated, without waiting in real time: int16 stereo packets of 1024 frames at 44.1 kHz carrying a
+tone and noise, written to the SpectrumAnalyzer as the receive loop does. CPU is the process time spent in the
+analyser and in sending the rows, as a percentage of the audio duration.
+
+Usage: python benchmarks/bench_spectrum.py [--seconds 60] [--clients 0 1 5 20] [--bins 64] [--rate 10]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask, request  # noqa: E402
+from flask_socketio import SocketIO, join_room  # noqa: E402
+
+from audio import CHANNELS, CHUNK, RATE  # noqa: E402
+from spectrum import SpectrumAnalyzer, SPECTRUM_ROOM  # noqa: E402
+
+
+def simulated_packets(seconds):
+    rng = np.random.default_rng(3)
+    packets = []
+    for packet in range(int(seconds * RATE / CHUNK)):
+        t = (packet * CHUNK + np.arange(CHUNK)) / RATE
+        signal = 8000 * np.sin(2 * np.pi * 1000 * t) + rng.normal(0, 300, CHUNK)
+        packets.append(np.repeat(signal.astype(np.int16)[:, None], CHANNELS, axis=1))
+    return packets
+
+
+def run(clients, seconds, bins, row_rate, packets):
+    app = Flask(__name__)
+    socketio = SocketIO(app)
+    spectrum = SpectrumAnalyzer(socketio, bins=bins, row_rate=row_rate)
+
+    @socketio.on('subscribe_spectrum')
+    def handle_subscribe_spectrum():
+        join_room(SPECTRUM_ROOM)
+        spectrum.subscribe(request.sid)
+
+    test_clients = [socketio.test_client(app) for _ in range(clients)]
+    for client in test_clients:
+        client.emit('subscribe_spectrum')
+    begin = time.process_time()
+    for packet in packets:
+        spectrum.write(packet)
+    cpu = time.process_time() - begin
+    received = sum(len(client.get_received()) for client in test_clients)
+    for client in test_clients:
+        client.disconnect()
+    print(f"{clients:3d} clients {spectrum.rows / seconds:5.1f} rows/s {received / seconds:7.1f} deliveries/s "
+          f"{bins * received / seconds / 1024:6.2f} KiB/s payload {cpu / seconds * 100:6.2f}% CPU")
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument('--seconds', type=int, default=60, help="seconds of audio simulated")
+    arg_parser.add_argument('--clients', type=int, nargs='+', default=[0, 1, 5, 20])
+    arg_parser.add_argument('--bins', type=int, default=64)
+    arg_parser.add_argument('--rate', type=float, default=10, help="spectrum rows per second")
+    args = arg_parser.parse_args()
+
+    packets = simulated_packets(args.seconds)
+    for clients in args.clients:
+        run(clients, args.seconds, args.bins, args.rate, packets)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+#  Copyright (c) 2024 by Silviu Stroe (brainic.io)
+#  #
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#  #
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU General Public License for more details.
+#  #
+#  You should have received a copy of the GNU General Public License
+#  along with this program. If not, see <http://www.gnu.org/licenses/>.
+#  #
+#  Created on 10/19/26, 2:40 AM
+#  #
+#  Author: Silviu Stroe
+
+
+"""
+Measure the talk group directory with a large list: bulk import, lookups by number, prefix search and export, against
+adding the groups one request at a time and the linear lookup of get_group_name() before the directory.
+
+The requests go through the Flask test client to the views of routes.py, in a temporary directory with its own
+config.json.
+
+Usage: python benchmarks/bench_talk_groups.py [--groups 50000] [--lookups 10000] [--single 20]
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO)
+
+from flask import Flask  # noqa: E402
+
+import routes  # noqa: E402
+from config import get_settings, settings_store  # noqa: E402
+
+
+def linear_group_name(number):
+    # get_group_name() before the directory
+    groups = get_settings().get('talk_groups', [])
+    group = next((group for group in groups if str(group['number']) == str(number)), None)
+    return None if group is None else group['name']
+
+
+def create_app():
+    app = Flask(__name__)
+    app.add_url_rule('/api/groups', 'add_talk_group', routes.add_talk_group, methods=['POST'])
+    app.add_url_rule('/api/groups/search', 'search_talk_groups', routes.search_talk_groups)
+    app.add_url_rule('/api/groups:import', 'import_talk_groups', routes.import_talk_groups, methods=['POST'])
+    app.add_url_rule('/api/groups:export', 'export_talk_groups', routes.export_talk_groups)
+    return app
+
+
+def timed(label, action, count=1):
+    begin = time.perf_counter()
+    result = action()
+    seconds = time.perf_counter() - begin
+    print(f"{label:<44} {seconds * 1000 / count:10.3f} ms" + (" each" if count > 1 else ""))
+    return result
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument('--groups', type=int, default=50000)
+    arg_parser.add_argument('--lookups', type=int, default=10000)
+    arg_parser.add_argument('--single', type=int, default=20, help="groups added one request at a time")
+    args = arg_parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        client = create_app().test_client()
+        body = 'number,name\n' + ''.join(f"{100000 + i},Talk group {i}\n" for i in range(args.groups))
+        response = timed(f"import {args.groups} groups (CSV)",
+                         lambda: client.post('/api/groups:import', data=body, content_type='text/csv'))
+        assert response.status_code == 200, response.json
+        settings_store.compact()  # Write config.json now rather than when idle
+        print(f"  {response.json}, config.json {os.path.getsize('config.json')} B")
+        numbers = [100000 + i * 7919 % args.groups for i in range(args.lookups)]
+        timed("build the directory", lambda: routes.get_directory())
+        timed("get_group_name, directory",
+              lambda: [routes.get_group_name(number) for number in numbers], args.lookups)
+        timed("get_group_name, linear scan (before)",
+              lambda: [linear_group_name(number) for number in numbers[:100]], 100)
+        timed("search '1234' (limit 20)", lambda: [client.get('/api/groups/search?q=1234') for _ in range(100)], 100)
+        timed("search 'talk group 99' (limit 20)",
+              lambda: [client.get('/api/groups/search?q=talk%20group%2099') for _ in range(100)], 100)
+        csv_export = timed("export CSV", lambda: client.get('/api/groups:export').data)
+        json_export = timed("export JSON", lambda: client.get('/api/groups:export?format=json').data)
+        print(f"  {len(csv_export)} B CSV, {len(json_export)} B JSON")
+        timed(f"add {args.single} groups one request at a time", lambda: [
+            client.post('/api/groups', json={'number': str(900000 + i), 'name': f"Single {i}"})
+            for i in range(args.single)], args.single)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+#  Copyright (c) 2024 by Silviu Stroe (brainic.io)
+#  #
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#  #
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU General Public License for more details.
+#  #
+#  You should have received a copy of the GNU General Public License
+#  along with this program. If not, see <http://www.gnu.org/licenses/>.
+#  #
+#  Created on 10/18/26, 9:12 AM
+#  #
+#  Author: Silviu Stroe
+
+"""
+Compare robust_parse_date() against the learned-format TimestampParser on a synthetic svxlink log.
+
+Usage: python benchmarks/bench_timestamp_parser.py [--lines 2000000] [--format ctime|iso|dotted]
+"""
+
+import argparse
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from log_events import EventMatcher  # noqa: E402
+from log_monitor import robust_parse_date, TimestampParser  # noqa: E402
+
+FORMATS = {
+    'ctime': lambda dt: dt.strftime('%a %b ') + f"{dt.day:2d}" + dt.strftime(' %H:%M:%S %Y'),
+    'iso': lambda dt: dt.strftime('%Y-%m-%d %H:%M:%S'),
+    'dotted': lambda dt: dt.strftime('%d.%m.%Y %H:%M:%S'),
+}
+
+
+def synthetic_log(lines, fmt):
+    """Yield svxlink talker lines, alternating start/stop, one second apart."""
+    start = datetime(2024, 5, 8, 18, 53, 29)
+    render = FORMATS[fmt]
+    for i in range(lines):
+        action = 'start' if i % 2 == 0 else 'stop'
+        stamp = render(start + timedelta(seconds=i))
+        yield f"{stamp}: ReflectorLogic: Talker {action} on TG #226: YO{i % 10}SAY\n"
+
+
+def run(label, parse, date_strings):
+    begin = time.perf_counter()
+    for date_str in date_strings:
+        parse(date_str)
+    elapsed = time.perf_counter() - begin
+    rate = len(date_strings) / elapsed
+    print(f"{label:<22} {elapsed:8.2f} s {rate:14,.0f} lines/sec")
+    return rate
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument('--lines', type=int, default=2_000_000)
+    arg_parser.add_argument('--format', choices=sorted(FORMATS), default='ctime')
+    args = arg_parser.parse_args()
+
+    event_matcher = EventMatcher()
+    date_strings = [event_matcher.match(line)[1] for line in synthetic_log(args.lines, args.format)]
+    print(f"{len(date_strings):,} '{args.format}' timestamps, e.g. {date_strings[0]!r}")
+
+    timestamp_parser = TimestampParser()
+    for date_str in date_strings[:1000]:
+        assert timestamp_parser.parse(date_str) == robust_parse_date(date_str), date_str
+
+    baseline = run('robust_parse_date', robust_parse_date, date_strings)
+    learned = run('TimestampParser.parse', TimestampParser().parse, date_strings)
+    print(f"speedup: {learned / baseline:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
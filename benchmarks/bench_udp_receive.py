@@ -0,0 +1,134 @@
+#  Copyright (c) 2024 by Silviu Stroe (brainic.io)
+#  #
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#  #
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU General Public License for more details.
+#  #
+#  You should have received a copy of the GNU General Public License
+#  along with this program. If not, see <http://www.gnu.org/licenses/>.
+#  #
+#  Created on 10/18/26, 9:10 PM
+#  #
+#  Author: Silviu Stroe
+
+"""
+Compare the former audio receive loop (one select and one recvfrom per datagram, then frombuffer, abs and max)
+against UdpLevelReader (recv_into a preallocated block, draining the socket, then peak, RMS, clipping and DC offset
+per channel on the whole block).
+
+Datagrams of int16 stereo audio are queued on a localhost UDP socket in bursts, then read back. CPU is the process
+time per datagram. Allocations are measured with tracemalloc as the peak heap growth while reading one datagram: the
+bytes object, the NumPy arrays and the temporaries it takes before they are freed again.
+
+Usage: python benchmarks/bench_udp_receive.py [--packets 20000] [--burst 64]
+"""
+
+import argparse
+import math
+import os
+import select
+import socket
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from audio import BYTES_PER_SAMPLE, CHANNELS, CHUNK, REFERENCE_PEAK, StreamLevels, UdpLevelReader  # noqa: E402
+
+PACKET_SIZE = CHUNK * BYTES_PER_SAMPLE * CHANNELS
+
+
+def make_packets(count):
+    rng = np.random.default_rng(1)
+    return [rng.integers(-20000, 20000, CHUNK * CHANNELS, dtype=np.int16).tobytes() for _ in range(16)] * (count // 16)
+
+
+def old_read(sock):
+    """
+    The loop body audio.py used before: one select and one recvfrom per datagram.
+    """
+    readable, _, _ = select.select([sock], [], [], 0)
+    if not readable:
+        return None
+    data, addr = sock.recvfrom(PACKET_SIZE)
+    ndarray = np.frombuffer(data, dtype=np.int16).reshape(-1, 2)
+    peak = np.max(np.abs(ndarray))
+    return 20 * math.log10(peak / REFERENCE_PEAK + 1e-40)
+
+
+def run(name, read_burst, sender, receiver, packets, burst):
+    cpu = 0.0
+    read = 0
+    for start in range(0, len(packets), burst):
+        for packet in packets[start:start + burst]:
+            sender.send(packet)
+        began = time.process_time()
+        read += read_burst(burst)
+        cpu += time.process_time() - began
+    return name, cpu, read
+
+
+def measure_allocations(read_one, sender, packet, rounds=200):
+    """
+    Return the peak heap growth in bytes while reading one datagram, the largest over rounds.
+    """
+    worst = 0
+    tracemalloc.start()
+    for _ in range(rounds):
+        sender.send(packet)
+        tracemalloc.reset_peak()
+        baseline, _ = tracemalloc.get_traced_memory()
+        read_one()
+        _, peak = tracemalloc.get_traced_memory()
+        worst = max(worst, peak - baseline)
+    tracemalloc.stop()
+    return worst
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--packets', type=int, default=20000)
+    parser.add_argument('--burst', type=int, default=64, help='Datagrams queued before each read')
+    args = parser.parse_args()
+
+    receiver = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    receiver.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 1024 * 1024)
+    receiver.bind(('127.0.0.1', 0))
+    receiver.setblocking(False)
+    sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sender.connect(receiver.getsockname())
+    packets = make_packets(args.packets)
+    reader = UdpLevelReader(receiver, np.int16, CHANNELS, PACKET_SIZE, StreamLevels(CHANNELS, REFERENCE_PEAK))
+
+    def old_burst(burst):
+        count = 0
+        while old_read(receiver) is not None:
+            count += 1
+        return count
+
+    def new_burst(burst):
+        before = reader.packets
+        reader.drain()
+        return reader.packets - before
+
+    print(f"{len(packets)} datagrams of {PACKET_SIZE} bytes, in bursts of {args.burst}")
+    for name, cpu, read in (run('select + recvfrom', old_burst, sender, receiver, packets, args.burst),
+                            run('recv_into + drain', new_burst, sender, receiver, packets, args.burst)):
+        print(f"{name:20} {read:7} read  {cpu / max(read, 1) * 1e6:7.1f} us CPU per datagram")
+
+    for name, read_one in (('select + recvfrom', lambda: old_read(receiver)), ('recv_into + drain', reader.drain)):
+        peak = measure_allocations(read_one, sender, packets[0])
+        print(f"{name:20} peak heap growth per datagram: {peak} bytes")
+
+
+if __name__ == '__main__':
+    main()
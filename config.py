@@ -19,39 +19,465 @@
 
 import os
 import json
+import logging
+import pickle
+import tempfile
+from threading import Event, Lock, RLock, Thread
 
+CONFIG_PATH = 'config.json'
+JOURNAL_SUFFIX = '.journal'
+VERSION_KEY = 'settings_version'  # Version of the settings written in config.json, hidden from the settings
+COMMIT_DELAY = 0.05  # Seconds the writer waits for the rest of a burst of changes before writing them
+COMPACT_RECORDS = 1000  # Journaled changes after which config.json is written again
+COMPACT_BYTES = 4 * 1024 * 1024  # Same, in bytes of journal
+COMPACT_IDLE = 10.0  # Seconds without changes after which config.json is written again
 
-def load_settings():
-    config_path = 'config.json'
-    initial_data = {
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(module)s - %(levelname)s: %(message)s',
+    filename='/tmp/saycharlie.log',
+    filemode='a'
+)
+
+
+def initial_settings():
+    return {
         'buttons': [],
         'columns': 2,
         'app_background': '#f0f0f0'
     }
 
-    # Check if the config file exists
-    if os.path.exists(config_path):
-        # Check if the file is non-empty
-        if os.path.getsize(config_path) > 0:
+
+class SettingsError(Exception):
+    """
+    A change the settings refused; status is the HTTP status to answer with.
+    """
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+class SettingsConflict(SettingsError):
+    def __init__(self, version):
+        super().__init__(f"The settings were changed meanwhile, they are now at version {version}", 409)
+        self.version = version
+
+
+def write_temporary(path, text):
+    """
+    Write text to a new temporary file next to path and fsync it. Returns the file, still open, and its path.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    descriptor, temporary_path = tempfile.mkstemp(dir=directory, prefix='.config-', suffix='.tmp')
+    file = os.fdopen(descriptor, 'w')
+    try:
+        file.write(text)
+        file.flush()
+        os.fsync(file.fileno())
+    except BaseException:
+        file.close()
+        os.unlink(temporary_path)
+        raise
+    return file, temporary_path
+
+
+def file_signature(stat):
+    return stat.st_mtime_ns, stat.st_size
+
+
+class SettingsStore:
+    """
+    The parsed config file, kept in memory for the whole process, and the journal of its changes.
+
+    get() checks the modification time and size of config.json with one os.stat() and parses it again only when they
+    changed, so edits made by hand are still picked up; they win over the changes not written to config.json yet. Its
+    result is shared and must not be modified.
+
+    change() applies a list of changes to the settings atomically, under a lock, and increments version. The changes
+    replace what they touch instead of modifying it: a new dict of settings, new copies of the lists they modify, new
+    items. Readers holding the settings of an earlier version keep consistent settings, and background writes do not
+    need the lock. A change is one of:
+
+        {'op': 'set', 'key': key, 'value': value}   sets a top-level setting
+        {'op': 'put', 'list': name, 'item': item}   replaces the item of the list with the same id, or appends it
+        {'op': 'append', 'list': name, 'item': item}
+        {'op': 'remove', 'list': name, 'ids': ids}  removes the items with these ids
+        {'op': 'order', 'list': name, 'ids': ids}   puts these items in this order, in the positions they occupy
+        {'op': 'replace', 'value': settings}
+
+    Items are found through indexes of the lists by id, or by another key, kept up to date by the changes; see
+    position().
+
+    Changes are then journaled: each change() appends one JSON line to config.json.journal. The lines are written by a
+    background writer, which waits COMMIT_DELAY for the rest of a burst and writes it with one fsync; a crash may lose
+    the changes of the last COMMIT_DELAY. The writer compacts the journal by writing the whole config.json again after
+    COMPACT_RECORDS changes, COMPACT_BYTES of journal or COMPACT_IDLE seconds without changes, and at close(). Files
+    are replaced atomically: written to a temporary file next to them, which os.replace() then renames over them.
+
+    The journal starts with the modification time, size and version of the config.json files it applies to, the one
+    being replaced and the new one while compacting, so a crash at any point leaves a config.json and the changes
+    journaled since. At startup they are replayed; a journal that does not apply to config.json, edited by hand in
+    the meantime, is ignored. config.json also keeps its version under VERSION_KEY, so that without a journal to tell
+    whether it was edited by hand, the version still moves past every version given out before the restart.
+
+    derived() caches values computed from the settings until the next version.
+    """
+
+    def __init__(self, path=CONFIG_PATH):
+        self.path = path
+        self.journal_path = path + JOURNAL_SUFFIX
+        self.lock = RLock()
+        self.io_lock = Lock()  # Held while writing files; taken before lock
+        self.data = None
+        self.signature = None  # (mtime, size) of config.json
+        self.version = 0
+        self.base_version = 0  # Version of the settings in config.json
+        self.generation = 0  # Incremented whenever config.json is read
+        self.derived_values = (-1, {})  # (version, name -> value), only for the latest version derived
+        self.indexes = {}  # (list name, key) -> {str(value): position of the first item with it}
+        self.records = []  # (version, journal line) of the changes since base_version
+        self.pending = []  # Journal lines not written yet
+        self.restart_journal = True  # Whether the writer has to write the journal again, from its header
+        self.journal = None  # Journal file, open for appending
+        self.journal_bytes = 0
+        self.wake = Event()
+        self.stop_event = Event()
+        self.writer = None
+
+    def get(self):
+        """
+        Return the current settings, read-only.
+        """
+        if self.data is None or self._stat() != self.signature:
+            with self.lock:
+                # Compacting changes config.json and the signature together, under the lock
+                if self.data is None or self._stat() != self.signature:
+                    self._reload()
+        return self.data
+
+    def change(self, build, expected_version=None):
+        """
+        Apply the changes returned by build(settings), called with the current settings under the lock, and return the
+        new version. build may raise SettingsError to change nothing. With expected_version, SettingsConflict is raised
+        if the settings are no longer at that version.
+        """
+        self.get()
+        with self.lock:
+            if expected_version is not None and expected_version != self.version:
+                raise SettingsConflict(self.version)
+            changes = build(self.data)
+            if not changes:
+                return self.version
+            line = json.dumps({'version': self.version + 1, 'changes': changes}) + '\n'
+            self._set(self._apply(self.data, changes), self.version + 1)
+            self.records.append((self.version, line))
+            self.pending.append(line)
+            if self.writer is None:
+                self.writer = Thread(target=self._run_writer, daemon=True)
+                self.writer.start()
+            self.wake.set()
+            return self.version
+
+    def position(self, name, value, key='id'):
+        """
+        Return the position in the list name of the first item whose key is value, compared as strings, or None. Call
+        it within change() to get a position in the settings passed to build.
+        """
+        if self.data is None:
+            self.get()
+        with self.lock:  # Not while a change updates the indexes
+            return self._index(self.data, name, key).get(str(value))
+
+    def derived(self, name, build, versioned=False):
+        """
+        Return build(settings), computed once per version of the settings. With versioned, build is called as
+        build(settings, version), with the version of the settings it is given. Only the values of the latest version
+        are kept, so names that are no longer asked for do not stay cached.
+        """
+        self.get()
+        with self.lock:  # The data and its version, from the same change
+            version = self.version
+            data = self.data
+        derived_version, values = self.derived_values
+        if derived_version == version and name in values:
+            return values[name]
+        value = build(data, version) if versioned else build(data)
+        if derived_version != version:
+            if version < derived_version:
+                return value  # Another request already moved on to a later version
+            values = {}
+            self.derived_values = (version, values)
+        values[name] = value
+        return value
+
+    def flush(self):
+        """
+        Write the changes not journaled yet, with one fsync.
+        """
+        with self.io_lock:
+            with self.lock:
+                header = self._journal_header() if self.restart_journal else None
+                lines = [line for _, line in self.records] if self.restart_journal else self.pending
+                self.pending = []
+                self.restart_journal = False
             try:
-                with open(config_path, 'r') as file:
-                    data = json.load(file)
-                print("Config loaded successfully.")
-                return data
-            except json.decoder.JSONDecodeError:
-                print("Error: Config file is invalid JSON. Using default settings.")
+                if header is not None:
+                    self._start_journal(header, lines)
+                elif lines:
+                    text = ''.join(lines)
+                    self.journal.write(text)
+                    self.journal.flush()
+                    os.fsync(self.journal.fileno())
+                    self.journal_bytes += len(text)
+            except BaseException:
+                with self.lock:
+                    self.restart_journal = True  # With the lines of this flush, which are in records
+                raise
+
+    def compact(self):
+        """
+        Write the current settings to config.json, so the journal starts again from them.
+        """
+        with self.io_lock:
+            with self.lock:
+                data, version, generation = self.data, self.version, self.generation
+                if data is None or version == self.base_version:
+                    return
+            # The data of a version is never modified, so it is serialized without the lock
+            file, temporary_path = write_temporary(self.path, json.dumps({**data, VERSION_KEY: version}, indent=4))
+            try:
+                signature = file_signature(os.fstat(file.fileno()))  # Kept by the rename
+            finally:
+                file.close()
+            with self.lock:
+                try:
+                    if self.generation != generation:
+                        return  # config.json was edited by hand meanwhile, which wins
+                    # Until the rename, the journal must still apply to the current config.json
+                    self._start_journal(self._journal_header([*signature, version]),
+                                        [line for _, line in self.records])
+                    os.replace(temporary_path, self.path)
+                finally:
+                    if os.path.exists(temporary_path):
+                        os.unlink(temporary_path)
+                self.signature = signature
+                self.base_version = version
+                self.records = [record for record in self.records if record[0] > version]
+                self.pending = []
+                self.restart_journal = False
+
+    def close(self):
+        """
+        Stop the writer and write all the changes, then config.json.
+        """
+        self.stop_event.set()
+        self.wake.set()
+        if self.writer is not None:
+            self.writer.join()
+        if self.data is not None:
+            self.flush()
+            self.compact()
+        if self.journal is not None:
+            self.journal.close()
+
+    def _run_writer(self):
+        while not self.stop_event.is_set():
+            if self.wake.wait(COMPACT_IDLE):
+                self.stop_event.wait(COMMIT_DELAY)  # Let the rest of a burst arrive
+                self.wake.clear()
+                compact = len(self.records) >= COMPACT_RECORDS or self.journal_bytes >= COMPACT_BYTES
+            else:
+                compact = bool(self.records)
+            try:
+                self.flush()
+                if compact:
+                    self.compact()
+            except OSError as e:
+                logging.error(f"Failed to write the settings: {e}")
+
+    def _stat(self):
+        try:
+            return file_signature(os.stat(self.path))
+        except FileNotFoundError:
+            return None
+
+    def _reload(self):
+        first = self.data is None
+        if not os.path.exists(self.path):
+            # Create a new config file with initial data if it doesn't exist
+            data = initial_settings()
+            file, temporary_path = write_temporary(self.path, json.dumps(data, indent=4))
+            file.close()
+            os.replace(temporary_path, self.path)
+            logging.info("Config file created with initial data.")
+        else:
+            data = initial_settings()
+            if os.path.getsize(self.path) > 0:
+                try:
+                    with open(self.path, 'r') as file:
+                        data = json.load(file)
+                    logging.info("Config loaded successfully.")
+                except json.decoder.JSONDecodeError:
+                    logging.warning("Config file is invalid JSON. Using default settings.")
+            else:
+                logging.warning("Config file is empty. Using default settings.")
+        saved_version = data.pop(VERSION_KEY, 0) if isinstance(data, dict) else 0
+        if not isinstance(saved_version, int) or saved_version < 0:
+            saved_version = 0
+        self.signature = self._stat()
+        self.indexes = {}
+        if self.records:
+            logging.warning(f"config.json was changed on disk, discarding {len(self.records)} settings changes")
+        if first:
+            data, base_version, self.records = self._replay_journal(data, saved_version)
         else:
-            print("Error: Config file is empty. Using default settings.")
-    else:
-        # Create a new config file with initial data if it doesn't exist
-        with open(config_path, 'w') as file:
-            json.dump(initial_data, file, indent=4)
-        print("Config file created with initial data.")
+            base_version, self.records = max(self.version, saved_version) + 1, []
+        self.pending = []
+        self.restart_journal = True
+        self.generation += 1
+        self._set(data, self.records[-1][0] if self.records else base_version)
+        self.base_version = base_version
+
+    def _replay_journal(self, data, saved_version):
+        """
+        Apply the journaled changes to data, the settings read from config.json, if the journal applies to that file.
+        Returns the settings, the version of config.json and the (version, line) of the changes applied. saved_version
+        is the version config.json was written with, 0 if none; without a journal that applies, the version of
+        config.json is the next one, as it may have been edited by hand.
+        """
+        unknown_version = saved_version + 1 if saved_version else 0
+        try:
+            with open(self.journal_path, 'r') as file:
+                lines = file.readlines()
+        except FileNotFoundError:
+            return data, unknown_version, []
+        try:
+            bases = {(mtime, size): version for mtime, size, version in json.loads(lines[0])['bases']}
+        except (IndexError, KeyError, TypeError, ValueError):
+            logging.warning("Settings journal is invalid. Ignoring it.")
+            return data, unknown_version, []
+        base_version = bases.get(self.signature)
+        if base_version is None:
+            logging.warning("Config file was changed by hand. Ignoring the settings journal.")
+            return data, max(max(bases.values(), default=0) + 1, unknown_version), []
+        version = base_version
+        records = []
+        for line in lines[1:]:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                break  # The last line, cut short by a crash
+            if record['version'] <= version:
+                continue  # Already in config.json
+            data = self._apply(data, record['changes'])
+            version = record['version']
+            records.append((version, line if line.endswith('\n') else line + '\n'))
+        if records:
+            logging.info(f"Replayed {len(records)} settings changes from the journal.")
+        return data, base_version, records
+
+    def _journal_header(self, *bases):
+        return json.dumps({'bases': [[*self.signature, self.base_version], *bases]}) + '\n'
+
+    def _start_journal(self, header, lines):
+        text = header + ''.join(lines)
+        file, temporary_path = write_temporary(self.journal_path, text)
+        try:
+            os.replace(temporary_path, self.journal_path)
+        except BaseException:
+            file.close()
+            os.unlink(temporary_path)
+            raise
+        if self.journal is not None:
+            self.journal.close()
+        self.journal = file
+        self.journal_bytes = len(text)
+
+    def _index(self, data, name, key):
+        index = self.indexes.get((name, key))
+        if index is None:
+            items = data.get(name, [])
+            index = {str(items[i].get(key)): i for i in range(len(items) - 1, -1, -1)}  # The first item wins
+            self.indexes[(name, key)] = index
+        return index
+
+    def _apply(self, data, changes):
+        """
+        Return data with the changes applied, updating the indexes. Call with the lock held.
+        """
+        data = dict(data)
+        copied = set()  # Lists already copied
+        try:
+            for change in changes:
+                op = change['op']
+                if op == 'replace':
+                    data = pickle.loads(pickle.dumps(change['value'], pickle.HIGHEST_PROTOCOL))
+                    copied = set(data)
+                    self.indexes = {}
+                    continue
+                if op == 'set':
+                    data[change['key']] = change['value']
+                    copied.discard(change['key'])
+                    self._drop_indexes(change['key'])
+                    continue
+                name = change['list']
+                if name not in copied:
+                    data[name] = list(data.get(name, []))
+                    copied.add(name)
+                items = data[name]
+                if op == 'remove':
+                    ids = {str(item_id) for item_id in change['ids']}
+                    data[name] = [item for item in items if str(item.get('id')) not in ids]
+                    self._drop_indexes(name)
+                    continue
+                if op == 'order':
+                    index = self._index(data, name, 'id')
+                    positions = sorted(index[str(item_id)] for item_id in change['ids'])
+                    moved = [items[index[str(item_id)]] for item_id in change['ids']]
+                    for position, item in zip(positions, moved):
+                        items[position] = item
+                        index[str(item.get('id'))] = position
+                    for list_name, key in list(self.indexes):
+                        if list_name == name and key != 'id':
+                            del self.indexes[(list_name, key)]
+                    continue
+                if op not in ('put', 'append'):
+                    raise ValueError(f"Unknown settings change {op!r}")
+                item = change['item']
+                position = self._index(data, name, 'id').get(str(item['id'])) if op == 'put' else None
+                if position is None:
+                    items.append(item)
+                    for (list_name, key), index in self.indexes.items():
+                        if list_name == name:
+                            index.setdefault(str(item.get(key)), len(items) - 1)
+                else:
+                    previous = items[position]
+                    items[position] = item
+                    for list_name, key in list(self.indexes):
+                        if list_name == name and str(previous.get(key)) != str(item.get(key)):
+                            del self.indexes[(list_name, key)]  # Other items may share the old value
+        except BaseException:
+            self.indexes = {}
+            raise
+        return data
+
+    def _drop_indexes(self, name):
+        for list_name, key in list(self.indexes):
+            if list_name == name:
+                del self.indexes[(list_name, key)]
+
+    def _set(self, data, version):
+        self.data = data
+        self.version = version
+
+
+settings_store = SettingsStore()
 
-    # Return default settings if no valid config was loaded
-    return initial_data
 
+def get_settings():
+    """
+    Return the settings for reading only; see SettingsStore.get().
+    """
+    return settings_store.get()
 
-def save_settings(settings_data):
-    with open('config.json', 'w') as f:
-        json.dump(settings_data, f, indent=4)
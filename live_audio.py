@@ -0,0 +1,226 @@
+#  Copyright (c) 2024 by Silviu Stroe (brainic.io)
+#  #
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#  #
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU General Public License for more details.
+#  #
+#  You should have received a copy of the GNU General Public License
+#  along with this program. If not, see <http://www.gnu.org/licenses/>.
+#  #
+#  Created on 10/19/26, 12:10 AM
+#  #
+#  Author: Silviu Stroe
+
+import struct
+import time
+from collections import deque
+from functools import partial
+from threading import Lock
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from audio import CHANNELS, RATE, REFERENCE_PEAK
+from metrics import Histogram
+
+LIVE_RATE = 11025  # Sample rate the live audio is resampled to, at most
+MIN_LIVE_RATE = 4000
+CHUNK_SECONDS = 0.04  # Audio in one 'live_audio' message
+MAX_IN_FLIGHT = 2  # Chunks sent to a client that it has not acknowledged yet
+ACK_TIMEOUT = 1.0  # Seconds after which a chunk not acknowledged is considered lost
+QUEUE_CHUNKS = 2  # Chunks waiting for a client; older ones are dropped
+TAPS_PER_FACTOR = 8  # Length of the anti-aliasing filter, per unit of the decimation factor
+HEADER = struct.Struct('<Hd')  # Sequence number, server time in ms at which the first audio of the chunk arrived
+
+
+def mulaw_table():
+    """
+    Return the G.711 mu-law code of every int16 sample, indexed by the sample read as uint16.
+    """
+    samples = np.arange(65536, dtype=np.uint16).view(np.int16).astype(np.int32) >> 2  # 14 bits, as G.711
+    sign = np.where(samples < 0, 0x80, 0)
+    magnitude = np.minimum(np.abs(samples), 8158) + 33
+    segment = np.floor(np.log2(magnitude)).astype(np.int32) - 5
+    mantissa = (magnitude >> (segment + 1)) & 0x0F
+    return (~(sign | (segment << 4) | mantissa) & 0xFF).astype(np.uint8)
+
+
+MULAW = mulaw_table()
+
+
+class LiveAudioStreamer:
+    """
+    Stream the RX audio to the clients listening to it, as 'live_audio' messages of CHUNK_SECONDS of audio.
+
+    The audio is downmixed to mono, low-pass filtered and decimated by an integer factor to about live_rate, and
+    encoded to 8-bit mu-law through a lookup table. Each message is a HEADER followed by the mu-law samples; its time
+    lets clients measure the latency from the arrival of the audio to its playback and report it back.
+
+    Latency cannot build up: a client acknowledges every chunk, at most MAX_IN_FLIGHT chunks are sent to it without an
+    acknowledgement, and at most QUEUE_CHUNKS more wait for it, the oldest being dropped for the newest. A slow client
+    hears gaps instead of lagging behind. An acknowledgement also stands for the chunks sent before it, and a chunk not
+    acknowledged within ACK_TIMEOUT is given up, so lost acknowledgements do not stop the stream to a client.
+
+    Nothing is computed while no client listens.
+    """
+
+    def __init__(self, socketio, rate=RATE, channels=CHANNELS, reference=REFERENCE_PEAK, live_rate=LIVE_RATE):
+        if not MIN_LIVE_RATE <= live_rate <= rate:
+            raise ValueError(f"The live audio rate must be between {MIN_LIVE_RATE} and {rate}")
+        self.socketio = socketio
+        self.channels = channels
+        self.factor = max(1, round(rate / live_rate))
+        self.rate = rate / self.factor
+        self.chunk_samples = round(CHUNK_SECONDS * self.rate)
+        # Windowed sinc low-pass below the new Nyquist frequency, which also scales the channel sum to int16
+        taps = TAPS_PER_FACTOR * self.factor + 1
+        positions = np.arange(taps) - (taps - 1) / 2
+        kernel = np.sinc(positions * 0.9 / self.factor) * np.hamming(taps)
+        self.kernel = (kernel / kernel.sum() * 32768 / (reference * channels)).astype(np.float32)
+        # The last taps - 1 samples of a chunk start the next one
+        self.buffer = np.zeros(taps - 1 + self.factor * self.chunk_samples, dtype=np.float32)
+        self.history = taps - 1
+        self.filled = self.history
+        self.chunk_time = None  # When the first audio of the chunk being filled arrived, in ms since the epoch
+        self.clients = {}  # Socket.IO session id -> state of the client
+        self.lock = Lock()
+        self.chunks = 0  # Also the sequence number of the next chunk, modulo 2 ** 16
+        self.latency = Histogram()  # Milliseconds reported by all the clients
+
+    def get_config(self):
+        return {
+            'rate': self.rate,
+            'chunk_ms': round(self.chunk_samples / self.rate * 1000, 1),
+            'encoding': 'mulaw'
+        }
+
+    def subscribe(self, sid):
+        with self.lock:
+            self.clients[sid] = {
+                'queue': deque(maxlen=QUEUE_CHUNKS),
+                'in_flight': deque(),  # (number, time.monotonic() when sent) of the chunks not acknowledged
+                'sent': 0,
+                'expired': 0,
+                'dropped': 0,
+                'latency': Histogram()
+            }
+
+    def unsubscribe(self, sid):
+        with self.lock:
+            self.clients.pop(sid, None)
+
+    def report_latency(self, sid, latency_ms):
+        """
+        Record a latency measured by a client, from the arrival of a chunk to its playback.
+        """
+        with self.lock:
+            client = self.clients.get(sid)
+            if client is not None:
+                client['latency'].observe(latency_ms)
+                self.latency.observe(latency_ms)
+
+    def write(self, frames):
+        """
+        Add a block of samples with one row per frame.
+        """
+        if not self.clients:
+            self.filled = self.history
+            self.chunk_time = None
+            return
+        position = 0
+        while position < len(frames):
+            if self.chunk_time is None:
+                self.chunk_time = time.time() * 1000
+            count = min(len(frames) - position, len(self.buffer) - self.filled)
+            target = self.buffer[self.filled:self.filled + count]
+            np.copyto(target, frames[position:position + count, 0], casting='unsafe')
+            for channel in range(1, self.channels):
+                np.add(target, frames[position:position + count, channel], out=target, casting='unsafe')
+            self.filled += count
+            position += count
+            if self.filled == len(self.buffer):
+                self.send_chunk()
+
+    def send_chunk(self):
+        samples = sliding_window_view(self.buffer, len(self.kernel))[::self.factor] @ self.kernel
+        self.buffer[:self.history] = self.buffer[len(self.buffer) - self.history:]
+        self.filled = self.history
+        codes = MULAW[np.rint(np.clip(samples, -32768, 32767)).astype(np.int16).view(np.uint16)]
+        chunk = HEADER.pack(self.chunks & 0xFFFF, self.chunk_time) + codes.tobytes()
+        self.chunk_time = None
+        self.chunks += 1
+        with self.lock:
+            for client in self.clients.values():
+                if len(client['queue']) == QUEUE_CHUNKS:
+                    client['dropped'] += 1
+                client['queue'].append((self.chunks - 1, chunk))
+            ready = [(sid, self._take(client)) for sid, client in self.clients.items()]
+        for sid, chunks in ready:
+            self._send(sid, chunks)
+
+    def acknowledged(self, sid, number=None, *args):
+        """
+        Record that a client received the chunk number, and the chunks sent to it before; the oldest chunk in flight if
+        number is None.
+        """
+        with self.lock:
+            client = self.clients.get(sid)
+            if client is None:
+                return
+            in_flight = client['in_flight']
+            if number is None:
+                if in_flight:
+                    in_flight.popleft()
+            else:
+                while in_flight and in_flight[0][0] <= number:
+                    in_flight.popleft()
+            chunks = self._take(client)
+        self._send(sid, chunks)
+
+    def _take(self, client):
+        """
+        Take the chunks a client can be sent now. Call with the lock held.
+        """
+        in_flight = client['in_flight']
+        now = time.monotonic()
+        while in_flight and in_flight[0][1] <= now - ACK_TIMEOUT:
+            in_flight.popleft()
+            client['expired'] += 1
+        chunks = []
+        while client['queue'] and len(in_flight) < MAX_IN_FLIGHT:
+            number, chunk = client['queue'].popleft()
+            chunks.append((number, chunk))
+            in_flight.append((number, now))
+            client['sent'] += 1
+        return chunks
+
+    def _send(self, sid, chunks):
+        for number, chunk in chunks:
+            self.socketio.emit('live_audio', chunk, to=sid, namespace='/',
+                               callback=partial(self.acknowledged, sid, number))
+
+    def get_stats(self):
+        with self.lock:
+            clients = [{
+                'sent': client['sent'],
+                'dropped': client['dropped'],
+                'in_flight': len(client['in_flight']),
+                'expired': client['expired'],
+                'queued': len(client['queue']),
+                'latency_ms': client['latency'].snapshot()
+            } for client in self.clients.values()]
+            latency = self.latency.snapshot()
+        return {
+            **self.get_config(),
+            'listeners': len(clients),
+            'chunks': self.chunks,
+            'bytes_per_second': (HEADER.size + self.chunk_samples) * self.rate / self.chunk_samples,
+            'latency_ms': latency,
+            'clients': clients
+        }
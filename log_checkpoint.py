@@ -0,0 +1,96 @@
+#  Copyright (c) 2024 by Silviu Stroe (brainic.io)
+#  #
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#  #
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU General Public License for more details.
+#  #
+#  You should have received a copy of the GNU General Public License
+#  along with this program. If not, see <http://www.gnu.org/licenses/>.
+#  #
+#  Created on 10/18/26, 11:20 AM
+#  #
+#  Author: Silviu Stroe
+
+import hashlib
+import json
+import logging
+import os
+
+# Set up logging to file
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(module)s - %(levelname)s: %(message)s',
+    filename='/tmp/saycharlie.log',
+    filemode='a'  # Use 'a' to append to the file
+)
+
+HEAD_BYTES = 4096  # Bytes hashed to tell a rotated log apart from the one a checkpoint was taken on
+
+
+def head_hash(file, length):
+    file.seek(0)
+    return hashlib.sha1(file.read(length)).hexdigest()
+
+
+def file_identity(file):
+    """
+    Identify an open log file by inode, device, size and a hash of its first bytes.
+    """
+    stat = os.fstat(file.fileno())
+    head_length = min(stat.st_size, HEAD_BYTES)
+    return {
+        'inode': stat.st_ino,
+        'device': stat.st_dev,
+        'size': stat.st_size,
+        'head_length': head_length,
+        'head_hash': head_hash(file, head_length)
+    }
+
+
+class LogCheckpoint:
+    """
+    Byte offset into a log file, persisted together with the identity of that file and the session in progress.
+    """
+
+    def __init__(self, checkpoint_file):
+        self.checkpoint_file = checkpoint_file
+
+    def load(self):
+        if not os.path.exists(self.checkpoint_file):
+            return None
+        try:
+            with open(self.checkpoint_file, 'r') as file:
+                return json.load(file)
+        except (OSError, json.decoder.JSONDecodeError) as e:
+            logging.error(f"Ignoring unreadable log checkpoint {self.checkpoint_file}: {e}")
+            return None
+
+    def save(self, offset, identity, active_session=None):
+        state = {
+            'offset': offset,
+            'identity': identity,
+            'active_session': active_session
+        }
+        temp_file = f"{self.checkpoint_file}.tmp"
+        with open(temp_file, 'w') as file:
+            json.dump(state, file)
+        os.replace(temp_file, self.checkpoint_file)
+
+    @staticmethod
+    def matches(file, state):
+        """
+        Check that a checkpoint was taken on this file and that the file has not been truncated since.
+        """
+        identity = state.get('identity') or {}
+        stat = os.fstat(file.fileno())
+        if identity.get('inode') != stat.st_ino or identity.get('device') != stat.st_dev:
+            return False
+        if stat.st_size < state.get('offset', 0) or stat.st_size < identity.get('head_length', 0):
+            return False
+        return head_hash(file, identity.get('head_length', 0)) == identity.get('head_hash')
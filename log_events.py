@@ -0,0 +1,102 @@
+#  Copyright (c) 2024 by Silviu Stroe (brainic.io)
+#  #
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#  #
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU General Public License for more details.
+#  #
+#  You should have received a copy of the GNU General Public License
+#  along with this program. If not, see <http://www.gnu.org/licenses/>.
+#  #
+#  Created on 10/18/26, 5:15 PM
+#  #
+#  Author: Silviu Stroe
+
+import re
+
+# Events recognised in svxlink logs. Each rule has a name, a literal marker that every matching line contains and a
+# pattern for the text after the timestamp, whose named groups become the fields of the event.
+EVENT_RULES = [
+    {
+        'name': 'talker',
+        'marker': b'ReflectorLogic: Talker ',
+        'pattern': r'ReflectorLogic: Talker (?P<action>start|stop) on TG #(?P<tg_number>\d+): (?P<callsign>\S+)'
+    },
+    {
+        'name': 'reflector_connect',
+        'marker': b'ReflectorLogic: Connection established',
+        'pattern': r'ReflectorLogic: Connection established to (?P<server>\S+)'
+    },
+    {
+        'name': 'reflector_disconnect',
+        'marker': b'ReflectorLogic: Disconnected from ',
+        'pattern': r'ReflectorLogic: Disconnected from (?P<server>[^\s:]+(?::\d+)?)(?:: (?P<reason>.*))?'
+    },
+    {
+        'name': 'tg_select',
+        'marker': b'ReflectorLogic: Selecting TG #',
+        'pattern': r'ReflectorLogic: Selecting TG #(?P<tg_number>\d+)'
+    },
+    {
+        'name': 'squelch',
+        'marker': b': The squelch is ',
+        'pattern': r'(?P<receiver>\S+): The squelch is (?P<state>OPEN|CLOSED)'
+    },
+    {
+        'name': 'echolink',
+        'marker': b': EchoLink QSO state changed to ',
+        'pattern': r'(?P<callsign>\S+): EchoLink QSO state changed to (?P<state>\S+)'
+    },
+]
+
+GROUP_NAME = re.compile(r'\(\?P<(\w+)>')
+
+
+class EventMatcher:
+    """
+    Match log lines against all the event rules at once.
+
+    The rule patterns are compiled into a single regex, one alternative per rule, with the group names of each rule
+    prefixed by the rule name. The alternative that matched is found from match.lastgroup, so a line is matched once
+    whatever the number of rules. Lines are expected to be prefiltered on the rule markers.
+    """
+
+    def __init__(self, rules=None):
+        rules = rules or EVENT_RULES
+        alternatives = []
+        for rule in rules:
+            name = rule['name']
+            pattern = GROUP_NAME.sub(lambda match: f"(?P<{name}__{match.group(1)}>", rule['pattern'])
+            alternatives.append(f"(?P<{name}>{pattern})")
+        self.regex = re.compile('|'.join(alternatives))
+        # Rule name -> (field names, their group numbers), so only the groups of the rule that matched are read
+        self.fields = {}
+        for rule in rules:
+            names = tuple(GROUP_NAME.findall(rule['pattern']))
+            self.fields[rule['name']] = (names, tuple(self.regex.groupindex[f"{rule['name']}__{field}"]
+                                                      for field in names))
+        self.markers = tuple(dict.fromkeys(rule['marker'] for rule in rules))
+        self.hits = dict.fromkeys(self.fields, 0)  # Lines matched by each rule
+
+    def match(self, line):
+        """
+        Return (rule name, timestamp text, fields) for a line matching one of the rules, None otherwise.
+        """
+        # svxlink separates the timestamp from the message with the first ': ', which no timestamp format contains
+        separator = line.find(': ')
+        if separator == -1:
+            return None
+        match = self.regex.match(line, separator + 2)
+        if match is None:
+            return None
+        name = match.lastgroup  # The rule group closes after the groups nested in it
+        self.hits[name] += 1
+        names, groups = self.fields[name]
+        if len(groups) == 1:
+            return name, line[:separator], {names[0]: match.group(groups[0])}
+        return name, line[:separator], dict(zip(names, match.group(*groups)))
@@ -0,0 +1,140 @@
+#  Copyright (c) 2024 by Silviu Stroe (brainic.io)
+#  #
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#  #
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU General Public License for more details.
+#  #
+#  You should have received a copy of the GNU General Public License
+#  along with this program. If not, see <http://www.gnu.org/licenses/>.
+#  #
+#  Created on 10/18/26, 7:30 PM
+#  #
+#  Author: Silviu Stroe
+
+import logging
+import os
+import struct
+from array import array
+from bisect import bisect_left, bisect_right
+
+# Set up logging to file
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(module)s - %(levelname)s: %(message)s',
+    filename='/tmp/saycharlie.log',
+    filemode='a'  # Use 'a' to append to the file
+)
+
+HEADER = struct.Struct('<4sHQQ')  # Magic, version, device and inode of the indexed log
+ENTRY = struct.Struct('<dq')  # Timestamp, byte offset of the line it was read from
+MAGIC = b'SVXI'
+VERSION = 1
+PROBE_BYTES = 4096  # Bytes read at each sampled offset to find the next line and its timestamp
+
+
+class LogIndex:
+    """
+    Sparse index from timestamps to byte offsets in a log file: the first line after every interval bytes.
+
+    Timestamps are kept as a running maximum so that they can be bisected even if the log goes back in time. The
+    entries are appended to index_file by save(), after a header identifying the log file they belong to.
+    """
+
+    def __init__(self, index_file, interval=64 * 1024):
+        self.index_file = index_file
+        self.interval = interval
+        self.timestamps = array('d')
+        self.offsets = array('q')
+        self.next_offset = 0  # Where extend() samples next
+        self.saved = 0  # Entries already in index_file
+        self.identity = None  # (device, inode) of the indexed log
+
+    def reset(self):
+        self.timestamps = array('d')
+        self.offsets = array('q')
+        self.next_offset = 0
+        self.saved = 0
+        self.identity = None
+
+    def load(self, file):
+        """
+        Load the index saved for this log file. A missing, foreign or damaged index is started over.
+        """
+        self.reset()
+        stat = os.fstat(file.fileno())
+        try:
+            with open(self.index_file, 'rb') as index:
+                header = index.read(HEADER.size)
+                data = index.read()
+        except FileNotFoundError:
+            return
+        if len(header) != HEADER.size or HEADER.unpack(header) != (MAGIC, VERSION, stat.st_dev, stat.st_ino):
+            logging.info(f"Ignoring log index {self.index_file}, it belongs to another log file")
+            return
+        for timestamp, offset in ENTRY.iter_unpack(data[:len(data) - len(data) % ENTRY.size]):
+            if offset >= stat.st_size:
+                break  # The log was truncated since; the entries past its end are stale
+            self.timestamps.append(timestamp)
+            self.offsets.append(offset)
+        self.identity = (stat.st_dev, stat.st_ino)
+        self.next_offset = self.offsets[-1] + self.interval if self.offsets else 0
+        self.saved = len(self.offsets) if len(self.offsets) * ENTRY.size == len(data) else 0
+
+    def save(self):
+        if self.identity is None or self.saved == len(self.offsets):
+            return
+        try:
+            if self.saved == 0:
+                with open(self.index_file, 'wb') as index:
+                    index.write(HEADER.pack(MAGIC, VERSION, *self.identity))
+            with open(self.index_file, 'ab') as index:
+                for entry in range(self.saved, len(self.offsets)):
+                    index.write(ENTRY.pack(self.timestamps[entry], self.offsets[entry]))
+            self.saved = len(self.offsets)
+        except OSError as e:
+            logging.error(f"Failed to save log index {self.index_file}: {e}")
+
+    def extend(self, file, end, parse_timestamp):
+        """
+        Sample the log from the last entry up to end, every interval bytes.
+
+        parse_timestamp(raw_line) returns the Unix time of a raw line, or None. Moves the file position.
+        """
+        if self.identity is None:
+            stat = os.fstat(file.fileno())
+            self.identity = (stat.st_dev, stat.st_ino)
+        target = self.next_offset
+        while target < end:
+            file.seek(target)
+            probe = file.read(min(PROBE_BYTES, end - target))
+            line_start = 0 if target == 0 else probe.find(b'\n') + 1
+            line_end = probe.find(b'\n', line_start)
+            if (line_start == 0 and target != 0) or line_end == -1:
+                if len(probe) < PROBE_BYTES:
+                    break  # The next line is not complete yet; sample here again when the log grows
+                target += self.interval  # No complete line in the probe
+                continue
+            timestamp = parse_timestamp(probe[line_start:line_end])
+            if timestamp is not None:
+                if self.timestamps and timestamp < self.timestamps[-1]:
+                    timestamp = self.timestamps[-1]
+                self.timestamps.append(timestamp)
+                self.offsets.append(target + line_start)
+            target += line_start + self.interval
+        self.next_offset = target
+
+    def span(self, start_ts, end_ts, size):
+        """
+        Return the byte range of a log of the given size that holds every line from start_ts to end_ts.
+        """
+        first = bisect_left(self.timestamps, start_ts) - 1  # Last entry before start_ts
+        start = self.offsets[first] if first >= 0 else 0
+        last = bisect_right(self.timestamps, end_ts)  # First entry after end_ts
+        end = self.offsets[last] if last < len(self.offsets) else size
+        return start, end
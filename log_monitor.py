@@ -17,16 +17,22 @@
 #  #
 #  Author: Silviu Stroe
 
+import json
 import os
 import re
 import time
 import logging
-from watchdog.observers import Observer
-from watchdog.events import FileSystemEventHandler
 from dateutil import parser
-from datetime import datetime
+from datetime import datetime, timedelta
 import pytz
 
+from log_checkpoint import LogCheckpoint, file_identity
+from log_events import EventMatcher
+from log_index import LogIndex
+from log_tailer import LogTailer
+from metrics import Histogram, RateMeter
+from session_store import SessionStore, DEFAULT_SOURCE
+
 # Set up logging to file
 logging.basicConfig(
     level=logging.INFO,
@@ -36,141 +42,590 @@ logging.basicConfig(
 )
 
 
+TZINFOS = {
+    "CET": pytz.timezone("Europe/Berlin"),  # Central European Time
+    "CEST": pytz.timezone("Europe/Berlin"),  # Central European Summer Time
+    "EST": pytz.timezone("America/New_York"),  # Eastern Standard Time
+    "EDT": pytz.timezone("America/New_York"),  # Eastern Daylight Time
+    "PST": pytz.timezone("America/Los_Angeles"),  # Pacific Standard Time
+    "PDT": pytz.timezone("America/Los_Angeles"),  # Pacific Daylight Time
+    "IST": pytz.timezone("Asia/Kolkata"),  # Indian Standard Time
+    "BST": pytz.timezone("Europe/London"),  # British Summer Time
+    "GMT": pytz.timezone("GMT")  # Greenwich Mean Time
+}
+
+DATE_FORMATS = [
+    "%a %b %d %H:%M:%S %Y",  # 'Wed May  8 18:53:29 2024'
+    "%Y-%m-%d %H:%M:%S",  # '2024-05-16 21:24:18'
+    "%d.%m.%Y %H:%M:%S",  # '19.05.2024 10:59:11'
+    # Add more formats as observed
+]
+
+TALKER_MARKER = b'ReflectorLogic: Talker '
+
+MONTHS = {month: index for index, month in enumerate(
+    ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec'], start=1)}
+
+# Offsets for the seconds field, keyed by its text with and without zero padding
+SECONDS = {text: timedelta(seconds=second) for second in range(60) for text in (str(second), f"{second:02d}")}
+
+
 def robust_parse_date(date_str):
-    tzinfos = {
-        "CET": pytz.timezone("Europe/Berlin"),  # Central European Time
-        "CEST": pytz.timezone("Europe/Berlin"),  # Central European Summer Time
-        "EST": pytz.timezone("America/New_York"),  # Eastern Standard Time
-        "EDT": pytz.timezone("America/New_York"),  # Eastern Daylight Time
-        "PST": pytz.timezone("America/Los_Angeles"),  # Pacific Standard Time
-        "PDT": pytz.timezone("America/Los_Angeles"),  # Pacific Daylight Time
-        "IST": pytz.timezone("Asia/Kolkata"),  # Indian Standard Time
-        "BST": pytz.timezone("Europe/London"),  # British Summer Time
-        "GMT": pytz.timezone("GMT")  # Greenwich Mean Time
-    }
-
-    date_formats = [
-        "%a %b %d %H:%M:%S %Y",  # 'Wed May  8 18:53:29 2024'
-        "%Y-%m-%d %H:%M:%S",  # '2024-05-16 21:24:18'
-        "%d.%m.%Y %H:%M:%S",  # '19.05.2024 10:59:11'
-        # Add more formats as observed
-    ]
-    for fmt in date_formats:
+    for fmt in DATE_FORMATS:
         try:
             return datetime.strptime(date_str, fmt)
         except ValueError:
             continue
     try:
-        return parser.parse(date_str, fuzzy=True, dayfirst=True, tzinfos=tzinfos)
+        return parser.parse(date_str, fuzzy=True, dayfirst=True, tzinfos=TZINFOS)
     except ValueError:
         logging.error(f"Failed to parse date: {date_str}")
         return None
 
 
+class DateDecoder:
+    """
+    Precompiled decoder for one of the DATE_FORMATS, returning None instead of raising when a string does not fit.
+
+    Log lines share the same minute in long runs, so every validated minute is cached under the timestamp with its
+    seconds cut out; a string of the same width that only differs in the seconds digits skips the regex entirely.
+    """
+
+    MAX_CACHED_MINUTES = 4096
+
+    def __init__(self, name, pattern, fields):
+        self.name = name
+        self.regex = re.compile(pattern)
+        self.fields = fields  # Group numbers of (year, month, day, hour, minute, second)
+        self.width = None  # Width and seconds span of the last decoded timestamp
+        self.seconds_span = (0, 0)
+        self.minutes = {}
+
+    def decode(self, date_str):
+        start, end = self.seconds_span
+        if len(date_str) == self.width:
+            minute = self.minutes.get(date_str[:start] + date_str[end:])
+            seconds = SECONDS.get(date_str[start:end])
+            if minute is not None and seconds is not None:
+                return minute + seconds
+
+        match = self.regex.fullmatch(date_str)
+        if match is None:
+            return None
+        year, month, day, hour, minute, second = match.group(*self.fields)
+        month = MONTHS[month] if month in MONTHS else int(month)
+        try:
+            date_time = datetime(int(year), month, int(day), int(hour), int(minute), int(second))
+        except ValueError:
+            return None
+
+        start, end = match.span(self.fields[5])
+        if len(self.minutes) >= self.MAX_CACHED_MINUTES:
+            self.minutes.clear()
+        self.width = len(date_str)
+        self.seconds_span = (start, end)
+        self.minutes[date_str[:start] + date_str[end:]] = date_time.replace(second=0)
+        return date_time
+
+
+DATE_DECODER_SPECS = [  # (name, pattern, fields) of a DateDecoder; every TimestampParser builds its own
+    # 'Wed May  8 18:53:29 2024'
+    ('ctime', r'(?:Mon|Tue|Wed|Thu|Fri|Sat|Sun) (' + '|'.join(MONTHS) + r') +(\d{1,2}) '
+              r'(\d{1,2}):(\d{1,2}):(\d{1,2}) (\d{4})', (6, 1, 2, 3, 4, 5)),
+    # '2024-05-16 21:24:18'
+    ('iso', r'(\d{4})-(\d{1,2})-(\d{1,2}) (\d{1,2}):(\d{1,2}):(\d{1,2})', (1, 2, 3, 4, 5, 6)),
+    # '19.05.2024 10:59:11'
+    ('dotted', r'(\d{1,2})\.(\d{1,2})\.(\d{4}) (\d{1,2}):(\d{1,2}):(\d{1,2})', (3, 2, 1, 4, 5, 6)),
+]
+
+
+class TimestampParser:
+    """
+    Parse log timestamps, learning which format the log file uses from the lines already seen.
+
+    The learned decoder is tried first; the other decoders are only tried when it misses, and the slow
+    robust_parse_date() fallback only runs on lines that fit none of them.
+    """
+
+    def __init__(self):
+        # Decoders cache what they learn, so each parser has its own and parsers need no lock
+        self.decoders = [DateDecoder(*spec) for spec in DATE_DECODER_SPECS]
+        self.decoder = None
+        self.fallbacks = 0
+        self.last = (None, None)  # Last timestamp decoded and its datetime; svxlink writes lines in bursts
+
+    def parse(self, date_str, fallback=True):
+        """
+        Return the datetime of a log timestamp, or None. Without fallback, only the known formats are tried.
+        """
+        if date_str == self.last[0]:
+            return self.last[1]
+        decoder = self.decoder
+        if decoder is not None:
+            date_time = decoder.decode(date_str)
+            if date_time is not None:
+                self.last = (date_str, date_time)
+                return date_time
+        for candidate in self.decoders:
+            if candidate is decoder:
+                continue
+            date_time = candidate.decode(date_str)
+            if date_time is not None:
+                logging.info(f"Learned log timestamp format: {candidate.name}")
+                self.decoder = candidate
+                self.last = (date_str, date_time)
+                return date_time
+        if not fallback:
+            return None
+        self.fallbacks += 1
+        return robust_parse_date(date_str)
+
+
+def decode_line(raw_line):
+    try:
+        return raw_line.decode('utf-8')
+    except UnicodeDecodeError:
+        try:
+            # Attempt a different encoding
+            return raw_line.decode('ISO-8859-1')
+        except UnicodeDecodeError:
+            # Fallback to replacement for any remaining errors
+            return raw_line.decode('utf-8', errors='replace')
+
+
+def iter_lines_reversed(file, end, block_size=64 * 1024):
+    """
+    Yield the lines of file[0:end] from the last to the first, reading the file backwards in blocks.
+    """
+    position = end
+    remainder = b''
+    while position > 0:
+        size = min(block_size, position)
+        position -= size
+        file.seek(position)
+        lines = (file.read(size) + remainder).split(b'\n')
+        remainder = lines[0]
+        yield from reversed(lines[1:])
+    yield remainder
+
+
+def iter_marked_lines(data, markers, end):
+    """
+    Yield the lines of data[0:end] that contain one of the markers, in order, without decoding or splitting the
+    lines that do not. data[0:end] must end with a line break.
+    """
+    if len(markers) == 1:
+        marker = markers[0]
+        index = data.find(marker, 0, end)
+        while index != -1:
+            line_start = data.rfind(b'\n', 0, index) + 1
+            line_end = data.find(b'\n', index, end)
+            yield data[line_start:line_end]
+            index = data.find(marker, line_end, end)
+        return
+
+    # One find() pass per marker, then the lines in the order they appear; a line holding several markers once
+    lines = {}
+    for marker in markers:
+        index = data.find(marker, 0, end)
+        while index != -1:
+            line_start = data.rfind(b'\n', 0, index) + 1
+            line_end = data.find(b'\n', index, end)
+            lines[line_start] = line_end
+            index = data.find(marker, line_end, end)
+    for line_start in sorted(lines):
+        yield data[line_start:lines[line_start]]
+
+
+REPLAY = 'replay'  # Rebuilding state from lines already in the log, without emitting anything
+LIVE = 'live'  # Tailing new lines and emitting every change to the clients
+
+EVENT_DATA_CACHE_SIZE = 1024  # JSON encodings of event fields kept, the same few recur in every squelch or TG event
+
+
 class LogMonitor:
-    def __init__(self, log_file, socketio):
+    CHECKPOINT_INTERVAL = 5  # Seconds between checkpoint writes while tailing
+    READ_CHUNK_SIZE = 1024 * 1024  # Bytes read from the log at once
+
+    def __init__(self, log_file, socketio, session_store=None, checkpoint_file='log_checkpoint.json',
+                 tail_sessions=50, source=DEFAULT_SOURCE, airtime_stats=None, index_file=None, audio_recorder=None,
+                 session_audio=None):
         logging.info(f"Initializing LogMonitor for {log_file}")
+        self.source = source  # Name of the svxlink instance writing this log
+        self.room = f"source:{source}"  # Socket.IO room of the clients following this source
         self.active_session = None
         self.talk_start_time = None
-        self.observer = None
+        self.tailer = None
         self.log_file = log_file
         self.socketio = socketio
-        self.talkers = []
-        self.active_talker = None
+        self.session_store = session_store if session_store is not None else SessionStore()
+        self.airtime_stats = airtime_stats  # Optional AirtimeStats told about every session start and stop
+        self.audio_recorder = audio_recorder  # Optional AudioRecorder of the live sessions' audio
+        self.active_clip = None
+        self.session_audio = session_audio  # Optional SessionAudioStats of the live sessions' audio
+        recent = self.session_store.recent(1, source=source)
+        self.last_session = recent[0] if recent else None  # Most recent finished session
         self.last_position = 0  # Track the last read position in the log file
-        self.read_log()  # Read the log file initially
+        self.timestamp_parser = TimestampParser()  # Learns the timestamp format of this log file
+        self.event_matcher = EventMatcher()
+        self.event_handlers = {'talker': self.on_talker}  # Other events go to on_event()
+        self.event_rows = []  # Events parsed and not handed to the session store yet
+        self.event_time = None  # Timestamp of the last event, with its ts and text in event_stamp
+        self.event_stamp = None
+        self.event_data = {}  # (event type, field values) -> fields as JSON
+        self.checkpoint = LogCheckpoint(checkpoint_file)
+        # Timestamp -> offset index of the log, kept next to the checkpoint
+        self.log_index = LogIndex(index_file or f"{os.path.splitext(checkpoint_file)[0]}.idx")
+        self.last_checkpoint_time = 0
+        self.tail_sessions = tail_sessions  # Sessions recovered from the end of the log without a checkpoint
+        self.mode = REPLAY
+        self.phase_stats = {phase: {'lines': 0, 'bytes': 0, 'seconds': 0.0} for phase in (REPLAY, LIVE)}
+        self.write_time = None  # Modification time of the log when the lines being parsed were read
+        self.emit_latency = Histogram()  # Milliseconds from the log write to the Socket.IO emit
+        self.line_rate = RateMeter()
+        self.byte_rate = RateMeter()
+        self.startup_stats = self.load_initial_state()
 
-    def start_monitoring(self):
-        logging.info("Starting log monitoring")
-        event_handler = LogFileEventHandler(self)
-        observer = Observer()
-        observer.schedule(event_handler, path=os.path.dirname(self.log_file), recursive=False)
-        observer.start()
-        self.observer = observer
+    def load_initial_state(self):
+        """
+        Resume from the checkpoint when it still matches the log file, otherwise recover the last sessions from the
+        end of the log. Returns how the state was loaded and how long it took.
+        """
+        started = time.perf_counter()
+        mode, bytes_read = 'missing', 0
         try:
-            while True:
-                time.sleep(1)
-        except KeyboardInterrupt:
-            logging.info("Monitoring interrupted by user")
-            self.stop_monitoring()
+            with open(self.log_file, 'rb') as file:
+                state = self.checkpoint.load()
+                if state and self.checkpoint.matches(file, state):
+                    mode = 'resume'
+                    self.log_index.load(file)
+                    self.last_position = state['offset']
+                    self.active_session = state.get('active_session')
+                    bytes_read = os.fstat(file.fileno()).st_size - self.last_position
+                    self.read_log()
+                else:
+                    mode = 'tail'
+                    self.log_index.reset()
+                    bytes_read = self.recover_tail(file)
+                    self.log_index.extend(file, self.last_position, self.line_timestamp)
+        except FileNotFoundError:
+            logging.error(f"Log file '{self.log_file}' not found.")
+        self.session_store.flush()
+        self.save_checkpoint()
+
+        startup_stats = {
+            'mode': mode,
+            'seconds': time.perf_counter() - started,
+            'bytes_read': bytes_read
+        }
+        logging.info(f"Log monitor startup ({mode}) took {startup_stats['seconds']:.3f}s, "
+                     f"read {bytes_read} bytes")
+        return startup_stats
+
+    def go_live(self):
+        """
+        Switch to live tailing once the replay caught up with the log, and emit the resulting state.
+        """
+        replay = self.phase_stats[REPLAY]
+        logging.info(f"Replay finished: {replay['lines']} lines, {replay['bytes']} bytes in {replay['seconds']:.3f}s")
+        self.mode = LIVE
+        current_talker = self.active_session or self.last_session
+        if current_talker:
+            self.emit_talker(current_talker)
+
+    def emit_talker(self, talker):
+        self.emit('update_last_talker', talker)
+
+    def emit(self, event, data):
+        if self.mode == LIVE:
+            self.socketio.emit(event, data, namespace='/', to=self.room)
+            if self.write_time is not None:
+                self.emit_latency.observe(max(0.0, time.time() - self.write_time) * 1000)
+
+    def recover_tail(self, file):
+        """
+        Parse only the last tail_sessions sessions of the log, scanning it backwards. Returns the bytes scanned.
+        """
+        started = time.perf_counter()
+        end = file.seek(0, os.SEEK_END)
+        bytes_read, lines_read, stops = 0, 0, 0
+        marked_lines = []
+        markers = self.event_matcher.markers
+        for raw_line in iter_lines_reversed(file, end):
+            bytes_read += len(raw_line) + 1
+            lines_read += 1
+            if not any(marker in raw_line for marker in markers):
+                continue
+            marked_lines.append(raw_line)
+            if TALKER_MARKER not in raw_line:
+                continue
+            is_stop = b'Talker stop ' in raw_line
+            if not is_stop and stops >= self.tail_sessions:
+                break  # Start of the oldest session to recover
+            stops += is_stop
+
+        for raw_line in reversed(marked_lines):
+            self.parse_line(decode_line(raw_line))
+        self.save_events()
+        self.last_position = end
+        self.phase_stats[REPLAY]['lines'] += lines_read
+        self.phase_stats[REPLAY]['bytes'] += min(bytes_read, end)
+        self.phase_stats[REPLAY]['seconds'] += time.perf_counter() - started
+        return min(bytes_read, end)
+
+    def save_checkpoint(self, file=None):
+        try:
+            if file is not None:
+                identity = file_identity(file)
+            else:
+                with open(self.log_file, 'rb') as log_file:
+                    identity = file_identity(log_file)
+            # Sessions must be stored before the checkpoint moves past them
+            self.session_store.flush()
+            self.log_index.save()
+            self.checkpoint.save(self.last_position, identity, self.active_session)
+            self.last_checkpoint_time = time.monotonic()
+        except OSError as e:
+            logging.error(f"Failed to save log checkpoint: {e}")
+
+    def get_stats(self):
+        return {
+            'source': self.source,
+            'log_file': self.log_file,
+            'position': self.last_position,
+            'index_entries': len(self.log_index.offsets),
+            'mode': self.mode,
+            'startup': self.startup_stats,
+            'phases': self.phase_stats,
+            'emit_latency_ms': self.emit_latency.snapshot(),
+            'event_hits': self.event_matcher.hits,
+            'lines_per_second': self.line_rate.rate(),
+            'bytes_per_second': self.byte_rate.rate()
+        }
+
+    def start_monitoring(self, tailer=None):
+        """
+        Follow the log on the given shared tailer, which the caller starts, or on a tailer of its own.
+        """
+        logging.info("Starting log monitoring")
+        if tailer is None:
+            self.tailer = LogTailer()
+            self.tailer.add(self.log_file, self.on_log_data, self.on_log_reset)
+            self.tailer.start()
+        else:
+            tailer.add(self.log_file, self.on_log_data, self.on_log_reset)
 
     def stop_monitoring(self):
         logging.info("Stopping monitoring")
-        self.observer.stop()
-        self.observer.join()
+        if self.tailer is not None:
+            self.tailer.stop()
+        self.save_checkpoint()
+
+    def on_log_data(self, file):
+        """
+        Parse what was appended to the open log file. The first call catches up with the replay and goes live.
+        """
+        started = time.perf_counter()
+        stat = os.fstat(file.fileno())
+        if stat.st_size < self.last_position:
+            self.on_log_reset()  # Replaced between the replay and the first read
+        self.write_time = stat.st_mtime
+        try:
+            file.seek(self.last_position)
+            self.ingest(file)
+            self.log_index.extend(file, self.last_position, self.line_timestamp)
+        finally:
+            self.phase_stats[self.mode]['seconds'] += time.perf_counter() - started
+        if self.mode == REPLAY:
+            self.go_live()
+        if time.monotonic() - self.last_checkpoint_time >= self.CHECKPOINT_INTERVAL:
+            self.save_checkpoint(file)
+
+    def on_log_reset(self):
+        logging.info(f"Reading {self.log_file} from the start")
+        self.last_position = 0
+        self.log_index.reset()
 
     def read_log(self):
         logging.info("Reading log file")
+        started = time.perf_counter()
         try:
             with open(self.log_file, 'rb') as file:
                 file.seek(self.last_position)
-                while True:
-                    raw_line = file.readline()
-                    if not raw_line:
-                        break
-                    try:
-                        decoded_line = raw_line.decode('utf-8')
-                    except UnicodeDecodeError:
-                        try:
-                            # Attempt a different encoding
-                            decoded_line = raw_line.decode('ISO-8859-1')
-                        except UnicodeDecodeError:
-                            # Fallback to replacement for any remaining errors
-                            decoded_line = raw_line.decode('utf-8', errors='replace')
-                    self.parse_line(decoded_line)
-                self.last_position = file.tell()
+                self.ingest(file)
+                self.log_index.extend(file, self.last_position, self.line_timestamp)
         except FileNotFoundError:
             logging.error(f"Log file '{self.log_file}' not found.")
+            return
+        finally:
+            self.phase_stats[self.mode]['seconds'] += time.perf_counter() - started
+        if time.monotonic() - self.last_checkpoint_time >= self.CHECKPOINT_INTERVAL:
+            self.save_checkpoint()
+
+    def ingest(self, file):
+        """
+        Parse the complete lines from the current file position to the end of the file, in large chunks.
+
+        Only lines containing one of the event markers are decoded and matched. A trailing line without its line break
+        is left for the next read, so last_position always points at the start of a line.
+        """
+        phase = self.phase_stats[self.mode]
+        pending = b''
+        while True:
+            chunk = file.read(self.READ_CHUNK_SIZE)
+            if not chunk:
+                break
+            data = pending + chunk if pending else chunk
+            end = data.rfind(b'\n') + 1
+            for raw_line in iter_marked_lines(data, self.event_matcher.markers, end):
+                self.parse_line(decode_line(raw_line))
+            self.save_events()
+            lines = data.count(b'\n', 0, end)
+            phase['lines'] += lines
+            phase['bytes'] += end
+            if self.mode == LIVE:
+                self.line_rate.mark(lines)
+                self.byte_rate.mark(end)
+            self.last_position += end
+            pending = data[end:]
+
+    def line_timestamp(self, raw_line, timestamp_parser=None):
+        """
+        Return the Unix time of a raw log line, or None when it does not start with a known timestamp format.
+        """
+        separator = raw_line.find(b': ')
+        if separator == -1:
+            return None
+        date_time = (timestamp_parser or self.timestamp_parser).parse(decode_line(raw_line[:separator]),
+                                                                     fallback=False)
+        return date_time.timestamp() if date_time else None
+
+    def read_range(self, start_ts, end_ts):
+        """
+        Yield the lines of the log written from start_ts to end_ts, reading only the region the index points to.
+        """
+        timestamp_parser = TimestampParser()  # The monitor's own parser belongs to the tailing thread
+        try:
+            file = open(self.log_file, 'rb')
+        except FileNotFoundError:
+            logging.error(f"Log file '{self.log_file}' not found.")
+            return
+        with file:
+            stat = os.fstat(file.fileno())
+            if self.log_index.identity == (stat.st_dev, stat.st_ino):
+                start, end = self.log_index.span(start_ts, end_ts, stat.st_size)
+            else:
+                start, end = 0, stat.st_size  # Rotated since it was indexed
+            file.seek(start)
+            remaining = end - start
+            pending = b''
+            in_range = False
+            while remaining > 0:
+                chunk = file.read(min(self.READ_CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                raw_lines = (pending + chunk).split(b'\n')
+                pending = raw_lines.pop()  # Incomplete, or empty after a line break
+                for raw_line in raw_lines:
+                    timestamp = self.line_timestamp(raw_line, timestamp_parser)
+                    if timestamp is not None:
+                        if timestamp > end_ts:
+                            return
+                        in_range = timestamp >= start_ts
+                    if in_range:
+                        yield decode_line(raw_line)
 
     def parse_line(self, line):
-        logging.debug("Parsing line from log file")
-        pattern = r'^(.+?): ReflectorLogic: Talker (start|stop) on TG #(\d+): (\S+)'
-        match = re.match(pattern, line)
-        if match:
-            date_time_str, action, tg_number, talker_callsign = match.groups()
-            date_time = robust_parse_date(date_time_str)
-            if not date_time:
-                logging.warning(f"Date format could not be parsed: {date_time_str}")
-                return  # Exit if the date cannot be parsed
-            formatted_date_time = date_time.isoformat()  # Format for both internal use and display
-
-            if action == "start":
-                logging.info(f"Session started: {talker_callsign} on TG #{tg_number}")
-                self.active_session = {
-                    'start_date_time': formatted_date_time,
-                    'tg_number': tg_number,
-                    'callsign': talker_callsign
-                }
-                self.socketio.emit('update_last_talker', self.active_session, namespace='/')
-            elif action == "stop" and self.active_session:
-                logging.info(f"Session stopped: {talker_callsign} on TG #{tg_number}")
-                talker_start_time = datetime.fromisoformat(self.active_session['start_date_time']).timestamp()
-                talker_stop_time = datetime.fromisoformat(formatted_date_time).timestamp()
-                duration = talker_stop_time - talker_start_time  # in seconds
-                self.active_session.update({
-                    'stop_date_time': formatted_date_time,
-                    'stopped': True,
-                    'duration': duration
-                })
-                self.talkers.insert(0, self.active_session)
-                self.talkers = self.talkers[:10]
-                self.socketio.emit('update_last_talker', self.active_session, namespace='/')
-                self.active_session = None
-
-    def get_last_talkers(self):
-        return self.talkers
+        parsed = self.event_matcher.match(line)
+        if parsed is None:
+            return
+        event_type, date_time_str, fields = parsed
+        date_time = self.timestamp_parser.parse(date_time_str)
+        if not date_time:
+            logging.warning(f"Date format could not be parsed: {date_time_str}")
+            return  # Exit if the date cannot be parsed
+        self.event_handlers.get(event_type, self.on_event)(event_type, date_time, fields)
 
-    def get_active_talker(self):
-        return self.active_session
+    def on_talker(self, event_type, date_time, fields):
+        action, tg_number, talker_callsign = fields['action'], fields['tg_number'], fields['callsign']
+        formatted_date_time = date_time.isoformat()  # Format for both internal use and display
+        # Replaying a large log must not write a log record per historical session
+        log_session = logging.info if self.mode == LIVE else logging.debug
 
+        if action == "start":
+            log_session(f"Session started: {talker_callsign} on TG #{tg_number}")
+            if self.active_session is not None:
+                # The stop of the previous talker was missed, so it is dropped without a duration
+                log_session(f"Session dropped without a stop: {self.active_session['callsign']}")
+                if self.airtime_stats is not None:
+                    self.airtime_stats.session_discarded(self.active_session)
+            self.active_session = {
+                'source': self.source,
+                'start_date_time': formatted_date_time,
+                'tg_number': tg_number,
+                'callsign': talker_callsign
+            }
+            if self.airtime_stats is not None:
+                self.airtime_stats.session_started(self.active_session)
+            if self.audio_recorder is not None and self.mode == LIVE:
+                if self.active_clip:
+                    self.audio_recorder.stop_clip(self.active_clip)  # The stop of the previous talker was missed
+                self.active_clip = self.audio_recorder.start_clip(self.active_session)
+            if self.session_audio is not None and self.mode == LIVE:
+                self.session_audio.start()
+            self.emit_talker(self.active_session)
+        elif action == "stop" and self.active_session:
+            log_session(f"Session stopped: {talker_callsign} on TG #{tg_number}")
+            talker_start_time = datetime.fromisoformat(self.active_session['start_date_time']).timestamp()
+            talker_stop_time = date_time.timestamp()
+            duration = talker_stop_time - talker_start_time  # in seconds
+            self.active_session.update({
+                'stop_date_time': formatted_date_time,
+                'stopped': True,
+                'duration': duration
+            })
+            if self.active_clip:
+                self.active_session['clip'] = self.audio_recorder.stop_clip(self.active_clip)
+                self.active_clip = None
+            if self.session_audio is not None and self.session_audio.active:
+                self.active_session['audio'] = self.session_audio.stop()
+            self.session_store.add(self.active_session)
+            if self.airtime_stats is not None:
+                self.airtime_stats.session_stopped(self.active_session)
+            self.last_session = self.active_session
+            self.emit_talker(self.active_session)
+            self.active_session = None
 
-class LogFileEventHandler(FileSystemEventHandler):
-    def __init__(self, log_monitor):
-        super().__init__()
-        self.log_monitor = log_monitor
+    def on_event(self, event_type, date_time, fields):
+        """
+        Queue any other event for the session store, which save_events() hands it to, and send it to the clients as
+        svx_event.
+        """
+        if date_time != self.event_time:  # Events come in bursts sharing their timestamp
+            self.event_time = date_time
+            self.event_stamp = (date_time.timestamp(), date_time.isoformat())
+        ts, date_time_text = self.event_stamp
+        key = (event_type, *fields.values())  # The field names are fixed per event type
+        data = self.event_data.get(key)
+        if data is None:
+            if len(self.event_data) >= EVENT_DATA_CACHE_SIZE:
+                self.event_data.clear()
+            data = self.event_data[key] = json.dumps(fields)
+        self.event_rows.append((self.source, event_type, ts, date_time_text, data))
+        if self.mode == LIVE:
+            self.emit('svx_event', {'source': self.source, 'type': event_type, 'date_time': date_time_text, **fields})
 
-    def on_modified(self, event):
-        logging.debug(f"Detected modification in: {event.src_path}")
-        monitor_path = os.path.abspath(self.log_monitor.log_file)
-        if event.src_path == monitor_path:
-            self.log_monitor.read_log()
+    def save_events(self):
+        """
+        Hand the events parsed since the last call to the session store, in one batch.
+        """
+        if self.event_rows:
+            self.session_store.add_events(self.event_rows)
+            self.event_rows = []
+
+    def get_last_talker(self):
+        return self.last_session
+
+    def get_active_talker(self):
+        return self.active_session
@@ -0,0 +1,260 @@
+#  Copyright (c) 2024 by Silviu Stroe (brainic.io)
+#  #
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#  #
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU General Public License for more details.
+#  #
+#  You should have received a copy of the GNU General Public License
+#  along with this program. If not, see <http://www.gnu.org/licenses/>.
+#  #
+#  Created on 10/18/26, 3:10 PM
+#  #
+#  Author: Silviu Stroe
+
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+import struct
+from threading import Thread, Event, Lock
+
+# Set up logging to file
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(module)s - %(levelname)s: %(message)s',
+    filename='/tmp/saycharlie.log',
+    filemode='a'  # Use 'a' to append to the file
+)
+
+# inotify(7) event flags watched on the log file itself
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+WATCH_MASK = IN_MODIFY | IN_ATTRIB | IN_DELETE_SELF | IN_MOVE_SELF
+
+EVENT_HEADER = struct.Struct('iIII')  # struct inotify_event: wd, mask, cookie, len, followed by len bytes of name
+
+IDLE_CHECK_INTERVAL = 5  # Seconds between rotation checks when inotify reports nothing
+
+
+def load_inotify():
+    """
+    Return libc when it provides inotify, None otherwise (non-Linux systems fall back to polling).
+    """
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        libc.inotify_init1  # noqa: Raises AttributeError where inotify is not available
+        return libc
+    except (OSError, AttributeError):
+        return None
+
+
+class TailedFile:
+    """
+    A log file followed by LogTailer, kept open between reads.
+
+    on_data(file) is called whenever the file may have grown, and on_reset() before reading from the start of a new
+    file, after logrotate renamed or truncated the old one.
+    """
+
+    def __init__(self, tailer, path, on_data, on_reset):
+        self.tailer = tailer
+        self.path = path
+        self.on_data = on_data
+        self.on_reset = on_reset
+        self.file = None
+        self.inode = None
+        self.size = 0
+        self.watch = None
+
+    def open(self):
+        try:
+            self.file = open(self.path, 'rb')
+        except FileNotFoundError:
+            self.file = None
+            return
+        stat = os.fstat(self.file.fileno())
+        self.inode = (stat.st_dev, stat.st_ino)
+        self.size = stat.st_size
+        self.watch = self.tailer.add_watch(self)
+
+    def close(self):
+        if self.watch is not None:
+            self.tailer.remove_watch(self)
+            self.watch = None
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def check(self):
+        """
+        Read whatever was appended, following renames and truncation. Returns True when the file grew.
+        """
+        if self.file is None:
+            self.open()
+            if self.file is None:
+                return False
+            logging.info(f"Log file {self.path} appeared")
+            self.on_reset()
+            self.on_data(self.file)
+            return True
+
+        try:
+            stat = os.stat(self.path)
+            replaced = (stat.st_dev, stat.st_ino) != self.inode
+        except FileNotFoundError:
+            replaced = True
+        if replaced:
+            # Read what was written to the old file before it was rotated away, then move to the new one
+            self.on_data(self.file)
+            logging.info(f"Log file {self.path} was rotated")
+            self.close()
+            return self.check()
+
+        size = os.fstat(self.file.fileno()).st_size
+        if size < self.size:
+            logging.info(f"Log file {self.path} was truncated")
+            self.on_reset()
+        grew = size != self.size
+        self.size = size
+        if grew:
+            self.on_data(self.file)
+        return grew
+
+
+class LogTailer:
+    """
+    Follow any number of log files from one background thread.
+
+    The files are watched with inotify where available, otherwise polled with an interval that backs off while
+    they are idle. Files that do not exist yet, or disappeared in a rotation, are polled until they show up.
+    """
+
+    def __init__(self, min_poll_interval=0.05, max_poll_interval=2.0):
+        self.min_poll_interval = min_poll_interval
+        self.max_poll_interval = max_poll_interval
+        self.files = []
+        self.watches = {}  # inotify watch descriptor -> TailedFile
+        self.libc = load_inotify()
+        self.inotify_fd = None
+        if self.libc is not None:
+            fd = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+            if fd >= 0:
+                self.inotify_fd = fd
+            else:
+                logging.error(f"inotify_init1 failed (errno {ctypes.get_errno()}), polling log files")
+        self.stop_event = Event()
+        self.wake_read, self.wake_write = os.pipe()  # Wakes the inotify wait on stop(); None once closed
+        self.pipe_lock = Lock()  # So that stop() never writes to a closed, maybe reused, descriptor
+        self.thread = None
+
+    def add(self, path, on_data, on_reset):
+        """
+        Follow another file. Must be called before start().
+        """
+        tailed_file = TailedFile(self, path, on_data, on_reset)
+        self.files.append(tailed_file)
+        return tailed_file
+
+    def start(self):
+        self.thread = Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        if self.stop_event.is_set():
+            return
+        self.stop_event.set()
+        with self.pipe_lock:
+            if self.wake_write is not None:
+                os.write(self.wake_write, b'\0')
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        else:
+            self.close()  # Never started, so run() did not close
+
+    def add_watch(self, tailed_file):
+        if self.inotify_fd is None:
+            return None
+        watch = self.libc.inotify_add_watch(self.inotify_fd, os.fsencode(tailed_file.path), WATCH_MASK)
+        if watch < 0:
+            logging.error(f"inotify_add_watch failed (errno {ctypes.get_errno()}), polling {tailed_file.path}")
+            return None
+        self.watches[watch] = tailed_file
+        return watch
+
+    def remove_watch(self, tailed_file):
+        self.watches.pop(tailed_file.watch, None)
+        self.libc.inotify_rm_watch(self.inotify_fd, tailed_file.watch)  # Fails harmlessly if the file is gone
+
+    def run(self):
+        method = 'inotify' if self.inotify_fd is not None else 'polling'
+        logging.info(f"Tailing {', '.join(f.path for f in self.files)} using {method}")
+
+        for tailed_file in self.files:
+            tailed_file.open()
+            if tailed_file.file is not None:
+                tailed_file.on_data(tailed_file.file)
+        interval = self.min_poll_interval
+        try:
+            while not self.stop_event.is_set():
+                ready = self.wait(interval)
+                if self.stop_event.is_set():
+                    break
+                grew = False
+                for tailed_file in ready:
+                    try:
+                        grew |= tailed_file.check()
+                    except Exception as e:
+                        logging.error(f"Failed to read {tailed_file.path}: {e}")
+                # Back off while the polled files are idle
+                interval = self.min_poll_interval if grew else min(interval * 2, self.max_poll_interval)
+        finally:
+            self.close()
+
+    def wait(self, interval):
+        """
+        Block until a watched file changes or a polled file is due, and return the files to check.
+        """
+        polled = [f for f in self.files if f.watch is None]
+        if self.inotify_fd is None:
+            select.select([self.wake_read], [], [], interval)
+            return self.files
+
+        readable, _, _ = select.select([self.inotify_fd, self.wake_read], [], [],
+                                       interval if polled else IDLE_CHECK_INTERVAL)
+        if self.inotify_fd not in readable:
+            return self.files  # Idle: look for rotations that inotify could not report
+        ready = set(polled)
+        try:
+            while True:
+                buffer = os.read(self.inotify_fd, 64 * 1024)
+                offset = 0
+                while offset < len(buffer):
+                    watch, _, _, name_length = EVENT_HEADER.unpack_from(buffer, offset)
+                    offset += EVENT_HEADER.size + name_length
+                    if watch in self.watches:
+                        ready.add(self.watches[watch])
+        except BlockingIOError:
+            pass
+        return [f for f in self.files if f in ready]
+
+    def close(self):
+        for tailed_file in self.files:
+            tailed_file.close()
+        if self.inotify_fd is not None:
+            os.close(self.inotify_fd)
+            self.inotify_fd = None
+        with self.pipe_lock:
+            for fd in (self.wake_read, self.wake_write):
+                if fd is not None:
+                    os.close(fd)
+            self.wake_read = self.wake_write = None
@@ -0,0 +1,96 @@
+#  Copyright (c) 2024 by Silviu Stroe (brainic.io)
+#  #
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#  #
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU General Public License for more details.
+#  #
+#  You should have received a copy of the GNU General Public License
+#  along with this program. If not, see <http://www.gnu.org/licenses/>.
+#  #
+#  Created on 10/18/26, 3:05 PM
+#  #
+#  Author: Silviu Stroe
+
+import time
+from bisect import bisect_left
+
+# Upper bounds in milliseconds, roughly logarithmic from 1 ms to 10 s
+LATENCY_BUCKETS_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000]
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram, cheap enough to update on every event.
+    """
+
+    def __init__(self, bounds=None):
+        self.bounds = list(bounds or LATENCY_BUCKETS_MS)
+        self.counts = [0] * (len(self.bounds) + 1)  # The last bucket counts values above the highest bound
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, fraction):
+        """
+        Return the upper bound of the bucket holding the given fraction of the observations.
+        """
+        if not self.count:
+            return None
+        rank = fraction * self.count
+        seen = 0
+        for bound, count in zip(self.bounds, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return self.max
+
+    def snapshot(self):
+        return {
+            'count': self.count,
+            'mean': self.total / self.count if self.count else None,
+            'max': self.max,
+            'p50': self.percentile(0.5),
+            'p90': self.percentile(0.9),
+            'p99': self.percentile(0.99),
+            'buckets': [{'le': bound, 'count': count} for bound, count in zip(self.bounds + ['+Inf'], self.counts)]
+        }
+
+
+class RateMeter:
+    """
+    Events per second over a sliding window, kept in one counter per second.
+    """
+
+    def __init__(self, window=60):
+        self.window = window
+        self.counts = [0] * window
+        self.seconds = [0] * window  # The second each counter belongs to
+        self.total = 0
+
+    def mark(self, count=1, now=None):
+        second = int(now if now is not None else time.time())
+        slot = second % self.window
+        if self.seconds[slot] != second:
+            self.seconds[slot] = second
+            self.counts[slot] = 0
+        self.counts[slot] += count
+        self.total += count
+
+    def rate(self, now=None):
+        second = int(now if now is not None else time.time())
+        recent = sum(count for count, slot_second in zip(self.counts, self.seconds)
+                     if second - self.window < slot_second <= second)
+        return recent / self.window
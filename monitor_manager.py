@@ -0,0 +1,78 @@
+#  Copyright (c) 2024 by Silviu Stroe (brainic.io)
+#  #
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#  #
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU General Public License for more details.
+#  #
+#  You should have received a copy of the GNU General Public License
+#  along with this program. If not, see <http://www.gnu.org/licenses/>.
+#  #
+#  Created on 10/18/26, 4:30 PM
+#  #
+#  Author: Silviu Stroe
+
+import logging
+
+from log_monitor import LogMonitor
+from log_tailer import LogTailer
+
+# Set up logging to file
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(module)s - %(levelname)s: %(message)s',
+    filename='/tmp/saycharlie.log',
+    filemode='a'  # Use 'a' to append to the file
+)
+
+
+class MonitorManager:
+    """
+    One LogMonitor per svxlink instance, all tailed from a single shared thread.
+    """
+
+    def __init__(self, sources, socketio, session_store, airtime_stats=None, audio_recorder=None, session_audio=None):
+        """
+        sources is a list of (source id, log file path) pairs; the first one is the default source. The audio stream
+        is the one of the default source, so only its sessions get audio clips and audio statistics.
+        """
+        self.tailer = LogTailer()
+        self.monitors = {}
+        for source, log_file in sources:
+            if source in self.monitors:  # Each source has its own checkpoint file, named after it
+                raise ValueError(f"Duplicate log source: {source}")
+            self.monitors[source] = LogMonitor(log_file, socketio, session_store,
+                                               checkpoint_file=f"log_checkpoint_{source}.json", source=source,
+                                               airtime_stats=airtime_stats,
+                                               audio_recorder=audio_recorder if source == sources[0][0] else None,
+                                               session_audio=session_audio if source == sources[0][0] else None)
+        self.default_source = sources[0][0]
+
+    def start_monitoring(self):
+        for monitor in self.monitors.values():
+            monitor.start_monitoring(self.tailer)
+        self.tailer.start()
+
+    def stop_monitoring(self):
+        logging.info("Stopping all log monitors")
+        self.tailer.stop()
+        for monitor in self.monitors.values():
+            monitor.save_checkpoint()
+
+    def get(self, source=None):
+        """
+        Return the monitor of a source, the default one when no source is given, or None for unknown sources.
+        """
+        return self.monitors.get(source or self.default_source)
+
+    def get_sources(self):
+        return [{'id': source, 'log_file': monitor.log_file, 'default': source == self.default_source}
+                for source, monitor in self.monitors.items()]
+
+    def get_stats(self):
+        return {source: monitor.get_stats() for source, monitor in self.monitors.items()}
@@ -18,12 +18,18 @@
 #  Author: Silviu Stroe
 import subprocess
 import time
-import uuid
 
-from flask import request, redirect, render_template, url_for, jsonify
+from flask import request, redirect, render_template, url_for, jsonify, Response
 from werkzeug.utils import secure_filename
 
-from config import load_settings, save_settings
+from config import get_settings, settings_store, SettingsError
+from settings_batch import button_changes, talk_group_changes
+from talk_groups import get_directory, merge_talk_groups, read_csv, read_json, export_csv, export_json, \
+    IMPORT_FORMATS, IMPORT_MODES, SEARCH_LIMIT, MAX_SEARCH_LIMIT
+import csv
+import hashlib
+import io
+import re
 import urllib.parse
 import os
 import logging
@@ -31,6 +37,7 @@ from threading import Thread
 
 from svx_api import get_active_profile
 
+ETAG_VERSION = re.compile(r'([0-9]+)(?:-[0-9a-f]+)?')  # "<version>" or the "<version>-<hash>" of cached_response()
 UPLOAD_FOLDER = 'profile-uploads/'
 ALLOWED_EXTENSIONS = {'conf'}
 
@@ -49,7 +56,7 @@ def allowed_file(filename):
 
 
 def file_manager():
-    settings_data = load_settings()
+    settings_data = get_settings()
 
     # Ensure UPLOAD_FOLDER exists; create it if it doesn't
     os.makedirs(UPLOAD_FOLDER, exist_ok=True)
@@ -84,250 +91,304 @@ def delete_file(filename):
     return redirect(url_for('file_manager'))
 
 
+def cached_response(name, build, mimetype):
+    """
+    Respond with the body build(settings) returns, computed once per version of the settings, with a strong ETag made
+    of the version and a hash of the body. A request whose If-None-Match has the ETag gets 304 Not Modified without a
+    body. Clients are asked to revalidate every time, which then costs a dict lookup.
+    """
+    body, etag = settings_store.derived(name, lambda settings_data, version: tag_body(build(settings_data), version),
+                                        versioned=True)
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+    else:
+        response = Response(body, mimetype=mimetype)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+def tag_body(body, version):
+    return body, f"{version}-{hashlib.blake2b(body, digest_size=8).hexdigest()}"
+
+
 def dashboard():
-    settings_data = load_settings()
     active_profile, _ = get_active_profile()
     # get file name from the path
     profile_name = urllib.parse.unquote(os.path.basename(active_profile))
 
-    return render_template('dashboard.html', buttons=settings_data['buttons'],
-                           columns=settings_data['columns'], app_background=settings_data['app_background'],
-                           svx_active_profile=profile_name)
+    def render(settings_data):
+        return render_template('dashboard.html', buttons=settings_data['buttons'],
+                               columns=settings_data['columns'], app_background=settings_data['app_background'],
+                               svx_active_profile=profile_name).encode()
+
+    return cached_response(f"dashboard:{profile_name}", render, 'text/html')
 
 
 def category(category_uuid):
-    settings_data = load_settings()
-    category_data = settings_data['buttons']
     active_profile, _ = get_active_profile()
     # get file name from the path
     profile_name = urllib.parse.unquote(os.path.basename(active_profile))
-    buttons_in_category = []
-    # if button label is equal to category name, return buttons in that category
-    for button in category_data:
-        if button.get('category') == category_uuid:
-            buttons_in_category.append(button)
-    return render_template('category.html', app_background=settings_data['app_background'],
-                           columns=settings_data['columns'],
-                           buttons_in_category=buttons_in_category,
-                           svx_active_profile=profile_name
-                           )
+
+    def render(settings_data):
+        category_data = settings_data['buttons']
+        buttons_in_category = []
+        # if button label is equal to category name, return buttons in that category
+        for button in category_data:
+            if button.get('category') == category_uuid:
+                buttons_in_category.append(button)
+        return render_template('category.html', app_background=settings_data['app_background'],
+                               columns=settings_data['columns'],
+                               buttons_in_category=buttons_in_category,
+                               svx_active_profile=profile_name
+                               ).encode()
+
+    if settings_store.position('buttons', category_uuid) is None:
+        # Not worth caching
+        return Response(render(get_settings()), mimetype='text/html')
+    return cached_response(f"category:{category_uuid}:{profile_name}", render, 'text/html')
+
+
+def expected_version():
+    """
+    Return the settings version a change is based on, from an If-Match header with the version, "<version>", or an
+    ETag of a cached_response(), or None to change the current settings whatever their version. Of several ETags, the
+    one of the current version is used. Weak ETags never match a change, so a header with only weak ones gets 412
+    Precondition Failed; a header that is not a list of ETags gets 400.
+    """
+    if 'If-Match' not in request.headers:
+        return None
+    if_match = request.if_match
+    if if_match.star_tag:
+        return None
+    versions = set()
+    for tag in if_match.as_set():  # Strong ETags only
+        match = ETAG_VERSION.fullmatch(tag)
+        if match is None:
+            raise SettingsError("Invalid If-Match header")
+        versions.add(int(match.group(1)))
+    if not versions:
+        if if_match.as_set(include_weak=True):
+            raise SettingsError("If-Match needs a strong ETag", 412)
+        raise SettingsError("Invalid If-Match header")
+    current = settings_store.version
+    return current if current in versions else max(versions)
+
+
+def batch_operations():
+    """
+    Return the operations of a batch request, {"operations": [...]} or the list alone.
+    """
+    body = request.get_json(silent=True)
+    return body.get('operations') if isinstance(body, dict) else body
 
 
 def get_buttons():
     try:
-        settings_data = load_settings()  # Assuming this function loads your settings
-        # Get all buttons that are categories
-        buttons = [button for button in settings_data['buttons']]
-        return jsonify(buttons), 200
+        return cached_response('buttons_json', lambda settings_data: jsonify(settings_data['buttons']).get_data(),
+                               'application/json')
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 400
 
 
 def add_button():
     try:
-        settings_data = load_settings()
         data = request.json  # Access JSON data sent by Alpine.js
-        new_uuid = str(uuid.uuid4())  # Generate a new UUID for each new button
-
-        new_button = {
-            'id': new_uuid,
-            'label': data['label'],
-            'color': data['color'],
-            'fontColor': data['fontColor'],
-            'category': data.get('category'),
-            'isCategory': data.get('isCategory', False)
-        }
-
-        if new_button['isCategory']:
-            new_button['action'] = ''
-            new_category = {
-                'label': new_button['label'],
-                'buttons': []
-            }
-            settings_data.setdefault('categories', []).append(new_category)
-        else:
-            new_button['action'] = data['action']
-
-        settings_data['buttons'].append(new_button)
-        save_settings(settings_data)
+        created = []
+        # The UUID of the new button is generated
+        operations = [{**data, 'op': 'create', 'id': None}]
+        version = settings_store.change(lambda settings_data: button_changes(settings_data, operations, created),
+                                        expected_version())
         return jsonify({
             'success': True,
             'message': 'Button added successfully',
-            'id': new_uuid
+            'id': created[0],
+            'version': version
         })
+    except SettingsError as e:
+        return jsonify({'success': False, 'message': str(e), 'version': settings_store.version}), e.status
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 400
 
 
 def update_button(uuid_id):
     try:
-        settings_data = load_settings()
-        data = request.json
-        buttons = settings_data['buttons']
-        uuid_id_str = str(uuid_id)  # Ensure uuid_id is treated as a string
-
-        # Find the index of the button to update
-        index = next((i for i, button in enumerate(buttons) if button['id'] == uuid_id_str), None)
-        if index is None:
-            return jsonify({"status": "error", "message": "Button not found"}), 404
-
-        new_label = data.get('label', buttons[index]['label'])  # Default to current label if not provided
-        new_color = data.get('color', buttons[index]['color'])  # Default to current color if not provided
-        new_font_color = data.get('fontColor',
-                                  buttons[index]['fontColor'])  # Default to current font color if not provided
-        new_category = data.get('category', buttons[index]['category'])  # Default to current category if not provided
-        new_is_category = data.get('isCategory',
-                                   buttons[index]['isCategory'])  # Default to current isCategory if not provided
-        new_action = data.get('action', buttons[index]['action'])  # Default to current action if not provided
-
-        # Update the button's label, color, font color, category, isCategory, and action
-        buttons[index]['label'] = new_label
-        buttons[index]['color'] = new_color
-        buttons[index]['fontColor'] = new_font_color
-        buttons[index]['category'] = new_category
-        buttons[index]['isCategory'] = new_is_category
-        buttons[index]['action'] = new_action
-
-        # If the button is a category, update the category label
-        if new_is_category:
-            category_index = next((i for i, category in enumerate(settings_data.get('categories', [])) if
-                                   category['label'] == buttons[index]['label']), None)
-            if category_index is not None:
-                settings_data['categories'][category_index]['label'] = new_label
-
-        save_settings(settings_data)
-        return jsonify({"status": "success", "message": "Button updated successfully"}), 200
+        operations = [{**request.json, 'op': 'update', 'id': str(uuid_id)}]
+        version = settings_store.change(lambda settings_data: button_changes(settings_data, operations, []),
+                                        expected_version())
+        return jsonify({"status": "success", "message": "Button updated successfully", "version": version}), 200
+    except SettingsError as e:
+        return jsonify({"status": "error", "message": str(e), "version": settings_store.version}), e.status
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 400
 
 
 def delete_button(uuid_id):
     try:
-        settings_data = load_settings()
-        buttons = settings_data['buttons']
-        uuid_id_str = str(uuid_id)
-
-        # Find the index and check if it's a category
-        button_to_delete = next((button for button in buttons if button['id'] == uuid_id_str), None)
-        if button_to_delete is None:
-            return jsonify({"status": "error", "message": "Button not found"}), 404
-
-        if button_to_delete.get('isCategory', False):
-            # It's a category, delete all associated buttons
-            buttons = [button for button in buttons if
-                       button['category'] != uuid_id_str and button['id'] != uuid_id_str]
-        else:
-            # It's not a category, just delete this button
-            buttons = [button for button in buttons if button['id'] != uuid_id_str]
+        # Deleting a category also deletes its buttons
+        operations = [{'op': 'delete', 'id': str(uuid_id)}]
+        version = settings_store.change(lambda settings_data: button_changes(settings_data, operations, []),
+                                        expected_version())
+        return jsonify({"status": "success", "message": "Button deleted successfully", "version": version}), 200
+    except SettingsError as e:
+        return jsonify({"status": "error", "message": str(e), "version": settings_store.version}), e.status
+    except Exception as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+
 
-        settings_data['buttons'] = buttons
-        save_settings(settings_data)
-        return jsonify({"status": "success", "message": "Button deleted successfully"}), 200
+def batch_buttons():
+    """
+    Apply a list of button operations, {"operations": [...]}, all at once or not at all; see button_changes().
+    """
+    try:
+        operations = batch_operations()
+        created = []
+        version = settings_store.change(lambda settings_data: button_changes(settings_data, operations, created),
+                                        expected_version())
+        return jsonify({"status": "success", "created": created, "version": version}), 200
+    except SettingsError as e:
+        return jsonify({"status": "error", "message": str(e), "version": settings_store.version}), e.status
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 400
 
 
 def set_columns():
     try:
-        settings_data = load_settings()
         data = request.json
         columns = int(data['columns'])
-        settings_data['columns'] = columns
-        save_settings(settings_data)
-        return jsonify({'success': True, 'message': 'Columns updated successfully'})
+        version = settings_store.change(lambda settings_data: [{'op': 'set', 'key': 'columns', 'value': columns}],
+                                        expected_version())
+        return jsonify({'success': True, 'message': 'Columns updated successfully', 'version': version})
+    except SettingsError as e:
+        return jsonify({'success': False, 'message': str(e), 'version': settings_store.version}), e.status
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 400
 
 
 def app_background():
     try:
-        settings_data = load_settings()
         data = request.json
         app_background = data['background']
-        settings_data['app_background'] = app_background
-        save_settings(settings_data)
-        return jsonify({'success': True, 'message': 'Background color updated successfully'})
+        version = settings_store.change(
+            lambda settings_data: [{'op': 'set', 'key': 'app_background', 'value': app_background}],
+            expected_version())
+        return jsonify({'success': True, 'message': 'Background color updated successfully', 'version': version})
+    except SettingsError as e:
+        return jsonify({'success': False, 'message': str(e), 'version': settings_store.version}), e.status
     except Exception as e:
         return jsonify({'success': False, 'message': str(e)}), 400
 
 
 def get_talk_groups_data():
-    settings_data = load_settings()
-    return jsonify(settings_data.get('talk_groups', [])), 200
+    return cached_response('talk_groups_json',
+                           lambda settings_data: jsonify(settings_data.get('talk_groups', [])).get_data(),
+                           'application/json')
 
 
 def get_group_name(number):
-    settings_data = load_settings()
-    groups = settings_data.get('talk_groups', [])
-    group = next((group for group in groups if str(group['number']) == str(number)), None)
-    if group is not None:
-        return group['name']
-    return None
+    return get_directory().name(number)
 
 
-def add_talk_group():
-    settings_data = load_settings()
-    data = request.get_json()
-    new_uuid = str(uuid.uuid4())  # Generate a new UUID for each new group
-    talk_group = {
-        'id': new_uuid,
-        'name': data['name'],
-        'number': data['number']
-    }
-
-    if any(group['number'] == talk_group['number'] for group in settings_data.get('talk_groups', [])):
-        return jsonify({"status": "error", "message": "Talk group number already exists"}), 400
-
-    settings_data.setdefault('talk_groups', []).append(talk_group)
-    save_settings(settings_data)
-    return jsonify(
-        {"id": new_uuid, "status": "success", "message": f"Talk group {talk_group['name']} added successfully"}), 201
-
+def search_talk_groups():
+    try:
+        limit = min(int(request.args.get('limit', SEARCH_LIMIT)), MAX_SEARCH_LIMIT)
+    except ValueError:
+        return jsonify({"status": "error", "message": "Invalid limit"}), 400
+    return jsonify(get_directory().search(request.args.get('q', ''), max(limit, 1))), 200
+
+
+def import_talk_groups():
+    """
+    Import talk groups from the CSV or JSON request body, all at once: the settings change once, and not at all if a
+    row is invalid.
+    """
+    import_format = request.args.get('format') or ('csv' if request.mimetype == 'text/csv' else 'json')
+    mode = request.args.get('mode', 'merge')
+    if import_format not in IMPORT_FORMATS or mode not in IMPORT_MODES:
+        return jsonify({"status": "error", "message": "Unknown import format or mode"}), 400
+    stream = io.TextIOWrapper(request.stream, encoding='utf-8-sig', newline='')
+    counts = {}
+
+    def build(settings_data):
+        groups, merge_counts = merge_talk_groups(settings_data.get('talk_groups', []), rows, replace=mode == 'replace')
+        counts.update(merge_counts)
+        return [{'op': 'set', 'key': 'talk_groups', 'value': groups}]
 
-def update_talk_group(uuid_id):
-    settings_data = load_settings()
-    data = request.get_json()
-    groups = settings_data.get('talk_groups', [])
-    uuid_id_str = str(uuid_id)  # Ensure uuid_id is treated as a string
+    try:
+        # The body is read before taking the settings lock
+        rows = list(read_csv(stream) if import_format == 'csv' else read_json(stream))
+        version = settings_store.change(build, expected_version())
+    except SettingsError as e:
+        return jsonify({"status": "error", "message": str(e), "version": settings_store.version}), e.status
+    except (ValueError, UnicodeDecodeError, csv.Error) as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    return jsonify({"status": "success", **counts, "version": version}), 200
 
-    # Find the index of the group to update
-    index = next((i for i, group in enumerate(groups) if group['id'] == uuid_id_str), None)
-    if index is None:
-        return jsonify({"status": "error", "message": "Talk group not found"}), 404
 
-    new_number = data.get('number')
-    new_name = data.get('name', groups[index]['name'])  # Default to current name if not provided
+def export_talk_groups():
+    export_format = request.args.get('format', 'csv')
+    if export_format not in IMPORT_FORMATS:
+        return jsonify({"status": "error", "message": "Unknown export format"}), 400
+    groups = get_directory().groups  # Saving replaces the list, so it does not change while streamed
+    if export_format == 'csv':
+        response = Response(export_csv(groups), mimetype='text/csv')
+    else:
+        response = Response(export_json(groups), mimetype='application/json')
+    response.headers['Content-Disposition'] = f"attachment; filename=talk_groups.{export_format}"
+    return response
 
-    # Check if the new number is unique among other groups, except the current one being updated
-    if new_number and any(group['number'] == new_number and group['id'] != uuid_id_str for group in groups):
-        return jsonify({"status": "error", "message": "Talk group number already exists"}), 400
 
-    # Update the group's number and name
-    groups[index]['number'] = new_number if new_number is not None else groups[index]['number']
-    groups[index]['name'] = new_name
-    save_settings(settings_data)
-    return jsonify({"status": "success", "message": "Talk group updated successfully"}), 200
+def add_talk_group():
+    data = request.get_json()
+    created = []
+    # The UUID of the new group is generated
+    operations = [{**data, 'op': 'create', 'id': None}]
+    try:
+        version = settings_store.change(lambda settings_data: talk_group_changes(settings_data, operations, created),
+                                        expected_version())
+    except SettingsError as e:
+        return jsonify({"status": "error", "message": str(e), "version": settings_store.version}), e.status
+    return jsonify(
+        {"id": created[0], "status": "success", "message": f"Talk group {data['name']} added successfully",
+         "version": version}), 201
 
 
-def delete_talk_group(uuid_id):
-    settings_data = load_settings()
-    groups = settings_data.get('talk_groups', [])
-    # Convert uuid_id to str in case it's not already a string
-    uuid_id_str = str(uuid_id)
+def update_talk_group(uuid_id):
+    operations = [{**request.get_json(), 'op': 'update', 'id': str(uuid_id)}]
+    try:
+        version = settings_store.change(lambda settings_data: talk_group_changes(settings_data, operations, []),
+                                        expected_version())
+    except SettingsError as e:
+        return jsonify({"status": "error", "message": str(e), "version": settings_store.version}), e.status
+    return jsonify({"status": "success", "message": "Talk group updated successfully", "version": version}), 200
 
-    index = next((i for i, group in enumerate(groups) if group['id'] == uuid_id_str), None)
-    if index is None:
-        return jsonify({"status": "error", "message": "Talk group not found"}), 404
 
-    # Remove the group from the list
-    del groups[index]
-    settings_data['talk_groups'] = groups
-    save_settings(settings_data)
-    return jsonify({"status": "success", "message": "Talk group deleted successfully"}), 200
+def delete_talk_group(uuid_id):
+    operations = [{'op': 'delete', 'id': str(uuid_id)}]
+    try:
+        version = settings_store.change(lambda settings_data: talk_group_changes(settings_data, operations, []),
+                                        expected_version())
+    except SettingsError as e:
+        return jsonify({"status": "error", "message": str(e), "version": settings_store.version}), e.status
+    return jsonify({"status": "success", "message": "Talk group deleted successfully", "version": version}), 200
+
+
+def batch_talk_groups():
+    """
+    Apply a list of talk group operations, {"operations": [...]}, all at once or not at all; see talk_group_changes().
+    """
+    operations = batch_operations()
+    created = []
+    try:
+        version = settings_store.change(lambda settings_data: talk_group_changes(settings_data, operations, created),
+                                        expected_version())
+    except SettingsError as e:
+        return jsonify({"status": "error", "message": str(e), "version": settings_store.version}), e.status
+    return jsonify({"status": "success", "created": created, "version": version}), 200
 
 
 def settings():
-    settings_data = load_settings()
+    settings_data = get_settings()
     return render_template('settings.html', columns=settings_data['columns'], buttons=settings_data['buttons'],
                            talk_groups=settings_data.get('talk_groups', []),
                            app_background=settings_data['app_background'])
@@ -0,0 +1,120 @@
+#  Copyright (c) 2024 by Silviu Stroe (brainic.io)
+#  #
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#  #
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU General Public License for more details.
+#  #
+#  You should have received a copy of the GNU General Public License
+#  along with this program. If not, see <http://www.gnu.org/licenses/>.
+#  #
+#  Created on 10/19/26, 1:05 AM
+#  #
+#  Author: Silviu Stroe
+
+import math
+from threading import Lock
+
+from audio import CLIP_LEVEL, REFERENCE_PEAK
+
+SILENCE_DB = -45  # Blocks whose RMS level is below this count as silence
+QUIET_DB = -30  # Sessions whose speech level is below this are flagged as too quiet
+CLIP_PERCENT = 1.0  # Sessions clipping during more of their time than this are flagged as over-deviating
+OVER_DEVIATING = 'over-deviating'
+TOO_QUIET = 'too quiet'
+
+
+def to_db(ratio):
+    return round(20 * math.log10(ratio), 1) + 0.0 if ratio > 0 else None  # + 0.0: no -0.0
+
+
+def audio_summary(mean_db, max_db, clip_percent, silence_percent):
+    """
+    Return the audio statistics of a session with their flags, or None for a session without audio statistics.
+    """
+    if clip_percent is None:
+        return None
+    flags = []
+    if clip_percent > CLIP_PERCENT:
+        flags.append(OVER_DEVIATING)
+    if mean_db is None or mean_db < QUIET_DB:
+        flags.append(TOO_QUIET)
+    return {
+        'mean_db': mean_db,
+        'max_db': max_db,
+        'clip_percent': clip_percent,
+        'silence_percent': silence_percent,
+        'flags': flags
+    }
+
+
+class SessionAudioStats:
+    """
+    Aggregates of the RX audio of the talker session in progress: the speech level (the RMS level of the blocks that
+    are not silent), the peak level, the percentage of the time spent clipping and the percentage of silence, all in
+    dB relative to full scale.
+
+    It observes the StreamLevels of the RX source, which pass the sums of squares and peak of every analysed block,
+    usually one datagram. Each block only adds to a few counters, so neither the cost per packet nor the memory grows
+    with the length of the session. Time is counted in whole blocks: a block with a clipped sample counts as clipping.
+    Blocks are ignored between sessions.
+    """
+
+    def __init__(self, channels, reference=REFERENCE_PEAK):
+        self.channels = channels
+        self.reference = reference
+        self.clip_level = reference * CLIP_LEVEL
+        self.silence_squares = (reference * 10 ** (SILENCE_DB / 20)) ** 2 * channels  # Per frame
+        self.lock = Lock()
+        self.active = False
+        self.reset()
+
+    def reset(self):
+        self.frames = 0
+        self.squares = 0.0
+        self.voiced_frames = 0
+        self.voiced_squares = 0.0
+        self.peak = 0.0
+        self.clipped_frames = 0
+
+    def start(self):
+        with self.lock:
+            self.reset()
+            self.active = True
+
+    def stop(self):
+        """
+        End the session. Returns its audio_summary(), or None when no audio was received during the session.
+        """
+        with self.lock:
+            self.active = False
+            if not self.frames:
+                return None
+            if self.voiced_frames:
+                mean = math.sqrt(self.voiced_squares / (self.voiced_frames * self.channels))
+            else:
+                mean = math.sqrt(self.squares / (self.frames * self.channels))
+            return audio_summary(to_db(mean / self.reference), to_db(self.peak / self.reference),
+                                 round(100 * self.clipped_frames / self.frames, 1),
+                                 round(100 * (self.frames - self.voiced_frames) / self.frames, 1))
+
+    def add_block(self, squares, peak, frames):
+        if not self.active:
+            return
+        squares = sum(squares.tolist())
+        peak = float(peak)  # Python floats compare much faster than NumPy scalars
+        with self.lock:
+            self.frames += frames
+            self.squares += squares
+            if squares >= self.silence_squares * frames:
+                self.voiced_frames += frames
+                self.voiced_squares += squares
+            if peak > self.peak:
+                self.peak = peak
+            if peak >= self.clip_level:
+                self.clipped_frames += frames
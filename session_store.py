@@ -0,0 +1,362 @@
+#  Copyright (c) 2024 by Silviu Stroe (brainic.io)
+#  #
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#  #
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU General Public License for more details.
+#  #
+#  You should have received a copy of the GNU General Public License
+#  along with this program. If not, see <http://www.gnu.org/licenses/>.
+#  #
+#  Created on 10/18/26, 10:05 AM
+#  #
+#  Author: Silviu Stroe
+
+import base64
+import json
+import logging
+import sqlite3
+import time
+from datetime import datetime
+from threading import Lock, Event, Thread
+
+from session_audio import audio_summary
+
+# Set up logging to file
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(module)s - %(levelname)s: %(message)s',
+    filename='/tmp/saycharlie.log',
+    filemode='a'  # Use 'a' to append to the file
+)
+
+DEFAULT_SOURCE = 'default'  # Source of the single svxlink instance of a default installation
+
+EVENT_RETENTION = 30 * 86400  # Seconds the events are kept
+MAX_EVENTS = 1_000_000  # Events kept at most; the oldest ones are removed first
+PRUNE_INTERVAL = 3600  # Seconds between two prunings of the events
+
+# Each migration brings the database from the schema version of its index to the next one (PRAGMA user_version)
+MIGRATIONS = [
+    """
+    CREATE TABLE IF NOT EXISTS sessions (
+        id INTEGER PRIMARY KEY,
+        callsign TEXT NOT NULL,
+        tg_number INTEGER NOT NULL,
+        start_ts REAL NOT NULL,
+        stop_ts REAL NOT NULL,
+        duration REAL NOT NULL,
+        start_date_time TEXT NOT NULL,
+        stop_date_time TEXT NOT NULL,
+        UNIQUE (start_ts, callsign, tg_number)
+    );
+    CREATE INDEX IF NOT EXISTS idx_sessions_callsign ON sessions (callsign, start_ts);
+    CREATE INDEX IF NOT EXISTS idx_sessions_tg_number ON sessions (tg_number, start_ts);
+    """,
+    # Sessions are per svxlink instance; two instances linked to one reflector log the same talker
+    f"""
+    CREATE TABLE sessions_by_source (
+        id INTEGER PRIMARY KEY,
+        source TEXT NOT NULL,
+        callsign TEXT NOT NULL,
+        tg_number INTEGER NOT NULL,
+        start_ts REAL NOT NULL,
+        stop_ts REAL NOT NULL,
+        duration REAL NOT NULL,
+        start_date_time TEXT NOT NULL,
+        stop_date_time TEXT NOT NULL,
+        UNIQUE (start_ts, source, callsign, tg_number)
+    );
+    INSERT INTO sessions_by_source (id, source, callsign, tg_number, start_ts, stop_ts, duration, start_date_time,
+                                    stop_date_time)
+        SELECT id, '{DEFAULT_SOURCE}', callsign, tg_number, start_ts, stop_ts, duration, start_date_time,
+               stop_date_time FROM sessions;
+    DROP TABLE sessions;
+    ALTER TABLE sessions_by_source RENAME TO sessions;
+    CREATE INDEX idx_sessions_callsign ON sessions (callsign, start_ts);
+    CREATE INDEX idx_sessions_tg_number ON sessions (tg_number, start_ts);
+    CREATE INDEX idx_sessions_source ON sessions (source, start_ts);
+    """,
+    # Other svxlink events (reflector connections, TG selections, squelch, EchoLink), with their fields as JSON
+    """
+    CREATE TABLE events (
+        id INTEGER PRIMARY KEY,
+        source TEXT NOT NULL,
+        type TEXT NOT NULL,
+        ts REAL NOT NULL,
+        date_time TEXT NOT NULL,
+        data TEXT NOT NULL,
+        UNIQUE (ts, source, type, data)
+    );
+    CREATE INDEX idx_events_source ON events (source, ts);
+    CREATE INDEX idx_events_type ON events (type, ts);
+    """,
+    # Audio clip of the session, recorded by AudioRecorder
+    """
+    ALTER TABLE sessions ADD COLUMN clip TEXT;
+    """,
+    # Audio statistics of the session, from SessionAudioStats
+    """
+    ALTER TABLE sessions ADD COLUMN rx_mean_db REAL;
+    ALTER TABLE sessions ADD COLUMN rx_max_db REAL;
+    ALTER TABLE sessions ADD COLUMN clip_percent REAL;
+    ALTER TABLE sessions ADD COLUMN silence_percent REAL;
+    """,
+]
+
+SESSION_COLUMNS = ('id, source, callsign, tg_number, start_date_time, stop_date_time, duration, start_ts, clip, '
+                   'rx_mean_db, rx_max_db, clip_percent, silence_percent')
+EVENT_COLUMNS = 'id, source, type, date_time, data, ts'
+
+
+def migrate(connection):
+    version = connection.execute('PRAGMA user_version').fetchone()[0]
+    for target, script in enumerate(MIGRATIONS[version:], start=version + 1):
+        logging.info(f"Migrating session store to schema version {target}")
+        connection.executescript(f"BEGIN; {script} PRAGMA user_version = {target}; COMMIT;")
+
+
+def encode_cursor(start_ts, session_id):
+    return base64.urlsafe_b64encode(f"{start_ts!r}:{session_id}".encode()).decode()
+
+
+def decode_cursor(cursor):
+    """
+    Decode a pagination cursor into its (start_ts, id) key. Raises ValueError for malformed cursors.
+    """
+    try:
+        start_ts, session_id = base64.urlsafe_b64decode(cursor.encode()).decode().split(':')
+        return float(start_ts), int(session_id)
+    except ValueError as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+
+class SessionStore:
+    """
+    SQLite-backed history of finished talker sessions and other svxlink events.
+
+    Sessions and events are queued in memory by add() and add_events() and written in one transaction per batch,
+    either when the batch is full or by the background writer every flush_interval seconds. Reads flush pending sessions
+    first. The writer also removes the events older than event_retention seconds and the oldest ones beyond
+    max_events, every PRUNE_INTERVAL seconds; sessions are kept.
+    """
+
+    def __init__(self, db_file='sessions.db', batch_size=500, flush_interval=1.0, event_retention=EVENT_RETENTION,
+                 max_events=MAX_EVENTS):
+        self.db_file = db_file
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.event_retention = event_retention
+        self.max_events = max_events
+        self.pruned_at = None  # Monotonic time of the last pruning of the events
+        self.lock = Lock()
+        self.pending = []
+        self.pending_events = []
+        self.connection = sqlite3.connect(db_file, check_same_thread=False)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        migrate(self.connection)
+        self.stop_event = Event()
+        self.writer = Thread(target=self._run_writer, daemon=True)
+        self.writer.start()
+
+    def _run_writer(self):
+        while not self.stop_event.wait(self.flush_interval):
+            try:
+                self.flush()
+            except sqlite3.Error as e:
+                logging.error(f"Failed to write talker sessions: {e}")
+            if self.pruned_at is None or time.monotonic() - self.pruned_at >= PRUNE_INTERVAL:
+                self.pruned_at = time.monotonic()
+                try:
+                    self.prune_events()
+                except sqlite3.Error as e:
+                    logging.error(f"Failed to prune events: {e}")
+
+    def add(self, session):
+        start_ts = datetime.fromisoformat(session['start_date_time']).timestamp()
+        stop_ts = datetime.fromisoformat(session['stop_date_time']).timestamp()
+        audio = session.get('audio') or {}
+        row = (
+            session.get('source', DEFAULT_SOURCE),
+            session['callsign'],
+            int(session['tg_number']),
+            start_ts,
+            stop_ts,
+            session['duration'],
+            session['start_date_time'],
+            session['stop_date_time'],
+            session.get('clip'),
+            audio.get('mean_db'),
+            audio.get('max_db'),
+            audio.get('clip_percent'),
+            audio.get('silence_percent')
+        )
+        with self.lock:
+            self.pending.append(row)
+            if len(self.pending) >= self.batch_size:
+                self._flush_locked()
+
+    def add_events(self, rows):
+        """
+        Queue events already made into (source, type, ts, date_time, fields as JSON) rows, with one lock for all.
+        """
+        with self.lock:
+            self.pending_events.extend(rows)
+            if len(self.pending_events) >= self.batch_size:
+                self._flush_locked()
+
+    def flush(self):
+        with self.lock:
+            self._flush_locked()
+
+    def prune_events(self):
+        """
+        Remove the events older than event_retention seconds, then the oldest ones beyond max_events. Returns the
+        number of events removed.
+        """
+        with self.lock:
+            self._flush_locked()
+            with self.connection:
+                removed = self.connection.execute(
+                    'DELETE FROM events WHERE ts < ?', (time.time() - self.event_retention,)).rowcount
+                # The UNIQUE (ts, ...) constraint indexes the events by time
+                removed += self.connection.execute(
+                    'DELETE FROM events WHERE ts <= (SELECT ts FROM events ORDER BY ts DESC LIMIT 1 OFFSET ?)',
+                    (self.max_events,)).rowcount
+        if removed:
+            logging.info(f"Pruned {removed} events")
+        return removed
+
+    def _flush_locked(self):
+        if not self.pending and not self.pending_events:
+            return
+        with self.connection:
+            # Re-reading a log must not duplicate sessions or events already stored
+            self.connection.executemany(
+                'INSERT OR IGNORE INTO sessions (source, callsign, tg_number, start_ts, stop_ts, duration, '
+                'start_date_time, stop_date_time, clip, rx_mean_db, rx_max_db, clip_percent, silence_percent) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', self.pending)
+            self.connection.executemany(
+                'INSERT OR IGNORE INTO events (source, type, ts, date_time, data) VALUES (?, ?, ?, ?, ?)',
+                self.pending_events)
+        logging.debug(f"Stored {len(self.pending)} talker sessions and {len(self.pending_events)} events")
+        self.pending = []
+        self.pending_events = []
+
+    def query(self, callsign=None, tg_number=None, cursor=None, limit=50, source=None):
+        """
+        Return a page of sessions, newest first, and the cursor of the next page (None on the last page).
+        """
+        conditions, params = [], []
+        if source:
+            conditions.append('source = ?')
+            params.append(source)
+        if callsign:
+            conditions.append('callsign = ?')
+            params.append(callsign)
+        if tg_number is not None:
+            conditions.append('tg_number = ?')
+            params.append(int(tg_number))
+        if cursor:
+            conditions.append('(start_ts, id) < (?, ?)')
+            params.extend(decode_cursor(cursor))
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        sql = f"SELECT {SESSION_COLUMNS} FROM sessions {where} ORDER BY start_ts DESC, id DESC LIMIT ?"
+        params.append(limit + 1)
+
+        with self.lock:
+            self._flush_locked()
+            rows = self.connection.execute(sql, params).fetchall()
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1]['start_ts'], rows[-1]['id'])
+        return [self._row_to_session(row) for row in rows], next_cursor
+
+    def iter_sessions(self, since_ts=0, batch_size=1000):
+        """
+        Yield every session started at or after since_ts, oldest first.
+        """
+        self.flush()
+        key = (since_ts, 0)
+        while True:
+            with self.lock:
+                rows = self.connection.execute(
+                    f"SELECT {SESSION_COLUMNS} FROM sessions WHERE (start_ts, id) > (?, ?) "
+                    f"ORDER BY start_ts, id LIMIT ?", (*key, batch_size)).fetchall()
+            if not rows:
+                return
+            for row in rows:
+                yield self._row_to_session(row)
+            key = (rows[-1]['start_ts'], rows[-1]['id'])
+
+    def recent(self, limit=10, source=None):
+        sessions, _ = self.query(limit=limit, source=source)
+        return sessions
+
+    def query_events(self, event_type=None, cursor=None, limit=50, source=None):
+        """
+        Return a page of events, newest first, and the cursor of the next page (None on the last page).
+        """
+        conditions, params = [], []
+        if source:
+            conditions.append('source = ?')
+            params.append(source)
+        if event_type:
+            conditions.append('type = ?')
+            params.append(event_type)
+        if cursor:
+            conditions.append('(ts, id) < (?, ?)')
+            params.extend(decode_cursor(cursor))
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        sql = f"SELECT {EVENT_COLUMNS} FROM events {where} ORDER BY ts DESC, id DESC LIMIT ?"
+        params.append(limit + 1)
+
+        with self.lock:
+            self._flush_locked()
+            rows = self.connection.execute(sql, params).fetchall()
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1]['ts'], rows[-1]['id'])
+        return [self._row_to_event(row) for row in rows], next_cursor
+
+    @staticmethod
+    def _row_to_event(row):
+        return {
+            'id': row['id'],
+            'source': row['source'],
+            'type': row['type'],
+            'date_time': row['date_time'],
+            **json.loads(row['data'])
+        }
+
+    @staticmethod
+    def _row_to_session(row):
+        return {
+            'id': row['id'],
+            'source': row['source'],
+            'callsign': row['callsign'],
+            'tg_number': str(row['tg_number']),
+            'start_date_time': row['start_date_time'],
+            'stop_date_time': row['stop_date_time'],
+            'duration': row['duration'],
+            'clip': row['clip'],
+            'audio': audio_summary(row['rx_mean_db'], row['rx_max_db'], row['clip_percent'], row['silence_percent']),
+            'stopped': True
+        }
+
+    def close(self):
+        self.stop_event.set()
+        self.writer.join()
+        self.flush()
+        self.connection.close()
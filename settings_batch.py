@@ -0,0 +1,258 @@
+#  Copyright (c) 2024 by Silviu Stroe (brainic.io)
+#  #
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#  #
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU General Public License for more details.
+#  #
+#  You should have received a copy of the GNU General Public License
+#  along with this program. If not, see <http://www.gnu.org/licenses/>.
+#  #
+#  Created on 10/19/26, 3:40 AM
+#  #
+#  Author: Silviu Stroe
+
+import uuid
+
+from config import settings_store, SettingsError
+
+MAX_OPERATIONS = 10000  # Operations in one batch
+
+
+class ListView:
+    """
+    An id-indexed view of a list of the settings while a batch changes it: the items created, replaced and deleted
+    so far, over the list itself, which is found through the indexes of the settings store. Call within
+    SettingsStore.change().
+    """
+
+    def __init__(self, settings_data, name, label):
+        self.items = settings_data.get(name, [])
+        self.name = name
+        self.label = label
+        self.changed = {}  # Id -> item, or None once deleted
+        self.orders = []  # Id lists of the reorder operations
+
+    def get(self, item_id):
+        item_id = str(item_id)
+        if item_id in self.changed:
+            return self.changed[item_id]
+        position = settings_store.position(self.name, item_id)
+        return None if position is None else self.items[position]
+
+    def require(self, item_id):
+        item = self.get(item_id)
+        if item is None:
+            raise SettingsError(f"{self.label} not found", 404)
+        return item
+
+    def new_id(self, item_id=None):
+        """
+        Return item_id, the id a client chose for a new item, or a new UUID.
+        """
+        if item_id is None:
+            return str(uuid.uuid4())
+        try:
+            item_id = str(uuid.UUID(str(item_id)))
+        except ValueError:
+            raise SettingsError(f"Invalid {self.label.lower()} id {item_id!r}")
+        if self.get(item_id) is not None:
+            raise SettingsError(f"{self.label} {item_id} already exists")
+        return item_id
+
+    def put(self, item):
+        self.changed[str(item['id'])] = item
+
+    def delete(self, item_id):
+        self.changed[str(item_id)] = None
+
+    def reorder(self, ids):
+        """
+        Put the items with these ids in this order, in the positions they occupy together.
+        """
+        if not isinstance(ids, list):
+            raise SettingsError("Expected a list of ids to reorder")
+        ids = [str(item_id) for item_id in ids]
+        if len(set(ids)) != len(ids):
+            raise SettingsError("An id appears twice in the new order")
+        for item_id in ids:
+            self.require(item_id)
+        self.orders.append(ids)
+
+    def final_items(self):
+        """
+        Yield the items of the list as the batch leaves it so far, new items last.
+        """
+        for item in self.items:
+            item_id = str(item.get('id'))
+            item = self.changed.get(item_id, item)
+            if item is not None:
+                yield item
+        for item_id, item in list(self.changed.items()):
+            if item is not None and settings_store.position(self.name, item_id) is None:
+                yield item
+
+    def changes(self):
+        """
+        Return the changes of the settings store that apply the batch: the items created and replaced, the deletions,
+        then the new orders, which hold the same whatever happened to the other items.
+        """
+        changes = [{'op': 'put', 'list': self.name, 'item': item} for item in self.changed.values() if item is not None]
+        removed = [item_id for item_id, item in self.changed.items() if item is None]
+        if removed:
+            changes.append({'op': 'remove', 'list': self.name, 'ids': removed})
+        for ids in self.orders:
+            ids = [item_id for item_id in ids if self.get(item_id) is not None]
+            if len(ids) > 1:
+                changes.append({'op': 'order', 'list': self.name, 'ids': ids})
+        return changes
+
+
+def check_operations(operations):
+    if not isinstance(operations, list) or not all(isinstance(operation, dict) for operation in operations):
+        raise SettingsError("Expected a list of operations")
+    if len(operations) > MAX_OPERATIONS:
+        raise SettingsError(f"At most {MAX_OPERATIONS} operations can be applied at once")
+
+
+def run_operations(operations, apply):
+    """
+    Call apply(operation) for each operation, naming the failing one in the error if there are several.
+    """
+    for number, operation in enumerate(operations, start=1):
+        try:
+            apply(operation)
+        except SettingsError as e:
+            raise SettingsError(f"Operation {number}: {e}" if len(operations) > 1 else str(e), e.status)
+        except KeyError as e:
+            raise SettingsError(f"Operation {number}: missing {e.args[0]}" if len(operations) > 1 else
+                                f"Missing {e.args[0]}")
+
+
+def button_changes(settings_data, operations, created):
+    """
+    Return the settings changes of a batch of button operations, appending the ids of the buttons created to created.
+    Raises SettingsError if any operation is invalid, so the batch applies entirely or not at all.
+
+    Operations are {'op': 'create', fields...}, {'op': 'update', 'id': id, fields...}, {'op': 'delete', 'id': id} and
+    {'op': 'reorder', 'ids': ids}; the fields are those of a button. Deleting a category deletes its buttons, those
+    it has once the whole batch is applied, in one pass over the buttons at the end.
+    """
+    check_operations(operations)
+    view = ListView(settings_data, 'buttons', 'Button')
+    categories = list(settings_data.get('categories', []))
+    deleted_categories = set()
+
+    def apply(operation):
+        op = operation.get('op')
+        if op == 'create':
+            button = {
+                'id': view.new_id(operation.get('id')),
+                'label': operation['label'],
+                'color': operation['color'],
+                'fontColor': operation['fontColor'],
+                'category': operation.get('category'),
+                'isCategory': operation.get('isCategory', False)
+            }
+            if button['isCategory']:
+                button['action'] = ''
+                categories.append({'label': button['label'], 'buttons': []})
+            else:
+                button['action'] = operation['action']
+            view.put(button)
+            created.append(button['id'])
+        elif op == 'update':
+            button = view.require(operation['id'])
+            # Each field defaults to its current value if not provided
+            updated_button = {**button, **{field: operation.get(field, button[field]) for field in
+                                           ('label', 'color', 'fontColor', 'category', 'isCategory', 'action')}}
+            view.put(updated_button)
+            # If the button is a category, update the category label
+            if updated_button['isCategory']:
+                for position, category in enumerate(categories):
+                    if category['label'] == button['label']:
+                        categories[position] = {**category, 'label': updated_button['label']}
+                        break
+        elif op == 'delete':
+            button = view.require(operation['id'])
+            view.delete(operation['id'])
+            if button.get('isCategory', False):
+                deleted_categories.add(str(operation['id']))
+        elif op == 'reorder':
+            view.reorder(operation['ids'])
+        else:
+            raise SettingsError(f"Unknown operation {op!r}")
+
+    run_operations(operations, apply)
+    if deleted_categories:
+        for button in list(view.final_items()):
+            if button.get('category') in deleted_categories:
+                view.delete(button['id'])
+    changes = view.changes()
+    if categories != settings_data.get('categories', []):
+        changes.append({'op': 'set', 'key': 'categories', 'value': categories})
+    return changes
+
+
+def talk_group_changes(settings_data, operations, created):
+    """
+    Return the settings changes of a batch of talk group operations, appending the ids of the groups created to
+    created. Raises SettingsError if any operation is invalid, so the batch applies entirely or not at all.
+
+    Operations are {'op': 'create', 'number': number, 'name': name}, {'op': 'update', 'id': id, 'number': number,
+    'name': name} with either field optional, {'op': 'delete', 'id': id} and {'op': 'reorder', 'ids': ids}. Numbers
+    must stay unique, compared as strings, but may move from a group to another within the batch.
+    """
+    check_operations(operations)
+    view = ListView(settings_data, 'talk_groups', 'Talk group')
+    owners = {}  # Number -> id of the group with it, or None, where the batch changed it
+
+    def owner(number):
+        number = str(number)
+        if number in owners:
+            return owners[number]
+        position = settings_store.position('talk_groups', number, key='number')
+        return None if position is None else str(view.items[position].get('id'))
+
+    def apply(operation):
+        op = operation.get('op')
+        if op == 'create':
+            talk_group = {
+                'id': view.new_id(operation.get('id')),
+                'name': operation['name'],
+                'number': operation['number']
+            }
+            if owner(talk_group['number']) is not None:
+                raise SettingsError("Talk group number already exists")
+            view.put(talk_group)
+            owners[str(talk_group['number'])] = talk_group['id']
+            created.append(talk_group['id'])
+        elif op == 'update':
+            group_id = str(operation['id'])
+            group = view.require(group_id)
+            new_number = operation.get('number')
+            # Check if the new number is unique among other groups, except the current one being updated
+            if new_number and owner(new_number) not in (None, group_id):
+                raise SettingsError("Talk group number already exists")
+            updated_group = {**group, 'number': new_number if new_number is not None else group['number'],
+                             'name': operation.get('name', group['name'])}
+            view.put(updated_group)
+            if str(updated_group['number']) != str(group['number']):
+                owners[str(group['number'])] = None
+                owners[str(updated_group['number'])] = group_id
+        elif op == 'delete':
+            group = view.require(operation['id'])
+            view.delete(operation['id'])
+            owners[str(group['number'])] = None
+        elif op == 'reorder':
+            view.reorder(operation['ids'])
+        else:
+            raise SettingsError(f"Unknown operation {op!r}")
+
+    run_operations(operations, apply)
+    return view.changes()
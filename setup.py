@@ -38,7 +38,6 @@ setup(
         'python-dateutil==2.9.0.post0',
         'pytz==2024.1',
         'requests==2.32.2',
-        'watchdog==4.0.1',
         'Werkzeug==3.0.6',
         'zeroconf==0.132.2'
     ],
@@ -0,0 +1,123 @@
+#  Copyright (c) 2024 by Silviu Stroe (brainic.io)
+#  #
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#  #
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU General Public License for more details.
+#  #
+#  You should have received a copy of the GNU General Public License
+#  along with this program. If not, see <http://www.gnu.org/licenses/>.
+#  #
+#  Created on 10/18/26, 10:30 PM
+#  #
+#  Author: Silviu Stroe
+
+import math
+import struct
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from audio import CHANNELS, RATE, REFERENCE_PEAK
+
+SPECTRUM_ROOM = 'spectrum'  # Socket.IO room of the clients showing the spectrum
+FFT_SIZE = 2048
+OVERLAP = 0.5  # Fraction of each FFT window shared with the next one
+SPECTRUM_BINS = 64
+SPECTRUM_RATE = 10  # Spectrum rows sent per second
+MIN_FREQUENCY = 50  # Lower edge of the first bin, in Hz
+SPECTRUM_FLOOR_DB = -100  # Level of row value 0; 255 is 0 dB, a full scale sine
+SEQUENCE = struct.Struct('<H')
+
+
+class SpectrumAnalyzer:
+    """
+    Spectrum rows of the RX audio for the waterfall view, sent as 'spectrum_row' messages to the SPECTRUM_ROOM.
+
+    The audio is downmixed to mono and buffered until it holds the Hann windows of one row, fft_size samples each and
+    overlapping by OVERLAP, about 1 / row_rate seconds of audio. They are transformed with one rfft call on a 2-D view
+    of the buffer, and their average power is summed into bins log-spaced from MIN_FREQUENCY to the Nyquist frequency
+    and quantized to one uint8 per bin, from SPECTRUM_FLOOR_DB to 0 dB. A sine reads its own level in its bin. Each row
+    is preceded by a uint16 little-endian sequence number.
+
+    Nothing is computed while no client is subscribed.
+    """
+
+    def __init__(self, socketio, rate=RATE, channels=CHANNELS, reference=REFERENCE_PEAK, fft_size=FFT_SIZE,
+                 bins=SPECTRUM_BINS, row_rate=SPECTRUM_RATE):
+        if not 1 <= bins <= fft_size // 4:
+            raise ValueError(f"The number of spectrum bins must be between 1 and {fft_size // 4}")
+        self.socketio = socketio
+        self.rate = rate
+        self.channels = channels
+        self.fft_size = fft_size
+        self.hop = int(fft_size * (1 - OVERLAP))
+        self.window = np.hanning(fft_size).astype(np.float32)
+        # Power of a full scale sine, with every channel at full scale, over all the FFT bins (Parseval)
+        self.full_scale = (reference * channels) ** 2 / 4 * fft_size * np.square(self.window, dtype=np.float64).sum()
+        self.windows_per_row = max(1, math.ceil(rate / row_rate / self.hop))  # At most row_rate rows per second
+        self.buffer = np.zeros(fft_size + (self.windows_per_row - 1) * self.hop, dtype=np.float32)
+        self.filled = 0
+        # FFT bin where each spectrum bin starts, then where the last one ends; every bin gets at least one FFT bin
+        edges = np.geomspace(MIN_FREQUENCY, rate / 2, bins + 1) * fft_size / rate
+        self.edges = np.round(edges).astype(int)
+        for i in range(1, len(self.edges)):
+            self.edges[i] = max(self.edges[i], self.edges[i - 1] + 1)
+        self.edges = np.minimum(self.edges, fft_size // 2 + 1)
+        self.subscribers = set()  # Socket.IO session ids of the subscribed clients
+        self.rows = 0  # Also the sequence number of the next row, modulo 2 ** 16
+
+    def get_config(self):
+        """
+        Return what clients need to draw the rows: the frequency range of every bin and the level range.
+        """
+        frequencies = (self.edges * self.rate / self.fft_size).tolist()
+        return {
+            'bins': [[round(low), round(high)] for low, high in zip(frequencies[:-1], frequencies[1:])],
+            'floor_db': SPECTRUM_FLOOR_DB,
+            'ceiling_db': 0,
+            'row_rate': self.rate / (self.windows_per_row * self.hop)
+        }
+
+    def subscribe(self, sid):
+        self.subscribers.add(sid)
+
+    def unsubscribe(self, sid):
+        self.subscribers.discard(sid)
+
+    def write(self, frames):
+        """
+        Add a block of samples with one row per frame.
+        """
+        if not self.subscribers:
+            return
+        position = 0
+        while position < len(frames):
+            count = min(len(frames) - position, len(self.buffer) - self.filled)
+            target = self.buffer[self.filled:self.filled + count]
+            np.copyto(target, frames[position:position + count, 0], casting='unsafe')
+            for channel in range(1, self.channels):
+                np.add(target, frames[position:position + count, channel], out=target, casting='unsafe')
+            self.filled += count
+            position += count
+            if self.filled == len(self.buffer):
+                self.send_row()
+
+    def send_row(self):
+        windows = sliding_window_view(self.buffer, self.fft_size)[::self.hop]
+        spectra = np.fft.rfft(windows * self.window, axis=1)
+        power = (spectra.real ** 2 + spectra.imag ** 2).mean(axis=0)
+        # The overlap is the start of the next row
+        self.buffer[:self.fft_size - self.hop] = self.buffer[len(self.buffer) - self.fft_size + self.hop:]
+        self.filled = self.fft_size - self.hop
+        bins = np.add.reduceat(power[:self.edges[-1]], self.edges[:-1])
+        levels = 10 * np.log10(bins / self.full_scale + 1e-20)
+        row = np.clip((levels - SPECTRUM_FLOOR_DB) * (255 / -SPECTRUM_FLOOR_DB), 0, 255).astype(np.uint8)
+        self.socketio.emit('spectrum_row', SEQUENCE.pack(self.rows & 0xFFFF) + row.tobytes(), to=SPECTRUM_ROOM,
+                           namespace='/')
+        self.rows += 1
@@ -0,0 +1,146 @@
+/*
+ * # Copyright (c) 2024 by Silviu Stroe (brainic.io)
+ * #
+ * # This program is free software: you can redistribute it and/or modify
+ * # it under the terms of the GNU General Public License as published by
+ * # the Free Software Foundation, either version 3 of the License, or
+ * # (at your option) any later version.
+ * #
+ * # This program is distributed in the hope that it will be useful,
+ * # but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * # MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+ * # GNU General Public License for more details.
+ * #
+ * # You should have received a copy of the GNU General Public License
+ * # along with this program. If not, see <http://www.gnu.org/licenses/>.
+ * #
+ * # Created on 10/19/26, 12:10 AM
+ * #
+ * # Author: Silviu Stroe
+ */
+document.addEventListener('DOMContentLoaded', function () {
+    const toggle = document.getElementById('listenToggle');
+    const latencyLabel = document.getElementById('listenLatency');
+    const JITTER_SECONDS = 0.06;  // Audio buffered before playback starts, against the jitter of the chunks
+    const MAX_AHEAD_SECONDS = 0.2;  // Chunks that would play later than this are dropped rather than add latency
+    const CLOCK_SYNC_MS = 10000;
+    const LATENCY_REPORT_MS = 2000;
+    const decoded = mulawTable();
+    let context = null;
+    let config = null;
+    let listening = false;
+    let nextTime = 0;
+    let lastSequence = null;
+    let clockOffset = null;  // Server clock minus ours, in ms
+    let bestRoundTrip = Infinity;
+    let latency = null;
+    let clockTimer = null;
+    let reportTimer = null;
+
+    // The 256 mu-law codes as samples between -1 and 1 (G.711)
+    function mulawTable() {
+        const table = new Float32Array(256);
+        for (let code = 0; code < 256; code++) {
+            const u = ~code & 0xFF;
+            const t = (((u & 0x0F) << 3) + 0x84) << ((u & 0x70) >> 4);
+            table[code] = ((u & 0x80) ? 0x84 - t : t - 0x84) / 32768;
+        }
+        return table;
+    }
+
+    // The server stops sending audio as soon as no client listens
+    toggle.addEventListener('click', function () {
+        listening = !listening;
+        toggle.textContent = listening ? 'Stop listening' : 'Listen';
+        latencyLabel.textContent = '';
+        if (listening) {
+            context = context || new AudioContext();
+            context.resume();
+            subscribe();
+            clockTimer = setInterval(syncClock, CLOCK_SYNC_MS);
+            reportTimer = setInterval(reportLatency, LATENCY_REPORT_MS);
+        } else {
+            socket.emit('unsubscribe_live_audio');
+            clearInterval(clockTimer);
+            clearInterval(reportTimer);
+        }
+    });
+
+    // Subscriptions do not survive a reconnection
+    socket.on('connect', function () {
+        if (listening) {
+            subscribe();
+        }
+    });
+
+    function subscribe() {
+        nextTime = 0;
+        lastSequence = null;
+        bestRoundTrip = Infinity;
+        syncClock();
+        socket.emit('subscribe_live_audio');
+    }
+
+    socket.on('live_audio_config', function (liveConfig) {
+        config = liveConfig;
+    });
+
+    // The offset of the server clock, from the exchange with the shortest round trip
+    function syncClock() {
+        const sent = Date.now();
+        socket.emit('live_audio_clock', function (reply) {
+            const received = Date.now();
+            if (received - sent <= bestRoundTrip) {
+                bestRoundTrip = received - sent;
+                clockOffset = reply.server_time - (sent + received) / 2;
+            }
+        });
+    }
+
+    function reportLatency() {
+        if (latency !== null) {
+            socket.emit('live_audio_latency', {latency_ms: latency});
+            latencyLabel.textContent = `${Math.round(latency)} ms`;
+        }
+    }
+
+    // A uint16 sequence number, the float64 server time in ms at which the audio arrived, then one mu-law byte per
+    // sample. Every chunk is acknowledged, which lets the server send the next ones
+    socket.on('live_audio', function (data, ack) {
+        if (ack) {
+            ack();
+        }
+        if (!listening || !config) {
+            return;
+        }
+        const view = new DataView(data);
+        const sequence = view.getUint16(0, true);
+        if (lastSequence !== null && ((sequence - lastSequence) & 0xFFFF) > 0x8000) {
+            return;  // Older than a chunk already played
+        }
+        lastSequence = sequence;
+        const codes = new Uint8Array(data, 10);
+        const now = context.currentTime;
+        if (nextTime < now) {
+            nextTime = now + JITTER_SECONDS;  // Started, or ran dry: buffer again
+        } else if (nextTime > now + MAX_AHEAD_SECONDS) {
+            return;
+        }
+        const buffer = context.createBuffer(1, codes.length, config.rate);
+        const samples = buffer.getChannelData(0);
+        for (let i = 0; i < codes.length; i++) {
+            samples[i] = decoded[codes[i]];
+        }
+        const source = context.createBufferSource();
+        source.buffer = buffer;
+        source.connect(context.destination);
+        source.start(nextTime);
+        if (clockOffset !== null) {
+            // From the arrival of the audio at the server to the moment it leaves the speaker
+            const outputLatency = context.outputLatency || context.baseLatency || 0;
+            const playback = Date.now() + (nextTime - now + outputLatency) * 1000;
+            latency = playback - (view.getFloat64(2, true) - clockOffset);
+        }
+        nextTime += buffer.duration;
+    });
+});
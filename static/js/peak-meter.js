@@ -19,11 +19,6 @@
  * # Author: Silviu Stroe
  */
 document.addEventListener('DOMContentLoaded', function () {
-    let peakLevelRX = -30; // Initialize peak level for RX
-    let peakLevelTX = -30; // Initialize peak level for TX
-    let lastUpdateRX = Date.now(); // Track last update time for RX
-    let lastUpdateTX = Date.now(); // Track last update time for TX
-
     const volumeLevelRX = document.getElementById('volumeLevelRX');
     const peakLevelBarRX = document.getElementById('peakLevelRX');
     const volumeLevelTX = document.getElementById('volumeLevelTX');
@@ -31,33 +26,6 @@ document.addEventListener('DOMContentLoaded', function () {
     const minDb = -30;
     const maxDb = 3;
 
-    function updateLevels() {
-        const now = Date.now();
-
-        // Update peak level decay for RX
-        if (now - lastUpdateRX > 100) {
-            peakLevelRX -= 0.5;
-            peakLevelRX = Math.max(peakLevelRX, minDb);
-            lastUpdateRX = now;
-        }
-        let peakPercentageRX = ((peakLevelRX - minDb) / (maxDb - minDb)) * 100;
-        peakPercentageRX = Math.max(0, Math.min(peakPercentageRX, 100));
-        peakLevelBarRX.style.left = `${peakPercentageRX.toFixed(2)}%`;
-
-        // Update peak level decay for TX
-        if (now - lastUpdateTX > 100) {
-            peakLevelTX -= 0.5;
-            peakLevelTX = Math.max(peakLevelTX, minDb);
-            lastUpdateTX = now;
-        }
-        let peakPercentageTX = ((peakLevelTX - minDb) / (maxDb - minDb)) * 100;
-        peakPercentageTX = Math.max(0, Math.min(peakPercentageTX, 100));
-        peakLevelBarTX.style.left = `${peakPercentageTX.toFixed(2)}%`;
-
-        // Call this function again on the next animation frame
-        requestAnimationFrame(updateLevels);
-    }
-
     function getColorForLevel(dB) {
         if (dB <= -60) {
             return 'Black'; // Below audible threshold
@@ -70,38 +38,101 @@ document.addEventListener('DOMContentLoaded', function () {
         }
     }
 
-    socket.on('audio_level_rx', function (data) {
-        updateLevel(data, volumeLevelRX, peakLevelBarRX, 'RX');
+    function toPercentage(dB) {
+        const percentage = ((dB - minDb) / (maxDb - minDb)) * 100;
+        return Math.max(0, Math.min(percentage, 100));
+    }
+
+    let lastSequence = null;
+    // The audio sources in the order of the streams of a binary frame, and the meter showing each; the server sends
+    // them on connect
+    let audioSources = [{name: 'rx', role: 'rx'}, {name: 'tx', role: 'tx'}];
+
+    socket.on('audio_sources', function (sources) {
+        audioSources = sources;
     });
 
-    socket.on('audio_level_tx', function (data) {
-        updateLevel(data, volumeLevelTX, peakLevelBarTX, 'TX');
+    // Updates arrive in order on one connection, but a reconnection can deliver an old one late
+    function isStale(sequence) {
+        const stale = lastSequence !== null && ((sequence - lastSequence) & 0xFFFF) > 0x8000;
+        if (!stale) {
+            lastSequence = sequence;
+        }
+        return stale;
+    }
+
+    // Decode a frame packed by pack_levels() in audio.py: a uint16 sequence number, then per stream its number of
+    // channels, the int8 peaks, RMS levels and peak-holds in quarter dB, the uint16 clip counts and the int16 DC offsets
+    function decodeLevels(buffer) {
+        const view = new DataView(buffer);
+        let offset = 2;
+        const streams = {};
+        let index = 0;
+        while (offset < view.byteLength) {
+            const channels = view.getUint8(offset);
+            offset += 1;
+            const read = (getter, size, scale) => {
+                const values = [];
+                for (let i = 0; i < channels; i++) {
+                    values.push(getter.call(view, offset, true) / scale);
+                    offset += size;
+                }
+                return values;
+            };
+            const peak = read(view.getInt8, 1, 4);
+            const rms = read(view.getInt8, 1, 4);
+            const hold = read(view.getInt8, 1, 4);
+            const clip = read(view.getUint16, 2, 1);
+            const dc = read(view.getInt16, 2, 32768);
+            const source = audioSources[index] || {name: `stream${index}`};
+            streams[source.name] = {peak, rms, hold, clip, dc};
+            index += 1;
+        }
+        return {seq: view.getUint16(0, true), streams};
+    }
+
+    // The server sends all the streams together, a few dozen times per second at most, with the peak-hold already
+    // computed, and stops once everything is at the floor. Binary frames by default, JSON if so configured
+    socket.on('audio_levels_bin', function (buffer) {
+        showLevels(decodeLevels(buffer));
+    });
+    socket.on('audio_levels', function (message) {
+        const {seq, ...streams} = message;
+        showLevels({seq, streams});
     });
 
-    function updateLevel(data, volumeLevel, peakLevelBar, type) {
-        const level = parseFloat(data.level);
-        let percentage = ((level - minDb) / (maxDb - minDb)) * 100;
-        percentage = Math.max(0, Math.min(percentage, 100));
-        volumeLevel.style.width = `${percentage.toFixed(2)}%`;
-        volumeLevel.style.backgroundColor = getColorForLevel(level);
+    function showLevels(data) {
+        if (isStale(data.seq)) {
+            return;
+        }
+        updateLevel(roleLevels(data.streams, 'rx'), volumeLevelRX, peakLevelBarRX);
+        updateLevel(roleLevels(data.streams, 'tx'), volumeLevelTX, peakLevelBarTX);
+    }
 
-        if (type === 'RX') {
-            if (level > peakLevelRX || Date.now() - lastUpdateRX > 200) {
-                peakLevelRX = level;
-                lastUpdateRX = Date.now();
-            }
-        } else if (type === 'TX') {
-            if (level > peakLevelTX || Date.now() - lastUpdateTX > 200) {
-                peakLevelTX = level;
-                lastUpdateTX = Date.now();
+    // The channels of all the sources shown by one meter, e.g. the receivers of a voter, as if of one stream
+    function roleLevels(streams, role) {
+        const levels = {peak: [], rms: [], hold: [], clip: [], dc: []};
+        for (const source of audioSources) {
+            const stream = streams[source.name];
+            if (source.role === role && stream) {
+                for (const key in levels) {
+                    levels[key].push(...stream[key]);
+                }
             }
         }
-
-        let peakPercentage = ((eval(`peakLevel${type}`) - minDb) / (maxDb - minDb)) * 100;
-        peakPercentage = Math.max(0, Math.min(peakPercentage, 100));
-        peakLevelBar.style.left = `${peakPercentage.toFixed(2)}%`;
+        return levels;
     }
 
-    // Start the animation frame for peak level decay
-    requestAnimationFrame(updateLevels);
-});
\ No newline at end of file
+    function updateLevel(levels, volumeLevel, peakLevelBar) {
+        if (levels.peak.length === 0) {
+            return;
+        }
+        // One bar per role, showing its loudest channel
+        const level = Math.max(...levels.peak);
+        const clipped = levels.clip.some(count => count > 0);
+        volumeLevel.style.width = `${toPercentage(level).toFixed(2)}%`;
+        volumeLevel.style.backgroundColor = clipped ? 'Red' : getColorForLevel(level);
+        volumeLevel.title = `RMS ${levels.rms.join(' / ')} dB, DC offset ${levels.dc.map(dc => dc.toFixed(4)).join(' / ')}`;
+        peakLevelBar.style.left = `${toPercentage(Math.max(...levels.hold)).toFixed(2)}%`;
+    }
+});
@@ -0,0 +1,66 @@
+/*
+ * # Copyright (c) 2024 by Silviu Stroe (brainic.io)
+ * #
+ * # This program is free software: you can redistribute it and/or modify
+ * # it under the terms of the GNU General Public License as published by
+ * # the Free Software Foundation, either version 3 of the License, or
+ * # (at your option) any later version.
+ * #
+ * # This program is distributed in the hope that it will be useful,
+ * # but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * # MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+ * # GNU General Public License for more details.
+ * #
+ * # You should have received a copy of the GNU General Public License
+ * # along with this program. If not, see <http://www.gnu.org/licenses/>.
+ * #
+ * # Created on 10/18/26, 10:50 PM
+ * #
+ * # Author: Silviu Stroe
+ */
+document.addEventListener('DOMContentLoaded', function () {
+    const toggle = document.getElementById('spectrumToggle');
+    const canvas = document.getElementById('spectrumCanvas');
+    const context = canvas.getContext('2d');
+    let bins = 0;
+    let shown = false;
+
+    // The server only computes the spectrum while a client shows it
+    toggle.addEventListener('click', function () {
+        shown = !shown;
+        canvas.classList.toggle('hidden', !shown);
+        toggle.textContent = shown ? 'Hide spectrum' : 'Show spectrum';
+        socket.emit(shown ? 'subscribe_spectrum' : 'unsubscribe_spectrum');
+    });
+
+    // Subscriptions do not survive a reconnection
+    socket.on('connect', function () {
+        if (shown) {
+            socket.emit('subscribe_spectrum');
+        }
+    });
+
+    socket.on('spectrum_config', function (config) {
+        bins = config.bins.length;
+    });
+
+    function getColorForValue(value) {
+        // From dark blue at the floor to red at full scale
+        return `hsl(${240 - value * 240 / 255}, 100%, ${10 + value * 45 / 255}%)`;
+    }
+
+    // A uint16 sequence number, then one byte per log-spaced bin, 0 at the floor and 255 at full scale; the newest row
+    // is drawn at the top
+    socket.on('spectrum_row', function (data) {
+        const row = new Uint8Array(data, 2);
+        if (!shown || row.length !== bins) {
+            return;
+        }
+        context.drawImage(canvas, 0, 1);
+        const width = canvas.width / bins;
+        for (let i = 0; i < bins; i++) {
+            context.fillStyle = getColorForValue(row[i]);
+            context.fillRect(Math.floor(i * width), 0, Math.ceil(width), 1);
+        }
+    });
+});
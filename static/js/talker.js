@@ -19,7 +19,8 @@
  * # Author: Silviu Stroe
  */
 
-const socket = io();
+// Follow the svxlink instance given in the page URL (?source=...), the default one otherwise
+const socket = io({query: {source: new URLSearchParams(window.location.search).get('source') || ''}});
 let timerInterval = null;
 let startTime = null;
 const timerElement = document.getElementById('talkerTimer');  // Declare once, use throughout
@@ -19,6 +19,7 @@
 
 import configparser
 import os
+import re
 import subprocess
 from pathlib import Path
 import logging
@@ -27,6 +28,9 @@ import socket
 import ipaddress
 from os import access, R_OK
 
+from config import get_settings
+from session_store import DEFAULT_SOURCE
+
 # Set up logging to file
 logging.basicConfig(
     level=logging.INFO,
@@ -94,6 +98,39 @@ def get_log_file_path():
     return None, "Log file not found."
 
 
+def get_log_sources():
+    """
+    List the svxlink logs to monitor as (source id, log file path) pairs, the default source first.
+
+    Several svxlink instances on one host are configured in config.json as
+    "log_sources": [{"id": "repeater", "path": "/var/log/svxlink-repeater"}, ...]. Without that setting the single
+    log found by get_log_file_path() is monitored as the default source. The ids name the checkpoint files of the
+    sources, so they must be letters, digits, '-' or '_', and unique regardless of case; other entries are ignored.
+    """
+    configured = get_settings().get('log_sources')
+    if configured:
+        sources = []
+        seen = set()
+        for entry in configured:
+            source, log_file = str(entry.get('id', '')), entry.get('path')
+            if not re.fullmatch(r'[A-Za-z0-9_-]{1,64}', source) or not log_file:
+                logging.error(f"Ignoring invalid log source: {entry}")
+                continue
+            if source.lower() in seen:
+                logging.error(f"Ignoring log source with a duplicate id: {entry}")
+                continue
+            seen.add(source.lower())
+            sources.append((source, log_file))
+        if sources:
+            return sources, f"{len(sources)} log sources configured."
+        return [], "No valid log sources configured."
+
+    log_file_path, message = get_log_file_path()
+    if log_file_path is None:
+        return [], message
+    return [(DEFAULT_SOURCE, log_file_path)], message
+
+
 def find_config_file():
     """
     Attempt to find the SVXLink configuration file path from service properties or fall back to known locations.
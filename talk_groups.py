@@ -0,0 +1,173 @@
+#  Copyright (c) 2024 by Silviu Stroe (brainic.io)
+#  #
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#  #
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU General Public License for more details.
+#  #
+#  You should have received a copy of the GNU General Public License
+#  along with this program. If not, see <http://www.gnu.org/licenses/>.
+#  #
+#  Created on 10/19/26, 2:10 AM
+#  #
+#  Author: Silviu Stroe
+
+
+import csv
+import io
+import json
+import uuid
+from bisect import bisect_left
+
+from config import settings_store
+
+IMPORT_FORMATS = ('csv', 'json')
+IMPORT_MODES = ('merge', 'replace')
+CSV_FIELDS = ['number', 'name', 'id']
+SEARCH_LIMIT = 20
+MAX_SEARCH_LIMIT = 200
+EXPORT_BATCH = 500  # Groups serialized per chunk of an export
+
+
+class TalkGroupDirectory:
+    """
+    The talk groups of the settings, indexed by number and by id, with their numbers and names sorted for prefix
+    searches. Numbers are compared as strings. Built once per version of the settings, see get_directory(), and
+    read-only like them.
+    """
+
+    def __init__(self, settings_data):
+        self.groups = settings_data.get('talk_groups', [])
+        self.by_number = {}
+        self.positions = {}  # Id -> position in the list
+        for position, group in enumerate(self.groups):
+            self.by_number.setdefault(str(group['number']), group)  # The first group with a number wins
+            self.positions[group.get('id')] = position
+        self.numbers = sorted(self.by_number)
+        self.names = sorted((str(group['name']).casefold(), position) for position, group in enumerate(self.groups))
+
+    def name(self, number):
+        group = self.by_number.get(str(number))
+        return None if group is None else group['name']
+
+    def search(self, query, limit=SEARCH_LIMIT):
+        """
+        Return up to limit groups whose number or name starts with query, ignoring case; number matches first.
+        """
+        query = query.strip()
+        if not query:
+            return []
+        matches = {}  # Position -> group, in the order found
+        position = bisect_left(self.numbers, query)
+        while position < len(self.numbers) and len(matches) < limit and self.numbers[position].startswith(query):
+            group = self.by_number[self.numbers[position]]
+            matches[self.positions[group.get('id')]] = group
+            position += 1
+        folded = query.casefold()
+        position = bisect_left(self.names, (folded,))
+        while position < len(self.names) and len(matches) < limit and self.names[position][0].startswith(folded):
+            group_position = self.names[position][1]
+            matches.setdefault(group_position, self.groups[group_position])
+            position += 1
+        return list(matches.values())
+
+
+def get_directory():
+    return settings_store.derived('talk_group_directory', TalkGroupDirectory)
+
+
+def parse_number(value, line):
+    number = str(value).strip()
+    if not number.isdigit():
+        raise ValueError(f"Line {line}: talk group number {value!r} is not a number")
+    return str(int(number))
+
+
+def read_csv(stream):
+    """
+    Yield (line, number, name) for the rows of a CSV file of talk groups, number and name first; a header row and
+    further columns are skipped.
+    """
+    for line, row in enumerate(csv.reader(stream), start=1):
+        if not row or not any(cell.strip() for cell in row):
+            continue
+        if line == 1 and row[0].strip().lower() == 'number':
+            continue
+        if len(row) < 2:
+            raise ValueError(f"Line {line}: expected a talk group number and name")
+        yield line, row[0], row[1]
+
+
+def read_json(stream):
+    """
+    Yield (position, number, name) for the talk groups of a JSON array of objects with a number and a name.
+    """
+    groups = json.load(stream)
+    if not isinstance(groups, list):
+        raise ValueError("Expected a JSON array of talk groups")
+    for position, group in enumerate(groups, start=1):
+        if not isinstance(group, dict) or 'number' not in group or 'name' not in group:
+            raise ValueError(f"Line {position}: expected an object with a talk group number and name")
+        yield position, group['number'], group['name']
+
+
+def merge_talk_groups(groups, rows, replace=False):
+    """
+    Return the talk group list with the imported rows applied, and counts of the groups created, updated and removed.
+
+    A row with the number of an existing group renames it, keeping its id; other rows create groups. With replace, the
+    groups missing from the rows are removed. Every row is checked before anything is returned, so an invalid row
+    raises ValueError and the caller keeps its list unchanged.
+    """
+    existing = {str(group['number']): group for group in reversed(groups)}  # The first group with a number wins
+    merged = [] if replace else [dict(group) for group in groups]
+    positions = {} if replace else {str(group['number']): i for i, group in reversed(list(enumerate(merged)))}
+    for line, number, name in rows:
+        number = parse_number(number, line)
+        name = str(name).strip()
+        if not name:
+            raise ValueError(f"Line {line}: the name of talk group {number} is empty")
+        position = positions.get(number)
+        if position is not None:
+            merged[position]['name'] = name  # The last row of a number wins
+        else:
+            positions[number] = len(merged)
+            merged.append({**existing[number], 'name': name} if number in existing else
+                          {'id': str(uuid.uuid4()), 'name': name, 'number': number})
+    created = sum(1 for number in positions if number not in existing)
+    updated = sum(1 for number, position in positions.items()
+                  if number in existing and existing[number]['name'] != merged[position]['name'])
+    removed = sum(1 for number in existing if number not in positions)
+    return merged, {'created': created, 'updated': updated, 'removed': removed}
+
+
+def export_csv(groups):
+    """
+    Yield the talk groups as CSV, in chunks.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(CSV_FIELDS)
+    for start in range(0, len(groups), EXPORT_BATCH):
+        writer.writerows([group['number'], group['name'], group.get('id', '')]
+                         for group in groups[start:start + EXPORT_BATCH])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+def export_json(groups):
+    """
+    Yield the talk groups as a JSON array, in chunks.
+    """
+    yield '['
+    for start in range(0, len(groups), EXPORT_BATCH):
+        batch = json.dumps(groups[start:start + EXPORT_BATCH])[1:-1]  # Without the brackets of the batch
+        yield batch if start == 0 else ',' + batch
+    yield ']'
@@ -0,0 +1,76 @@
+#  Copyright (c) 2024 by Silviu Stroe (brainic.io)
+#  #
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#  #
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU General Public License for more details.
+#  #
+#  You should have received a copy of the GNU General Public License
+#  along with this program. If not, see <http://www.gnu.org/licenses/>.
+#  #
+#  Created on 10/19/26, 4:40 AM
+#  #
+#  Author: Silviu Stroe
+
+import os
+import sys
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from airtime_stats import AirtimeStats  # noqa: E402
+from log_monitor import LogMonitor  # noqa: E402
+from session_store import SessionStore  # noqa: E402
+
+
+class SilentSocketIO:
+    def emit(self, *args, **kwargs):
+        pass
+
+
+def stamp(moment):
+    return moment.strftime('%a %b ') + f"{moment.day:2d}" + moment.strftime(' %H:%M:%S %Y')
+
+
+def test_missed_stop_does_not_leave_the_session_in_progress(tmp_path):
+    stats = AirtimeStats()
+    store = SessionStore(str(tmp_path / 'sessions.db'), flush_interval=3600)
+    monitor = LogMonitor(str(tmp_path / 'missing.log'), SilentSocketIO(), store, airtime_stats=stats,
+                         checkpoint_file=str(tmp_path / 'checkpoint.json'))
+    # Recent enough for the minute buckets
+    moment = (datetime.now() - timedelta(minutes=30)).replace(second=0, microsecond=0)
+    lines = [
+        (moment, "Talker start on TG #226: YO1AAA"),  # Its stop is missing from the log
+        (moment + timedelta(seconds=5), "Talker start on TG #226: YO2BBB"),
+        (moment + timedelta(seconds=9), "Talker stop on TG #226: YO2BBB"),
+        (moment + timedelta(minutes=2), "Talker start on TG #226: YO3CCC"),
+        (moment + timedelta(minutes=2, seconds=4), "Talker stop on TG #226: YO3CCC"),
+    ]
+    for line_time, message in lines:
+        monitor.parse_line(f"{stamp(line_time)}: ReflectorLogic: {message}")
+
+    assert stats.active == {}
+    assert stats.open_sessions == {}
+    window = (moment + timedelta(minutes=2)).timestamp(), (moment + timedelta(minutes=3)).timestamp()
+    totals = stats.series('tg', '226', *window, resolution='minute')['totals']
+    assert totals['sessions'] == 1
+    assert totals['peak_concurrency'] == 1
+    store.close()
+
+
+def test_repeated_start_replaces_the_open_session():
+    stats = AirtimeStats()
+    start = datetime.now().replace(microsecond=0) - timedelta(minutes=10)
+    first = {'source': 'a', 'callsign': 'YO1AAA', 'tg_number': '226', 'start_date_time': start.isoformat()}
+    second = {**first, 'callsign': 'YO2BBB', 'start_date_time': (start + timedelta(seconds=5)).isoformat()}
+    stats.session_started(first)
+    stats.session_started(second)  # Without the monitor discarding the first one
+
+    assert stats.active[('tg', '226')] == 1
+    stats.session_stopped({**second, 'stop_date_time': (start + timedelta(seconds=9)).isoformat()})
+    assert stats.active == {}
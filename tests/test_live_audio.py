@@ -0,0 +1,69 @@
+#  Copyright (c) 2024 by Silviu Stroe (brainic.io)
+#  #
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#  #
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+#  GNU General Public License for more details.
+#  #
+#  You should have received a copy of the GNU General Public License
+#  along with this program. If not, see <http://www.gnu.org/licenses/>.
+#  #
+#  Created on 10/19/26, 6:10 AM
+#  #
+#  Author: Silviu Stroe
+
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import live_audio  # noqa: E402
+from audio import CHANNELS  # noqa: E402
+from live_audio import ACK_TIMEOUT, MAX_IN_FLIGHT, LiveAudioStreamer  # noqa: E402
+
+
+class RecordingSocketIO:
+    def __init__(self):
+        self.callbacks = []
+
+    def emit(self, event, data, to=None, namespace=None, callback=None):
+        self.callbacks.append(callback)
+
+
+def send_chunks(streamer, count):
+    for _ in range(count):
+        streamer.write(np.zeros((len(streamer.buffer) - streamer.filled, CHANNELS), dtype=np.int16))
+
+
+def test_lost_acknowledgements_expire(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(live_audio.time, 'monotonic', lambda: now[0])
+    socketio = RecordingSocketIO()
+    streamer = LiveAudioStreamer(socketio)
+    streamer.subscribe('client')
+
+    send_chunks(streamer, 10)  # None of them acknowledged
+    assert len(socketio.callbacks) == MAX_IN_FLIGHT
+
+    now[0] += ACK_TIMEOUT
+    send_chunks(streamer, 1)
+    assert len(socketio.callbacks) == 2 * MAX_IN_FLIGHT
+    assert streamer.get_stats()['clients'][0]['expired'] == MAX_IN_FLIGHT
+
+
+def test_later_acknowledgement_covers_the_lost_ones():
+    socketio = RecordingSocketIO()
+    streamer = LiveAudioStreamer(socketio)
+    streamer.subscribe('client')
+
+    send_chunks(streamer, 4)
+    socketio.callbacks[-1]()  # The acknowledgement of the first chunk was lost
+    assert streamer.get_stats()['clients'][0]['in_flight'] == MAX_IN_FLIGHT
+    assert len(socketio.callbacks) == 2 * MAX_IN_FLIGHT